@@ -3,6 +3,7 @@ from .models import (
     Topic, Project, ProjectSettings, Task, TaskDetail,
     Subtask, Comment, Document, DocumentVersion, Template
 )
+from .search import build_query, is_postgres
 
 @admin.register(Topic)
 class TopicAdmin(admin.ModelAdmin):
@@ -53,7 +54,15 @@ class DocumentAdmin(admin.ModelAdmin):
 class DocumentVersionAdmin(admin.ModelAdmin):
     list_display = ('document', 'version_number', 'created_by', 'created_at')
     list_filter = ('created_by',)
-    search_fields = ('content',)
+    search_fields = ('stored_content', 'blob__content')
+    raw_id_fields = ('base', 'blob')
+
+    def get_search_results(self, request, queryset, search_term):
+        # Текст дельт есть только в search_vector (как в ContentSearchFilter)
+        results, may_have_duplicates = super().get_search_results(request, queryset, search_term)
+        if search_term and is_postgres(queryset.db):
+            results |= queryset.filter(search_vector=build_query(search_term))
+        return results, may_have_duplicates
 
 @admin.register(Template)
 class TemplateAdmin(admin.ModelAdmin):
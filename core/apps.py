@@ -1,6 +1,21 @@
+import logging
+
 from django.apps import AppConfig
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
 
 
 class CoreConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "core"
+
+    def ready(self):
+        from . import signals  # noqa: F401
+
+        if settings.ML_MODEL_PRELOAD:
+            from .predictor import model_holder
+            try:
+                model_holder.get()
+            except Exception:
+                logger.exception("Could not preload the classification model")
@@ -0,0 +1,135 @@
+"""
+Async-версии самых нагруженных read-эндпоинтов (/api/async/...) для запуска под ASGI.
+
+Поведение то же, что у синхронных вьюсетов: аутентификация, права, фильтры, поиск,
+сортировка и пагинация берутся из них же, ответы сериализуются теми же сериализаторами.
+Синхронная подготовка (аутентификация, разбор тела, построение queryset) делается одним
+переходом в поток, строки читаются через async ORM, а предсказание модели уходит в
+пул потоков или в микробатчер - event loop не блокируется.
+"""
+import asyncio
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.http import Http404, HttpResponse
+from django.views.decorators.csrf import csrf_exempt
+from rest_framework import exceptions, status
+from rest_framework.renderers import JSONRenderer
+from rest_framework.views import exception_handler
+
+from .predictor import micro_batcher, model_holder
+from .views import DocumentViewSet, PredictDocumentClassView, ProjectViewSet, TaskViewSet
+
+
+def prepare(view, kwargs):
+    """
+    Синхронная часть запроса: то же, что делает APIView.dispatch до вызова обработчика
+    (аутентификация, права, троттлинг), плюс разбор тела и фильтры вьюсета (django-filter
+    проверяет значения фильтров запросами в базу).
+    """
+    view.initial(view.request, **kwargs)
+    if view.request.method == 'POST':
+        view.request.data
+    if hasattr(view, 'get_queryset'):
+        view.filtered_queryset = view.filter_queryset(view.get_queryset())
+
+
+def json_response(data, status_code=status.HTTP_200_OK):
+    """Ответ в том же виде, что у синхронного API (JSONRenderer DRF)"""
+    return HttpResponse(JSONRenderer().render(data), status=status_code, content_type='application/json')
+
+
+def error_response(view, exc):
+    """Ответ на исключение в формате DRF (тот же exception_handler и заголовки)"""
+    if isinstance(exc, exceptions.AuthenticationFailed | exceptions.NotAuthenticated):
+        auth_header = view.get_authenticate_header(view.request)
+        if auth_header:
+            exc.auth_header = auth_header
+        else:
+            exc.status_code = status.HTTP_403_FORBIDDEN
+    response = exception_handler(exc, {'view': view, 'request': view.request})
+    if response is None:
+        raise exc
+    error = json_response(response.data, status_code=response.status_code)
+    for name, value in response.items():
+        error[name] = value
+    return error
+
+
+def async_api_view(view_class, action, methods=('GET',)):
+    """Оборачивает async-обработчик handler(view, **kwargs) в вьюху Django с настройками view_class"""
+    def decorator(handler):
+        @csrf_exempt
+        @wraps(handler)
+        async def wrapper(request, **kwargs):
+            view = view_class(action=action, action_map={method.lower(): action for method in methods}, format_kwarg=None)
+            view.args, view.kwargs = (), kwargs
+            view.request = view.initialize_request(request, **kwargs)
+            view.headers = view.default_response_headers
+            try:
+                if request.method not in methods:
+                    raise exceptions.MethodNotAllowed(request.method)
+                await sync_to_async(prepare)(view, kwargs)
+                return await handler(view, **kwargs)
+            except (exceptions.APIException, Http404) as exc:
+                return error_response(view, exc)
+        return wrapper
+    return decorator
+
+
+async def list_response(view):
+    queryset = view.filtered_queryset
+    page = await view.paginator.apaginate_queryset(queryset, view.request, view=view)
+    if page is None:
+        return json_response(view.get_serializer([obj async for obj in queryset], many=True).data)
+    return json_response(view.paginator.get_paginated_response(view.get_serializer(page, many=True).data).data)
+
+
+async def detail_response(view, pk):
+    obj = await view.filtered_queryset.filter(**{view.lookup_field: pk}).afirst()
+    if obj is None:
+        raise Http404
+    view.check_object_permissions(view.request, obj)
+    return json_response(view.get_serializer(obj).data)
+
+
+@async_api_view(TaskViewSet, 'list')
+async def task_list(view):
+    return await list_response(view)
+
+
+@async_api_view(TaskViewSet, 'retrieve')
+async def task_detail(view, pk):
+    return await detail_response(view, pk)
+
+
+@async_api_view(ProjectViewSet, 'list')
+async def project_list(view):
+    return await list_response(view)
+
+
+@async_api_view(DocumentViewSet, 'retrieve')
+async def document_detail(view, pk):
+    return await detail_response(view, pk)
+
+
+@async_api_view(PredictDocumentClassView, 'post', methods=('POST',))
+async def predict_document_class(view):
+    text = view.request.data.get('text')
+    if not text:
+        return json_response({'error': 'Поле text обязательно.'}, status_code=status.HTTP_400_BAD_REQUEST)
+    # Загрузка и инференс модели - CPU и диск, поэтому вне event loop (и вне потока запроса)
+    try:
+        loaded = await sync_to_async(model_holder.get, thread_sensitive=False)()
+    except Exception as e:
+        return json_response({'error': f'Ошибка загрузки модели: {str(e)}'}, status_code=status.HTTP_500_INTERNAL_SERVER_ERROR)
+    try:
+        if settings.ML_MICRO_BATCHING:
+            prediction, version = await asyncio.wrap_future(micro_batcher.submit(text))
+        else:
+            predictions = await sync_to_async(loaded.model.predict, thread_sensitive=False)([text])
+            prediction, version = predictions[0], loaded.version
+    except Exception as e:
+        return json_response({'error': f'Ошибка предсказания: {str(e)}'}, status_code=status.HTTP_500_INTERNAL_SERVER_ERROR)
+    return json_response({'prediction': int(prediction), 'model_version': version})
@@ -0,0 +1,296 @@
+"""
+Двухуровневый кэш: ограниченный LRU в памяти процесса перед общим кэшем (Redis).
+
+Чтение сначала идет в локальный LRU, промах - в общий кэш, найденное значение кладется
+локально. Запись и удаление идут в общий кэш, локальная копия обновляется, а остальным
+процессам через брокер рассылается сообщение с ключами, которые нужно выбросить. Рассылаются
+только ключи из LOCAL_KEY_PREFIXES: остальные локально не хранит никто. add нового ключа
+тоже не рассылается - его еще никто не читал, а значение сразу кладется в локальный LRU;
+поэтому неизменяемые ключи (с версиями, как у cached_query) пишутся через add. Если
+сообщение потерялось (переподключение, сбой), локальная копия все равно живет не дольше
+LOCAL_TIMEOUT секунд - это и есть граница устаревания.
+
+LOCATION - имя локального уровня (один на процесс для всех потоков, как у LocMemCache).
+Настройка (OPTIONS):
+    SHARED         - алиас общего кэша в CACHES
+    BROKER         - класс брокера: RedisBroker (prod) или LocalBroker (dev, тесты)
+    BROKER_OPTIONS - аргументы брокера (url, channel)
+    MAX_ENTRIES    - размер локального LRU
+    LOCAL_TIMEOUT  - сколько секунд значение может жить локально
+    LOCAL_KEY_PREFIXES - какие ключи держать локально (по умолчанию - все)
+"""
+import json
+import logging
+import pickle
+import threading
+import time
+import uuid
+from collections import OrderedDict, defaultdict
+
+from django.core.cache import caches
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+from django.utils.module_loading import import_string
+
+logger = logging.getLogger(__name__)
+
+_MISSING = object()
+
+
+class LocalBroker:
+    """Брокер внутри одного процесса: подписчики канала вызываются сразу при публикации"""
+    _subscribers = defaultdict(list)
+    _lock = threading.Lock()
+
+    def __init__(self, channel='unidoc:cache:invalidate'):
+        self.channel = channel
+
+    def publish(self, message):
+        with self._lock:
+            subscribers = list(self._subscribers[self.channel])
+        for callback in subscribers:
+            callback(message)
+
+    def subscribe(self, callback, on_reconnect=None):
+        with self._lock:
+            self._subscribers[self.channel].append(callback)
+
+    def unsubscribe(self, callback):
+        with self._lock:
+            if callback in self._subscribers[self.channel]:
+                self._subscribers[self.channel].remove(callback)
+
+
+class RedisBroker:
+    """
+    Pub/sub канал Redis. Подписка слушается в фоновом потоке; после обрыва соединения
+    поток переподключается и вызывает on_reconnect - пропущенные сообщения не восстановить,
+    поэтому подписчик сбрасывает свой локальный кэш.
+    """
+
+    def __init__(self, url='redis://localhost:6379/1', channel='unidoc:cache:invalidate', retry_interval=1.0):
+        import redis
+
+        self.client = redis.Redis.from_url(url)
+        self.channel = channel
+        self.retry_interval = retry_interval
+        self._thread = None
+
+    def publish(self, message):
+        try:
+            self.client.publish(self.channel, message)
+        except Exception:
+            # Без рассылки остальные процессы увидят запись не позже чем через LOCAL_TIMEOUT
+            logger.warning('Cache invalidation publish failed', exc_info=True)
+
+    def subscribe(self, callback, on_reconnect=None):
+        self._thread = threading.Thread(target=self._listen, args=(callback, on_reconnect), daemon=True)
+        self._thread.start()
+
+    def _listen(self, callback, on_reconnect):
+        connected_before = False
+        while True:
+            try:
+                pubsub = self.client.pubsub(ignore_subscribe_messages=True)
+                pubsub.subscribe(self.channel)
+                if connected_before and on_reconnect:
+                    on_reconnect()
+                connected_before = True
+                for item in pubsub.listen():
+                    if item['type'] == 'message':
+                        callback(item['data'])
+            except Exception:
+                logger.warning('Cache invalidation channel lost, reconnecting', exc_info=True)
+                time.sleep(self.retry_interval)
+
+
+# Локальные уровни по LOCATION: как и LocMemCache, один на процесс, общий для всех потоков
+_tiers = {}
+_tiers_lock = threading.Lock()
+
+
+class LocalTier:
+    """
+    LRU-словарь процесса с ограниченным временем жизни записей и подпиской на инвалидации.
+    Значения хранятся в pickle, как в LocMemCache, чтобы изменения объекта у вызывающего
+    кода не попадали в кэш.
+    """
+
+    def __init__(self, broker, max_entries, timeout):
+        self.broker = broker
+        self.max_entries = max_entries
+        self.timeout = timeout
+        self.sender = uuid.uuid4().hex
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        # Растет с каждой инвалидацией: значение, прочитанное из общего кэша до нее, не сохраняется
+        self.generation = 0
+        broker.subscribe(self.on_message, on_reconnect=self.clear)
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return _MISSING
+            expires, value = entry
+            if expires <= time.monotonic():
+                del self._entries[key]
+                return _MISSING
+            self._entries.move_to_end(key)
+        return pickle.loads(value)
+
+    def set(self, key, value, generation):
+        value = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+        with self._lock:
+            if generation != self.generation:
+                return
+            self._entries[key] = (time.monotonic() + self.timeout, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def delete(self, keys):
+        with self._lock:
+            self.generation += 1
+            for key in keys:
+                self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self.generation += 1
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def invalidate(self, keys=None):
+        """Выбрасывает ключи (None - все) у себя и рассылает то же остальным процессам"""
+        if keys is None:
+            self.clear()
+            self.broker.publish(json.dumps({'sender': self.sender, 'clear': True}))
+        elif keys:
+            self.delete(keys)
+            self.broker.publish(json.dumps({'sender': self.sender, 'keys': keys}))
+
+    def on_message(self, message):
+        message = json.loads(message)
+        if message['sender'] == self.sender:
+            return
+        if message.get('clear'):
+            self.clear()
+        else:
+            self.delete(message['keys'])
+
+
+class TwoTierCache(BaseCache):
+    def __init__(self, location, params):
+        super().__init__(params)
+        options = params.get('OPTIONS', {})
+        self.shared_alias = options.get('SHARED', 'shared')
+        self.local_key_prefixes = tuple(options.get('LOCAL_KEY_PREFIXES') or ())
+        with _tiers_lock:
+            if location not in _tiers:
+                broker = import_string(options.get('BROKER', 'core.cache_backends.LocalBroker'))(
+                    **options.get('BROKER_OPTIONS', {})
+                )
+                _tiers[location] = LocalTier(broker, options.get('MAX_ENTRIES', 1000), options.get('LOCAL_TIMEOUT', 5))
+            self.local = _tiers[location]
+
+    @property
+    def shared(self):
+        return caches[self.shared_alias]
+
+    def close(self, **kwargs):
+        # Локальный уровень и подписка живут весь процесс, закрывается только соединение общего кэша
+        self.shared.close(**kwargs)
+
+    # API кэша Django. Локальные ключи - полные (с префиксом и версией), как в общем кэше
+
+    def local_key(self, key, version):
+        """Ключ локального уровня или None, если ключ не из LOCAL_KEY_PREFIXES"""
+        if self.local_key_prefixes and not key.startswith(self.local_key_prefixes):
+            return None
+        return self.make_and_validate_key(key, version=version)
+
+    def get(self, key, default=None, version=None):
+        local_key = self.local_key(key, version)
+        if local_key is not None:
+            value = self.local.get(local_key)
+            if value is not _MISSING:
+                return value
+        generation = self.local.generation
+        value = self.shared.get(key, _MISSING, version=version)
+        if value is _MISSING:
+            return default
+        if local_key is not None:
+            self.local.set(local_key, value, generation)
+        return value
+
+    def get_many(self, keys, version=None):
+        found, missing = {}, []
+        for key in keys:
+            local_key = self.local_key(key, version)
+            value = self.local.get(local_key) if local_key is not None else _MISSING
+            if value is _MISSING:
+                missing.append(key)
+            else:
+                found[key] = value
+        if missing:
+            generation = self.local.generation
+            values = self.shared.get_many(missing, version=version)
+            for key, value in values.items():
+                local_key = self.local_key(key, version)
+                if local_key is not None:
+                    self.local.set(local_key, value, generation)
+            found.update(values)
+        return found
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        self.shared.set(key, value, timeout, version=version)
+        self.written([key], version)
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        failed = self.shared.set_many(data, timeout, version=version)
+        self.written(list(data), version)
+        return failed
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        generation = self.local.generation
+        added = self.shared.add(key, value, timeout, version=version)
+        local_key = self.local_key(key, version) if added else None
+        if local_key is not None:
+            # Ключа в общем кэше не было - прочитать его раньше никто не мог, рассылать нечего
+            self.local.set(local_key, value, generation)
+        return added
+
+    def incr(self, key, delta=1, version=None):
+        value = self.shared.incr(key, delta, version=version)
+        self.written([key], version)
+        return value
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        return self.shared.touch(key, timeout, version=version)
+
+    def delete(self, key, version=None):
+        deleted = self.shared.delete(key, version=version)
+        self.written([key], version)
+        return deleted
+
+    def delete_many(self, keys, version=None):
+        self.shared.delete_many(keys, version=version)
+        self.written(list(keys), version)
+
+    def has_key(self, key, version=None):
+        local_key = self.local_key(key, version)
+        if local_key is not None and self.local.get(local_key) is not _MISSING:
+            return True
+        return self.shared.has_key(key, version=version)
+
+    def clear(self):
+        self.shared.clear()
+        self.local.invalidate()
+
+    def written(self, keys, version):
+        """После записи в общий кэш локальная копия и копии других процессов устарели"""
+        self.local.invalidate([
+            local_key for local_key in (self.local_key(key, version) for key in keys) if local_key is not None
+        ])
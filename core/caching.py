@@ -0,0 +1,139 @@
+"""
+Кэш результатов запросов с инвалидацией по версиям моделей. Модуль не импортирует
+модели, поэтому cached_query можно вешать и на менеджеры в core/models.py: зависимости
+задаются метками ('core.Task') и разрешаются при первом вызове.
+"""
+import hashlib
+import json
+import time
+from functools import wraps
+
+from django.apps import apps
+from django.core.cache import cache
+from django.db import models, transaction
+
+_MISSING = object()
+
+CACHE_PREFIX = 'unidoc'
+
+_cached_functions = {}
+
+def _resolve(depends_on):
+    return [apps.get_model(model) if isinstance(model, str) else model for model in depends_on]
+
+def _version_key(model):
+    return f"{CACHE_PREFIX}:version:{model._meta.label_lower}"
+
+def model_versions(*models_):
+    """
+    Текущие версии моделей. Начальное значение - время в наносекундах, чтобы после
+    вытеснения счетчика из кэша не вернуться к номерам, под которыми лежат старые данные.
+    """
+    keys = [_version_key(model) for model in models_]
+    versions = cache.get_many(keys)
+    for key in keys:
+        if key not in versions:
+            cache.add(key, time.time_ns(), None)
+            versions[key] = cache.get(key, 0)
+    return [versions[key] for key in keys]
+
+def bump_model_version(model):
+    """
+    Делает недействительными все закэшированные результаты, зависящие от модели
+    """
+    key = _version_key(model)
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, time.time_ns(), None)
+
+def bump_model_version_on_commit(model, using=None):
+    """
+    Меняет версию модели сразу (чтобы та же транзакция не прочитала старое) и еще раз после
+    коммита: иначе параллельный запрос успел бы закэшировать под новой версией еще старые
+    данные. Нужна после записей, которые идут без сигналов (update(), bulk_create())
+    """
+    bump_model_version(model)
+    transaction.on_commit(lambda: bump_model_version(model), using=using)
+
+def _count(name, outcome):
+    key = f"{CACHE_PREFIX}:stats:{name}:{outcome}"
+    if not cache.add(key, 1, None):
+        try:
+            cache.incr(key)
+        except ValueError:
+            pass
+
+def cache_stats():
+    """
+    Попадания и промахи по каждой закэшированной функции
+    """
+    keys = {
+        name: (f"{CACHE_PREFIX}:stats:{name}:hit", f"{CACHE_PREFIX}:stats:{name}:miss")
+        for name in _cached_functions
+    }
+    values = cache.get_many([key for pair in keys.values() for key in pair])
+    return {
+        name: {
+            'hits': values.get(hit_key, 0),
+            'misses': values.get(miss_key, 0),
+            'depends_on': [model._meta.label for model in _resolve(_cached_functions[name])],
+        }
+        for name, (hit_key, miss_key) in keys.items()
+    }
+
+def payload_key(model, pk, *validators):
+    """
+    Ключ сериализованного detail-ответа. validators - то, по чему строится ETag ответа
+    (updated_at, аннотации пользователя): при любом изменении объекта ключ новый, поэтому
+    записи не инвалидируются, а просто перестают читаться.
+    """
+    digest = hashlib.md5(repr(validators).encode()).hexdigest()
+    return f"{CACHE_PREFIX}:payload:{model._meta.label_lower}:{pk}:{digest}"
+
+def _key_part(value):
+    if isinstance(value, models.Model):
+        return f"{value._meta.label_lower}:{value.pk}"
+    if isinstance(value, models.Manager):
+        return value.model._meta.label_lower
+    if isinstance(value, (list, tuple)):
+        return [_key_part(item) for item in value]
+    if isinstance(value, dict):
+        return {str(key): _key_part(item) for key, item in value.items()}
+    return value
+
+def cached_query(*depends_on, timeout=300):
+    """
+    Декоратор для кэширования результатов запросов.
+    QuerySet материализуется в список до записи в кэш. Ключ строится из модели
+    (пространство имен), имени функции, версий моделей depends_on и аргументов, поэтому
+    любое сохранение или удаление объекта этих моделей делает старые записи недоступными.
+    depends_on - классы моделей или их метки ('core.Task').
+    Массовые update()/bulk_create() сигналов не шлют - после них нужен bump_model_version_on_commit.
+    """
+    def decorator(func):
+        name = f"{func.__module__}.{func.__qualname__}"
+        _cached_functions[name] = depends_on
+
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            models_ = _resolve(depends_on)
+            versions = '.'.join(str(version) for version in model_versions(*models_))
+            arguments = json.dumps(_key_part([args, kwargs]), sort_keys=True, default=str)
+            digest = hashlib.md5(arguments.encode()).hexdigest()
+            cache_key = f"{CACHE_PREFIX}:{models_[0]._meta.label_lower}:{name}:{versions}:{digest}"
+
+            result = cache.get(cache_key, _MISSING)
+            if result is not _MISSING:
+                _count(name, 'hit')
+                return result
+
+            _count(name, 'miss')
+            result = func(*args, **kwargs)
+            if isinstance(result, models.QuerySet):
+                result = list(result)
+            # Под ключом с версиями значение не меняется: add не рассылает инвалидаций (TwoTierCache)
+            cache.add(cache_key, result, timeout)
+            return result
+        return wrapper
+    return decorator
@@ -0,0 +1,204 @@
+from collections import Counter, defaultdict
+
+from django.db import transaction
+from django.db.models import Count, F, OuterRef, Q, Subquery
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .caching import bump_model_version_on_commit
+from .models import ACTIVE_TASK_STATUSES, Topic, Project, Task, Subtask, Comment
+
+
+def task_weight(status):
+    """Вклад задачи в счетчики проекта: (активные, завершенные)"""
+    return int(status in ACTIVE_TASK_STATUSES), int(status == 'done')
+
+
+def adjust_topic(topic_id, active_projects):
+    if not topic_id or not active_projects:
+        return
+    Topic.objects.filter(pk=topic_id).update(
+        active_projects_count=F('active_projects_count') + active_projects, updated_at=timezone.now()
+    )
+    bump_model_version_on_commit(Topic)
+
+
+def adjust_project(project_id, active=0, completed=0):
+    """
+    Сдвигает счетчики задач проекта. Если проект стал активным или перестал им быть,
+    сдвигает и счетчик активных проектов темы. UPDATE держит блокировку строки проекта
+    до конца транзакции, поэтому перечитанное значение - наше, и переход через ноль
+    учитывается ровно одним из параллельных запросов.
+    """
+    if not project_id or not (active or completed):
+        return
+    with transaction.atomic(savepoint=False):
+        Project.objects.filter(pk=project_id).update(
+            active_tasks_count=F('active_tasks_count') + active,
+            completed_tasks_count=F('completed_tasks_count') + completed,
+            updated_at=timezone.now(),
+        )
+        bump_model_version_on_commit(Project)
+        if not active:
+            return
+        row = Project.objects.filter(pk=project_id).values_list('active_tasks_count', 'topic_id').first()
+        if row is None:
+            return
+        current, topic_id = row
+        was_active, is_active = current - active > 0, current > 0
+        if was_active != is_active:
+            adjust_topic(topic_id, 1 if is_active else -1)
+
+
+def adjust_task(task_id, subtasks=0, comments=0):
+    if not task_id or not (subtasks or comments):
+        return
+    Task.objects.filter(pk=task_id).update(
+        subtasks_count=F('subtasks_count') + subtasks,
+        comments_count=F('comments_count') + comments,
+        updated_at=timezone.now(),
+    )
+    bump_model_version_on_commit(Task)
+
+
+def original(instance, name):
+    """Значение поля на момент загрузки из базы (или текущее, если объект не из базы)"""
+    return getattr(instance, '_tracked', {}).get(name, getattr(instance, name))
+
+
+def load_tracked(instance):
+    """Дочитывает из базы исходные значения отслеживаемых полей, которых нет в памяти"""
+    if instance.pk is None:
+        return
+    tracked = getattr(instance, '_tracked', {})
+    missing = [name for name in instance.tracked_fields if name not in tracked]
+    if missing:
+        row = type(instance)._base_manager.filter(pk=instance.pk).values(*missing).first()
+        instance._tracked = {**tracked, **(row or {})}
+
+
+def adjust_projects(changes):
+    """Сдвигает счетчики по списку (project_id, активные, завершенные): один UPDATE на проект"""
+    weights = defaultdict(lambda: [0, 0])
+    for project_id, active, completed in changes:
+        weights[project_id][0] += active
+        weights[project_id][1] += completed
+    with transaction.atomic(savepoint=False):
+        for project_id, (active, completed) in weights.items():
+            adjust_project(project_id, active, completed)
+
+
+def tasks_created(tasks):
+    """Счетчики для задач, созданных в обход сигналов (bulk_create)"""
+    adjust_projects((task.project_id, *task_weight(task.status)) for task in tasks)
+
+
+def tasks_status_changed(changes, status):
+    """Счетчики для задач, переведенных в status одним UPDATE; changes - пары (прежний статус, project_id)"""
+    active, completed = task_weight(status)
+    deltas = []
+    for old, project_id in changes:
+        old_active, old_completed = task_weight(old)
+        deltas.append((project_id, active - old_active, completed - old_completed))
+    adjust_projects(deltas)
+
+
+def subtasks_created(subtasks):
+    """Счетчики для подзадач, созданных в обход сигналов (bulk_create): один UPDATE на задачу"""
+    for task_id, count in Counter(subtask.task_id for subtask in subtasks).items():
+        adjust_task(task_id, subtasks=count)
+
+
+def task_saved(task, created):
+    old_project_id = None if created else task._tracked.get('project_id')
+    old_active, old_completed = (0, 0) if created else task_weight(task._tracked.get('status'))
+    active, completed = task_weight(task.status)
+    if old_project_id == task.project_id:
+        adjust_project(task.project_id, active - old_active, completed - old_completed)
+    else:
+        adjust_project(old_project_id, -old_active, -old_completed)
+        adjust_project(task.project_id, active, completed)
+
+
+def task_deleted(task):
+    active, completed = task_weight(original(task, 'status'))
+    adjust_project(original(task, 'project_id'), -active, -completed)
+
+
+def project_saved(project, created):
+    old_topic_id = None if created else project._tracked.get('topic_id')
+    if created or old_topic_id == project.topic_id:
+        return
+    active = Project.objects.filter(pk=project.pk, active_tasks_count__gt=0).exists()
+    if active:
+        adjust_topic(old_topic_id, -1)
+        adjust_topic(project.topic_id, 1)
+
+
+def child_deleted(instance, field):
+    adjust_task(original(instance, 'task_id'), **{field: -1})
+
+
+def child_saved(instance, created, field):
+    """Подзадача или комментарий: +1 новой задаче и -1 старой при переносе"""
+    old_task_id = None if created else instance._tracked.get('task_id')
+    if old_task_id == instance.task_id:
+        return
+    adjust_task(old_task_id, **{field: -1})
+    adjust_task(instance.task_id, **{field: 1})
+
+
+def count_of(queryset, field, distinct=False):
+    """Подзапрос: сколько строк queryset ссылаются полем field на текущую строку"""
+    counts = queryset.filter(**{field: OuterRef('pk')}).order_by().values(field).annotate(
+        count=Count('pk', distinct=distinct)
+    ).values('count')
+    return Coalesce(Subquery(counts), 0)
+
+
+def expected_counters(model):
+    """Выражения, по которым счетчики модели пересчитываются с нуля"""
+    if model is Task:
+        return {
+            'subtasks_count': count_of(Subtask.objects.all(), 'task'),
+            'comments_count': count_of(Comment.objects.all(), 'task'),
+        }
+    if model is Project:
+        return {
+            'active_tasks_count': count_of(Task.objects.filter(status__in=ACTIVE_TASK_STATUSES), 'project'),
+            'completed_tasks_count': count_of(Task.objects.filter(status='done'), 'project'),
+        }
+    if model is Topic:
+        active_projects = Project.objects.filter(tasks__status__in=ACTIVE_TASK_STATUSES)
+        return {'active_projects_count': count_of(active_projects, 'topic', distinct=True)}
+    raise ValueError(f'У модели {model.__name__} нет счетчиков')
+
+
+def reconcile(model, fix=True, batch_size=1000):
+    """
+    Сравнивает счетчики модели с пересчитанными и (при fix) исправляет расхождения.
+    Исправление записывается сдвигом x = x + (ожидаемое - прочитанное), поэтому
+    инкременты, сделанные параллельно между чтением и записью, не теряются.
+    Возвращает (число строк с расхождением, суммарное абсолютное расхождение).
+    """
+    expected = {f'expected_{name}': expression for name, expression in expected_counters(model).items()}
+    names = [name[len('expected_'):] for name in expected]
+    drift = Q()
+    for name in names:
+        drift |= ~Q(**{name: F(f'expected_{name}')})
+    rows = model._base_manager.annotate(**expected).filter(drift).values('pk', *names, *expected)
+
+    drifted, total = [], 0
+    now = timezone.now()
+    for row in rows.iterator(chunk_size=batch_size):
+        # updated_at сдвигается вместе со счетчиками: от него считается ETag (см. ConditionalGetMixin)
+        obj = model(pk=row['pk'], updated_at=now)
+        for name in names:
+            delta = row[f'expected_{name}'] - row[name]
+            total += abs(delta)
+            setattr(obj, name, F(name) + delta)
+        drifted.append(obj)
+    if fix and drifted:
+        model._base_manager.bulk_update(drifted, [*names, 'updated_at'], batch_size=batch_size)
+        bump_model_version_on_commit(model)
+    return len(drifted), total
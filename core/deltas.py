@@ -0,0 +1,39 @@
+import difflib
+import hashlib
+import json
+
+
+def make_delta(base, text):
+    """
+    Строит построчную дельту text относительно base.
+    Формат - JSON-список: [i1, i2] копирует строки base[i1:i2], строка вставляется как есть.
+    """
+    base_lines = base.splitlines(keepends=True)
+    lines = text.splitlines(keepends=True)
+    ops = []
+    matcher = difflib.SequenceMatcher(None, base_lines, lines)
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        if tag == 'equal':
+            ops.append([i1, i2])
+        elif j2 > j1:
+            ops.append(''.join(lines[j1:j2]))
+    return json.dumps(ops, ensure_ascii=False, separators=(',', ':'))
+
+
+def apply_delta(base, delta):
+    """
+    Восстанавливает текст по base и дельте из make_delta
+    """
+    base_lines = base.splitlines(keepends=True)
+    parts = []
+    for op in json.loads(delta):
+        if isinstance(op, str):
+            parts.append(op)
+        else:
+            parts.append(''.join(base_lines[op[0]:op[1]]))
+    return ''.join(parts)
+
+
+def hash_content(text):
+    """Адрес текста в ContentBlob: SHA-256 от UTF-8, 64 шестнадцатеричных символа"""
+    return hashlib.sha256(text.encode()).hexdigest()
@@ -0,0 +1,72 @@
+import csv
+import json
+
+from django.core.serializers.json import DjangoJSONEncoder
+from rest_framework.renderers import BaseRenderer
+
+
+class EchoBuffer:
+    """Файлоподобный объект для csv.writer: write() просто возвращает строку"""
+
+    def write(self, value):
+        return value
+
+
+class RowsRenderer(BaseRenderer):
+    """
+    Рендерер выгрузки построчно. Потоковый экспорт вызывает render_rows напрямую,
+    render() нужен только для обычных ответов (ошибки авторизации, валидации и т.п.).
+    """
+    charset = 'utf-8'
+    encoder = DjangoJSONEncoder()
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        rows = data if isinstance(data, list) else [data]
+        fields = list(rows[0]) if rows and isinstance(rows[0], dict) else []
+        return ''.join(self.render_rows(rows, fields)).encode(self.charset)
+
+    def render_rows(self, rows, fields, chunk_size=1000):
+        """Генератор текста выгрузки: строки склеиваются пачками по chunk_size, а не отдаются по одной"""
+        chunk = [self.header(fields)]
+        for row in rows:
+            chunk.append(self.line(row, fields))
+            if len(chunk) >= chunk_size:
+                yield ''.join(chunk)
+                chunk = []
+        if chunk:
+            yield ''.join(chunk)
+
+    def header(self, fields):
+        return ''
+
+    def line(self, row, fields):
+        raise NotImplementedError
+
+
+class NDJSONRenderer(RowsRenderer):
+    """Одна JSON-строка на объект (newline-delimited JSON)"""
+    media_type = 'application/x-ndjson'
+    format = 'ndjson'
+
+    def line(self, row, fields):
+        return json.dumps(row, cls=DjangoJSONEncoder, ensure_ascii=False) + '\n'
+
+
+class CSVRenderer(RowsRenderer):
+    media_type = 'text/csv'
+    format = 'csv'
+
+    def __init__(self):
+        self.writer = csv.writer(EchoBuffer())
+
+    def header(self, fields):
+        return self.writer.writerow(fields)
+
+    def line(self, row, fields):
+        return self.writer.writerow([self.value(row.get(field)) for field in fields])
+
+    def value(self, value):
+        if value is None or isinstance(value, (str, int, float)):
+            return value
+        # Даты и Decimal - в том же виде, что и в JSON-ответах API
+        return self.encoder.default(value)
@@ -0,0 +1,98 @@
+import json
+import statistics
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.test import Client
+from django.utils.crypto import get_random_string
+from core.models import Task, Document
+
+# Эндпоинт: (путь синхронной версии, путь async-версии, тело POST или None)
+ENDPOINTS = {
+    'task-list': ('/api/tasks/', '/api/async/tasks/', None),
+    'task-detail': ('/api/tasks/{task}/', '/api/async/tasks/{task}/', None),
+    'project-list': ('/api/projects/', '/api/async/projects/', None),
+    'document-detail': ('/api/documents/{document}/', '/api/async/documents/{document}/', None),
+    'predict': (
+        '/api/predict-document-class/', '/api/async/predict-document-class/',
+        {'text': 'Акт выполненных работ по техническому обслуживанию самолета'},
+    ),
+}
+
+
+class Command(BaseCommand):
+    help = (
+        'Нагрузочный замер горячих эндпоинтов: синхронные вьюхи на WSGI-сервере против async-вьюх '
+        'на ASGI-сервере (пропускная способность и p50/p95/p99 при заданной параллельности). '
+        'Серверы запускаются отдельно, id объектов берутся из текущей базы.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--wsgi-url', default='http://127.0.0.1:8000', help='Адрес WSGI-сервера (gunicorn unidoc.wsgi)')
+        parser.add_argument('--asgi-url', default='http://127.0.0.1:8001', help='Адрес ASGI-сервера (gunicorn unidoc.asgi -k uvicorn.workers.UvicornWorker)')
+        parser.add_argument('--endpoint', action='append', choices=list(ENDPOINTS), help='По умолчанию - все')
+        parser.add_argument('--concurrency', type=int, default=32)
+        parser.add_argument('--requests', type=int, default=1000, help='Запросов на эндпоинт и сервер')
+        parser.add_argument('--warmup', type=int, default=50)
+        parser.add_argument('--username', default='admin', help='От чьего имени идут запросы')
+
+    def handle(self, *args, **options):
+        ids = {
+            'task': Task.objects.order_by('id').values_list('id', flat=True).first(),
+            'document': Document.objects.order_by('id').values_list('id', flat=True).first(),
+        }
+        if None in ids.values():
+            raise CommandError('Нет данных для замера, сначала: manage.py generate_test_data')
+        headers = {'Accept': 'application/json', **self.session_headers(options['username'])}
+
+        self.stdout.write(f'{"эндпоинт":<16} {"сервер":<5} {"rps":>8} {"p50 мс":>8} {"p95 мс":>8} {"p99 мс":>8} {"ошибок":>7}')
+        for name in options['endpoint'] or ENDPOINTS:
+            sync_path, async_path, body = ENDPOINTS[name]
+            for server, base_url, path in (('wsgi', options['wsgi_url'], sync_path), ('asgi', options['asgi_url'], async_path)):
+                url = base_url.rstrip('/') + path.format(**ids)
+                self.run(url, body, headers, options['warmup'], options['concurrency'])
+                elapsed, latencies, errors = self.run(url, body, headers, options['requests'], options['concurrency'])
+                p50, p95, p99 = (statistics.quantiles(latencies, n=100)[i] * 1000 for i in (49, 94, 98))
+                self.stdout.write(
+                    f'{name:<16} {server:<5} {options["requests"] / elapsed:>8.1f} {p50:>8.1f} {p95:>8.1f} {p99:>8.1f} {errors:>7}'
+                )
+
+    def session_headers(self, username):
+        """
+        Заголовки сессии пользователя. Basic-аутентификация считала бы хеш пароля на каждом
+        запросе, и замер показывал бы в основном его стоимость.
+        """
+        user = User.objects.filter(username=username).first()
+        if user is None:
+            raise CommandError(f'Нет пользователя {username}')
+        client = Client()
+        client.force_login(user)
+        csrf_token = get_random_string(32)
+        cookies = f'{settings.SESSION_COOKIE_NAME}={client.cookies[settings.SESSION_COOKIE_NAME].value}; {settings.CSRF_COOKIE_NAME}={csrf_token}'
+        return {'Cookie': cookies, 'X-CSRFToken': csrf_token}
+
+    def run(self, url, body, headers, count, concurrency):
+        """Делает count запросов в concurrency потоков; возвращает (общее время, задержки в секундах, число ошибок)"""
+        data = json.dumps(body).encode() if body is not None else None
+        request_headers = {**headers, 'Content-Type': 'application/json'} if data else headers
+
+        def request(_):
+            started = time.perf_counter()
+            try:
+                with urllib.request.urlopen(urllib.request.Request(url, data=data, headers=request_headers)) as response:
+                    response.read()
+                ok = True
+            except (urllib.error.URLError, ConnectionError):
+                ok = False
+            return time.perf_counter() - started, ok
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            results = list(pool.map(request, range(count)))
+        elapsed = time.perf_counter() - started
+        return elapsed, [latency for latency, _ in results], sum(not ok for _, ok in results)
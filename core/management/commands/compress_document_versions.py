@@ -0,0 +1,65 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from core.models import ContentBlob, Document, DocumentVersion
+
+
+class Command(BaseCommand):
+    help = 'Переводит существующие версии документов в хранение снимками (в блобах) и дельтами'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--interval', type=int, default=settings.DOCUMENT_VERSION_SNAPSHOT_INTERVAL,
+            help='Полный снимок каждые N версий (1 - развернуть все версии в полный текст)'
+        )
+        parser.add_argument('--document', type=int, action='append', help='Обработать только указанные документы')
+
+    def handle(self, *args, **options):
+        documents = Document.objects.order_by('id').values_list('id', flat=True)
+        if options['document']:
+            documents = documents.filter(id__in=options['document'])
+
+        size_before = size_after = 0
+        for document_id in documents.iterator():
+            before, after = self.convert_document(document_id, options['interval'])
+            size_before += before
+            size_after += after
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Версии пересобраны: {size_before} -> {size_after} символов'
+        ))
+
+    @staticmethod
+    def stored_size(versions):
+        # Блоб, общий для нескольких версий документа, считается один раз
+        blobs = {version.blob_id: len(version.blob.content) for version in versions if version.blob_id}
+        return sum(len(version.stored_content) + len(version.delta) for version in versions) + sum(blobs.values())
+
+    @transaction.atomic
+    def convert_document(self, document_id, interval):
+        versions = DocumentVersion.attach_bases(
+            DocumentVersion.objects.select_for_update()
+            .filter(document_id=document_id)
+            .order_by('version_number', 'id')
+        )
+        before = self.stored_size(versions)
+
+        # Тексты восстанавливаются до перекодирования, пока старые снимки на месте
+        contents = [version.content for version in versions]
+        snapshot, snapshot_deltas = None, 0
+        for version, content in zip(versions, contents):
+            version.content = content
+            if version.encode_against(snapshot, snapshot_deltas, interval):
+                snapshot_deltas += 1
+            else:
+                snapshot, snapshot_deltas = version, 0
+
+        # Снимки пишутся раньше дельт, чтобы ни одна дельта не ссылалась на еще не полный снимок
+        snapshots = [version for version in versions if version.base_id is None]
+        deltas = [version for version in versions if version.base_id is not None]
+        ContentBlob.store([version.blob for version in snapshots])
+        fields = ['stored_content', 'blob', 'content_hash', 'base', 'delta']
+        DocumentVersion.objects.bulk_update(snapshots, fields)
+        DocumentVersion.objects.bulk_update(deltas, fields)
+
+        return before, self.stored_size(versions)
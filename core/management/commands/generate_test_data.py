@@ -1,154 +1,86 @@
-from django.core.management.base import BaseCommand
+import time
+from datetime import date, datetime, timezone
+
+from django.contrib.auth.hashers import make_password
 from django.contrib.auth.models import User
-from core.models import Topic, Project, ProjectSettings, Task, TaskDetail, Subtask, Comment, Document, DocumentVersion, Template
-from datetime import datetime, timedelta
-import random
+from django.core.management.base import BaseCommand
+from core.seeding import DEFAULT_UNTIL, Seeder
+
 
 class Command(BaseCommand):
-    help = 'Генерирует тестовые данные для CRM системы авиакомпании'
+    help = (
+        'Генерирует тестовые данные для CRM системы авиакомпании. Данные детерминированы (--seed), '
+        'повторный запуск догружает только недостающие темы. '
+        '--scale 1000 с пропорциями по умолчанию дает миллион задач.'
+    )
 
-    def handle(self, *args, **kwargs):
+    def add_arguments(self, parser):
+        parser.add_argument('--scale', type=int, default=1, help='Количество тем (единица масштаба)')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--users', type=int, default=20, help='Количество пользователей user1..userN')
+        parser.add_argument('--projects-per-topic', type=int, default=10)
+        parser.add_argument('--tasks-per-project', type=int, default=100)
+        parser.add_argument('--subtasks-per-task', type=int, default=2, help='В среднем')
+        parser.add_argument('--comments-per-task', type=int, default=3, help='В среднем')
+        parser.add_argument('--documents-per-project', type=int, default=5, help='В среднем')
+        parser.add_argument('--versions-per-document', type=int, default=4, help='В среднем, не меньше 1')
+        parser.add_argument('--days', type=int, default=365, help='За сколько дней распределить даты создания')
+        parser.add_argument(
+            '--until', type=date.fromisoformat, default=DEFAULT_UNTIL.date(),
+            help=f'Дата (ГГГГ-ММ-ДД), к которой заканчивается период дат; по умолчанию {DEFAULT_UNTIL.date()}'
+        )
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--workers', type=int, default=1, help='Параллельных процессов загрузки (Postgres)')
+        parser.add_argument(
+            '--no-search-index', action='store_true',
+            help='Не считать поисковые векторы (потом: manage.py rebuild_search_index)'
+        )
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
         # Создаем суперпользователя, если его нет
         if not User.objects.filter(username='admin').exists():
             User.objects.create_superuser('admin', 'admin@example.com', 'admin123')
             self.stdout.write('Создан суперпользователь admin/admin123')
 
-        # Создаем обычных пользователей
-        users = []
-        for i in range(3):
-            username = f'user{i+1}'
-            user = User.objects.filter(username=username).first()
-            if not user:
-                user = User.objects.create_user(username, f'{username}@example.com', 'password123')
-                self.stdout.write(f'Создан пользователь {username}/password123')
-            users.append(user)
-
-        # Создаем тему
-        topic = Topic.objects.create(
-            name='CRM Система Авиакомпании',
-            description='Разработка и внедрение CRM системы для управления клиентами авиакомпании'
+        seeder = Seeder(
+            users=self.create_users(options['users']),
+            seed=options['seed'],
+            projects_per_topic=options['projects_per_topic'],
+            tasks_per_project=options['tasks_per_project'],
+            subtasks_per_task=options['subtasks_per_task'],
+            comments_per_task=options['comments_per_task'],
+            documents_per_project=options['documents_per_project'],
+            versions_per_document=max(options['versions_per_document'], 1),
+            days=options['days'],
+            until=datetime.combine(options['until'], datetime.min.time(), tzinfo=timezone.utc),
+            batch_size=options['batch_size'],
+            search_index=not options['no_search_index'],
         )
-        self.stdout.write('Создана тема: CRM Система Авиакомпании')
-
-        # Создаем шаблоны
-        templates = [
-            Template.objects.create(
-                name='Шаблон требования',
-                content='''# Требования к функционалу
-## Описание
-{description}
-## Критерии приемки
-{criteria}''',
-                topic=topic
-            ),
-            Template.objects.create(
-                name='Шаблон документации',
-                content='''# Документация
-## Назначение
-{purpose}
-## Структура
-{structure}''',
-                topic=topic
-            )
-        ]
-        self.stdout.write('Созданы шаблоны документов')
+        created = seeder.run(options['scale'], workers=options['workers'])
 
-        # Создаем проекты
-        projects = [
-            Project.objects.create(
-                name='Анализ требований',
-                description='Сбор и анализ требований к CRM системе',
-                topic=topic
-            ),
-            Project.objects.create(
-                name='Разработка модуля бронирования',
-                description='Разработка модуля для управления бронированиями',
-                topic=topic
-            ),
-            Project.objects.create(
-                name='Интеграция с платежными системами',
-                description='Интеграция CRM с платежными системами',
-                topic=topic
-            )
-        ]
-        self.stdout.write('Созданы проекты')
-
-        # Создаем настройки проектов
-        for project in projects:
-            ProjectSettings.objects.create(
-                project=project,
-                notification_enabled=True,
-                template_default=random.choice(templates)
-            )
-        self.stdout.write('Созданы настройки проектов')
-
-        # Создаем задачи
-        tasks = []
-        for project in projects:
-            project_tasks = [
-                Task.objects.create(
-                    title=f'Задача {i+1} для {project.name}',
-                    description=f'Описание задачи {i+1} для проекта {project.name}',
-                    project=project,
-                    status=random.choice(['new', 'in_progress', 'review', 'done']),
-                    assigned_to=random.choice(users) if users else None
-                )
-                for i in range(3)
-            ]
-            tasks.extend(project_tasks)
-        self.stdout.write('Созданы задачи')
-
-        # Создаем детали задач
-        for task in tasks:
-            TaskDetail.objects.create(
-                task=task,
-                requirements=f'Требования для задачи {task.title}',
-                acceptance_criteria=f'Критерии приемки для задачи {task.title}'
-            )
-        self.stdout.write('Созданы детали задач')
-
-        # Создаем подзадачи
-        for task in tasks:
-            for i in range(2):
-                Subtask.objects.create(
-                    title=f'Подзадача {i+1} для {task.title}',
-                    description=f'Описание подзадачи {i+1} для задачи {task.title}',
-                    task=task,
-                    status=random.choice(['new', 'in_progress', 'review', 'done'])
-                )
-        self.stdout.write('Созданы подзадачи')
-
-        # Создаем комментарии
-        for task in tasks:
-            for i in range(2):
-                if users:
-                    Comment.objects.create(
-                        content=f'Комментарий {i+1} к задаче {task.title}',
-                        task=task,
-                        author=random.choice(users)
-                    )
-        self.stdout.write('Созданы комментарии')
-
-        # Создаем документы
-        documents = []
-        for project in projects:
-            doc = Document.objects.create(
-                title=f'Документация проекта {project.name}',
-                content=f'Содержание документации проекта {project.name}',
-                project=project
-            )
-            documents.append(doc)
-        self.stdout.write('Созданы документы')
-
-        # Создаем версии документов
-        for doc in documents:
-            for i in range(2):
-                DocumentVersion.objects.create(
-                    document=doc,
-                    content=f'Версия {i+1} документа {doc.title}',
-                    version_number=i+1,
-                    created_by=random.choice(users) if users else None
-                )
-        self.stdout.write('Созданы версии документов')
+        if created['skipped']:
+            self.stdout.write(f'Уже загружено тем: {created["skipped"]}')
+        self.stdout.write(
+            f'Создано тем: {created["topics"]}, проектов: {created["projects"]}, задач: {created["tasks"]}, '
+            f'подзадач: {created["subtasks"]}, комментариев: {created["comments"]}, '
+            f'документов: {created["documents"]}, версий: {created["versions"]}'
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f'Тестовые данные успешно созданы за {time.monotonic() - started:.1f} с'
+        ))
 
-        self.stdout.write(self.style.SUCCESS('Тестовые данные успешно созданы!')) 
\ No newline at end of file
+    def create_users(self, count):
+        """Пользователи user1..userN (пароль password123); недостающие создаются одним запросом"""
+        usernames = [f'user{i + 1}' for i in range(count)]
+        existing = set(User.objects.filter(username__in=usernames).values_list('username', flat=True))
+        # Хеш пароля дорогой, для тестовых пользователей достаточно посчитать его один раз
+        password = make_password('password123')
+        User.objects.bulk_create([
+            User(username=username, email=f'{username}@example.com', password=password)
+            for username in usernames if username not in existing
+        ])
+        if len(existing) < count:
+            self.stdout.write(f'Создано пользователей: {count - len(existing)} (user1..user{count}/password123)')
+        users = User.objects.in_bulk(usernames, field_name='username')
+        return [users[username] for username in usernames]
@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand, CommandError
+from core.models import Comment, Document, DocumentVersion, Template
+from core.search import is_postgres, update_vectors
+
+MODELS = {model.__name__.lower(): model for model in (Document, DocumentVersion, Comment, Template)}
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает поисковые векторы (search_vector) для существующих записей'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--model', choices=sorted(MODELS), action='append', help='Пересчитать только указанные модели')
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        if not is_postgres():
+            raise CommandError('Полнотекстовый индекс поддерживается только на PostgreSQL')
+
+        for name in options['model'] or MODELS:
+            model = MODELS[name]
+            count = update_vectors(model.objects.all(), options['batch_size'])
+            self.stdout.write(f'{model.__name__}: пересчитано {count}')
+
+        self.stdout.write(self.style.SUCCESS('Поисковый индекс пересобран'))
@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+from core.counters import reconcile
+from core.models import Topic, Project, Task
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает счетчики задач, подзадач, комментариев и активных проектов и сообщает о расхождениях'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help='Только показать расхождения, не исправлять')
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        fix = not options['dry_run']
+        drifted_total = 0
+        # Порядок важен только для отчета: счетчики тем считаются по задачам, а не по счетчикам проектов
+        for model in (Task, Project, Topic):
+            drifted, drift = reconcile(model, fix=fix, batch_size=options['batch_size'])
+            drifted_total += drifted
+            self.stdout.write(f'{model.__name__}: строк с расхождением {drifted}, суммарное расхождение {drift}')
+
+        if not drifted_total:
+            self.stdout.write(self.style.SUCCESS('Счетчики сходятся'))
+        elif fix:
+            self.stdout.write(self.style.SUCCESS(f'Исправлено строк: {drifted_total}'))
+        else:
+            self.stdout.write(self.style.WARNING(f'Найдено строк с расхождением: {drifted_total}'))
@@ -0,0 +1,28 @@
+import time
+
+from django.core.management.base import BaseCommand
+from core.stats import refresh_needed, refresh_stats, writes_since_refresh
+
+
+class Command(BaseCommand):
+    help = (
+        'Пересчитывает материализованные представления статистики тем и проектов. Без --force - только '
+        'если накопилось --min-writes записей или статистика старше --max-age секунд (для запуска из cron)'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--force', action='store_true', help='Пересчитать без проверки порогов')
+        parser.add_argument('--min-writes', type=int, help='По умолчанию STATS_REFRESH_WRITES')
+        parser.add_argument('--max-age', type=int, help='Секунд, по умолчанию STATS_MAX_AGE')
+        parser.add_argument(
+            '--blocking', action='store_true',
+            help='Без CONCURRENTLY: быстрее, но чтение статистики ждет конца пересчета'
+        )
+
+    def handle(self, *args, **options):
+        if not options['force'] and not refresh_needed(options['min_writes'], options['max_age']):
+            self.stdout.write(f'Статистика актуальна, записей с пересчета: {writes_since_refresh()}')
+            return
+        started = time.monotonic()
+        refresh_stats(concurrently=not options['blocking'])
+        self.stdout.write(self.style.SUCCESS(f'Статистика пересчитана за {time.monotonic() - started:.2f} с'))
@@ -0,0 +1,58 @@
+import os
+
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseForbidden
+from prometheus_client import (
+    CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Histogram, generate_latest, multiprocess
+)
+
+# Метрики одного процесса. Под gunicorn с несколькими воркерами нужно задать
+# PROMETHEUS_MULTIPROC_DIR: тогда значения пишутся в общие файлы и /metrics собирает все процессы.
+REQUEST_DURATION = Histogram(
+    'unidoc_request_duration_seconds', 'Время обработки запроса',
+    ['view', 'method'],
+)
+DB_TIME = Histogram(
+    'unidoc_db_time_seconds', 'Суммарное время SQL-запросов за запрос',
+    ['view', 'method'],
+    buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0),
+)
+DB_QUERIES = Histogram(
+    'unidoc_db_queries_per_request', 'Количество SQL-запросов за запрос',
+    ['view', 'method'],
+    buckets=(0, 1, 2, 3, 5, 8, 13, 21, 50, 100, 250),
+)
+DB_DUPLICATE_QUERIES = Counter(
+    'unidoc_db_duplicate_queries', 'Повторные SQL-запросы (тот же SQL с теми же параметрами)',
+    ['view', 'method'],
+)
+DB_SLOWEST_QUERY = Histogram(
+    'unidoc_db_slowest_query_seconds', 'Самый долгий SQL-запрос за запрос',
+    ['view', 'method'],
+    buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0),
+)
+
+
+def observe(view, method, duration, stats):
+    labels = (view, method)
+    REQUEST_DURATION.labels(*labels).observe(duration)
+    DB_TIME.labels(*labels).observe(stats.time)
+    DB_QUERIES.labels(*labels).observe(stats.count)
+    DB_SLOWEST_QUERY.labels(*labels).observe(stats.slowest)
+    if stats.duplicates:
+        DB_DUPLICATE_QUERIES.labels(*labels).inc(stats.duplicates)
+
+
+def metrics_view(request):
+    """
+    Метрики в текстовом формате Prometheus. Внутренний endpoint: доступен только
+    с адресов из METRICS_ALLOWED_IPS.
+    """
+    allowed = settings.METRICS_ALLOWED_IPS
+    if '*' not in allowed and request.META.get('REMOTE_ADDR') not in allowed:
+        return HttpResponseForbidden()
+    registry = REGISTRY
+    if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    return HttpResponse(generate_latest(registry), content_type=CONTENT_TYPE_LATEST)
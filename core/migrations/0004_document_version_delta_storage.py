@@ -0,0 +1,45 @@
+# Generated by Django 5.0.1 on 2026-10-18 05:40
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0003_created_at_indexes"),
+    ]
+
+    operations = [
+        # Поле переименовано только в состоянии моделей: колонка остается "content"
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.RenameField(
+                    model_name="documentversion",
+                    old_name="content",
+                    new_name="stored_content",
+                ),
+                migrations.AlterField(
+                    model_name="documentversion",
+                    name="stored_content",
+                    field=models.TextField(blank=True, db_column="content"),
+                ),
+            ],
+        ),
+        migrations.AddField(
+            model_name="documentversion",
+            name="base",
+            field=models.ForeignKey(
+                blank=True,
+                null=True,
+                on_delete=django.db.models.deletion.RESTRICT,
+                related_name="deltas",
+                to="core.documentversion",
+            ),
+        ),
+        migrations.AddField(
+            model_name="documentversion",
+            name="delta",
+            field=models.TextField(blank=True, default=""),
+        ),
+    ]
@@ -0,0 +1,67 @@
+# Generated by Django 5.0.1 on 2026-10-18 06:10
+
+import django.contrib.postgres.search
+from django.db import migrations
+
+SEARCH_TABLES = [
+    "core_document",
+    "core_documentversion",
+    "core_comment",
+    "core_template",
+]
+
+
+def create_gin_indexes(apps, schema_editor):
+    # GIN-индексы есть только в Postgres; на SQLite (тесты) поиск идет без индекса
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    for table in SEARCH_TABLES:
+        schema_editor.execute(
+            f"CREATE INDEX IF NOT EXISTS {table}_search_idx ON {table} USING gin (search_vector)"
+        )
+
+
+def drop_gin_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    for table in SEARCH_TABLES:
+        schema_editor.execute(f"DROP INDEX IF EXISTS {table}_search_idx")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0004_document_version_delta_storage"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="comment",
+            name="search_vector",
+            field=django.contrib.postgres.search.SearchVectorField(
+                editable=False, null=True
+            ),
+        ),
+        migrations.AddField(
+            model_name="document",
+            name="search_vector",
+            field=django.contrib.postgres.search.SearchVectorField(
+                editable=False, null=True
+            ),
+        ),
+        migrations.AddField(
+            model_name="documentversion",
+            name="search_vector",
+            field=django.contrib.postgres.search.SearchVectorField(
+                editable=False, null=True
+            ),
+        ),
+        migrations.AddField(
+            model_name="template",
+            name="search_vector",
+            field=django.contrib.postgres.search.SearchVectorField(
+                editable=False, null=True
+            ),
+        ),
+        migrations.RunPython(create_gin_indexes, drop_gin_indexes),
+    ]
@@ -0,0 +1,79 @@
+# Generated by Django 5.0.1 on 2026-10-18 06:40
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+ACTIVE_TASK_STATUSES = ["new", "in_progress"]
+
+
+def count_of(queryset, field, distinct=False):
+    counts = (
+        queryset.filter(**{field: OuterRef("pk")})
+        .order_by()
+        .values(field)
+        .annotate(count=Count("pk", distinct=distinct))
+        .values("count")
+    )
+    return Coalesce(Subquery(counts), 0)
+
+
+def fill_counters(apps, schema_editor):
+    Topic = apps.get_model("core", "Topic")
+    Project = apps.get_model("core", "Project")
+    Task = apps.get_model("core", "Task")
+    Subtask = apps.get_model("core", "Subtask")
+    Comment = apps.get_model("core", "Comment")
+    Task.objects.update(
+        subtasks_count=count_of(Subtask.objects.all(), "task"),
+        comments_count=count_of(Comment.objects.all(), "task"),
+    )
+    Project.objects.update(
+        active_tasks_count=count_of(
+            Task.objects.filter(status__in=ACTIVE_TASK_STATUSES), "project"
+        ),
+        completed_tasks_count=count_of(Task.objects.filter(status="done"), "project"),
+    )
+    Topic.objects.update(
+        active_projects_count=count_of(
+            Project.objects.filter(tasks__status__in=ACTIVE_TASK_STATUSES),
+            "topic",
+            distinct=True,
+        )
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0005_search_vectors"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="project",
+            name="active_tasks_count",
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name="project",
+            name="completed_tasks_count",
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name="task",
+            name="comments_count",
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name="task",
+            name="subtasks_count",
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name="topic",
+            name="active_projects_count",
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(fill_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,110 @@
+# Generated by Django 5.0.1 on 2026-10-18 06:56
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+# Статистика проекта: одна агрегация по задачам без COUNT(DISTINCT)
+PROJECT_STATS_SQL = """
+SELECT project.id AS project_id,
+       project.topic_id AS topic_id,
+       COUNT(task.id) AS total_tasks,
+       COUNT(task.id) FILTER (WHERE task.status IN ('new', 'in_progress')) AS active_tasks,
+       COUNT(task.id) FILTER (WHERE task.status = 'done') AS completed_tasks,
+       CURRENT_TIMESTAMP AS refreshed_at
+FROM core_project project
+LEFT JOIN core_task task ON task.project_id = project.id
+GROUP BY project.id, project.topic_id
+"""
+
+# Статистика темы считается по статистике проектов, поэтому обновляется после нее
+TOPIC_STATS_SQL = """
+SELECT topic.id AS topic_id,
+       COUNT(stats.project_id) AS total_projects,
+       COUNT(stats.project_id) FILTER (WHERE stats.active_tasks > 0) AS active_projects,
+       COUNT(stats.project_id) FILTER (WHERE stats.completed_tasks > 0) AS completed_projects,
+       COALESCE(SUM(stats.total_tasks), 0) AS total_tasks,
+       CURRENT_TIMESTAMP AS refreshed_at
+FROM core_topic topic
+LEFT JOIN core_projectstats stats ON stats.topic_id = topic.id
+GROUP BY topic.id
+"""
+
+
+def create_views(apps, schema_editor):
+    # На Postgres - материализованные представления с уникальным индексом (нужен для
+    # REFRESH ... CONCURRENTLY), на остальных базах (SQLite в тестах) - обычные
+    if schema_editor.connection.vendor != "postgresql":
+        schema_editor.execute(f"CREATE VIEW core_projectstats AS {PROJECT_STATS_SQL}")
+        schema_editor.execute(f"CREATE VIEW core_topicstats AS {TOPIC_STATS_SQL}")
+        return
+    schema_editor.execute(f"CREATE MATERIALIZED VIEW core_projectstats AS {PROJECT_STATS_SQL}")
+    schema_editor.execute("CREATE UNIQUE INDEX core_projectstats_project_idx ON core_projectstats (project_id)")
+    schema_editor.execute("CREATE INDEX core_projectstats_topic_idx ON core_projectstats (topic_id)")
+    schema_editor.execute(f"CREATE MATERIALIZED VIEW core_topicstats AS {TOPIC_STATS_SQL}")
+    schema_editor.execute("CREATE UNIQUE INDEX core_topicstats_topic_idx ON core_topicstats (topic_id)")
+
+
+def drop_views(apps, schema_editor):
+    kind = "MATERIALIZED VIEW" if schema_editor.connection.vendor == "postgresql" else "VIEW"
+    schema_editor.execute(f"DROP {kind} IF EXISTS core_topicstats")
+    schema_editor.execute(f"DROP {kind} IF EXISTS core_projectstats")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0007_query_indexes"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ProjectStats",
+            fields=[
+                (
+                    "project",
+                    models.OneToOneField(
+                        db_constraint=False,
+                        on_delete=django.db.models.deletion.DO_NOTHING,
+                        primary_key=True,
+                        related_name="stats",
+                        serialize=False,
+                        to="core.project",
+                    ),
+                ),
+                ("total_tasks", models.IntegerField()),
+                ("active_tasks", models.IntegerField()),
+                ("completed_tasks", models.IntegerField()),
+                ("refreshed_at", models.DateTimeField()),
+            ],
+            options={
+                "db_table": "core_projectstats",
+                "managed": False,
+            },
+        ),
+        migrations.CreateModel(
+            name="TopicStats",
+            fields=[
+                (
+                    "topic",
+                    models.OneToOneField(
+                        db_constraint=False,
+                        on_delete=django.db.models.deletion.DO_NOTHING,
+                        primary_key=True,
+                        related_name="stats",
+                        serialize=False,
+                        to="core.topic",
+                    ),
+                ),
+                ("total_projects", models.IntegerField()),
+                ("active_projects", models.IntegerField()),
+                ("completed_projects", models.IntegerField()),
+                ("total_tasks", models.IntegerField()),
+                ("refreshed_at", models.DateTimeField()),
+            ],
+            options={
+                "db_table": "core_topicstats",
+                "managed": False,
+            },
+        ),
+        migrations.RunPython(create_views, drop_views),
+    ]
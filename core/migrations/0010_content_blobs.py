@@ -0,0 +1,101 @@
+# Generated by Django 5.0.1 on 2026-10-18 07:18
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+
+from core.deltas import apply_delta, hash_content
+
+
+def move_snapshots_to_blobs(apps, schema_editor):
+    """
+    Переносит тексты снимков в блобы и считает content_hash всех версий. Заодно
+    перенумеровывает версии документов с повторяющимися номерами: без этого не создать
+    уникальный индекс (document, version_number) в 0011.
+    """
+    ContentBlob = apps.get_model("core", "ContentBlob")
+    DocumentVersion = apps.get_model("core", "DocumentVersion")
+    document_ids = list(
+        DocumentVersion.objects.order_by().values_list("document_id", flat=True).distinct()
+    )
+    for document_id in document_ids:
+        versions = list(
+            DocumentVersion.objects.filter(document_id=document_id)
+            .order_by("version_number", "id")
+            .only("id", "version_number", "stored_content", "base_id", "delta")
+        )
+        # Дельты ссылаются только на снимки своего документа
+        snapshots = {
+            version.id: version.stored_content
+            for version in versions
+            if version.base_id is None
+        }
+        renumber = len({version.version_number for version in versions}) < len(versions)
+        blobs = {}
+        for number, version in enumerate(versions, start=1):
+            if version.base_id is None:
+                version.content_hash = hash_content(snapshots[version.id])
+                blobs[version.content_hash] = ContentBlob(
+                    hash=version.content_hash, content=snapshots[version.id]
+                )
+                version.blob_id, version.stored_content = version.content_hash, ""
+            else:
+                version.content_hash = hash_content(
+                    apply_delta(snapshots[version.base_id], version.delta)
+                )
+            if renumber:
+                version.version_number = number
+        ContentBlob.objects.bulk_create(blobs.values(), ignore_conflicts=True)
+        DocumentVersion.objects.bulk_update(
+            versions, ["stored_content", "blob", "content_hash", "version_number"]
+        )
+
+
+def restore_snapshots(apps, schema_editor):
+    ContentBlob = apps.get_model("core", "ContentBlob")
+    DocumentVersion = apps.get_model("core", "DocumentVersion")
+    DocumentVersion.objects.filter(blob__isnull=False).update(
+        stored_content=Subquery(
+            ContentBlob.objects.filter(hash=OuterRef("blob_id")).values("content")[:1]
+        )
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0009_comment_thread_indexes"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ContentBlob",
+            fields=[
+                (
+                    "hash",
+                    models.CharField(max_length=64, primary_key=True, serialize=False),
+                ),
+                ("content", models.TextField()),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name="documentversion",
+            name="content_hash",
+            field=models.CharField(blank=True, default="", max_length=64),
+        ),
+        migrations.AddField(
+            model_name="documentversion",
+            name="blob",
+            field=models.ForeignKey(
+                blank=True,
+                null=True,
+                on_delete=django.db.models.deletion.PROTECT,
+                related_name="versions",
+                to="core.contentblob",
+            ),
+        ),
+        migrations.RunPython(move_snapshots_to_blobs, restore_snapshots),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 5.0.1 on 2026-10-18 07:18
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    # Отдельно от 0010: на PostgreSQL ALTER TABLE нельзя в одной транзакции с
+    # обновлением строк, у которых есть отложенные проверки внешних ключей
+    dependencies = [
+        ("core", "0010_content_blobs"),
+    ]
+
+    operations = [
+        migrations.AddConstraint(
+            model_name="documentversion",
+            constraint=models.UniqueConstraint(
+                fields=("document", "version_number"),
+                name="version_document_number_uniq",
+            ),
+        ),
+    ]
@@ -1,50 +1,146 @@
-from django.db import models
+from django.db import models, transaction
+from django.conf import settings
 from django.contrib.auth.models import User
-from django.db.models import Count, Q
+from django.contrib.postgres.search import SearchVectorField
 from django.utils import timezone
+from .caching import cached_query
+from .deltas import apply_delta, hash_content, make_delta
+
+ACTIVE_TASK_STATUSES = ('new', 'in_progress')
+# Через сколько открытая задача считается просроченной
+OVERDUE_AFTER = timezone.timedelta(days=7)
+
+class CounterFieldsMixin:
+    """
+    Поля-счетчики (counter_fields) меняются только атомарными UPDATE ... SET x = x + 1
+    (core/counters.py), поэтому обычный save() существующего объекта их не перезаписывает:
+    иначе устаревшее значение из памяти затерло бы чужие инкременты.
+    """
+    counter_fields = ()
+
+    def save(self, *args, **kwargs):
+        if not self._state.adding and kwargs.get('update_fields') is None and not kwargs.get('force_insert'):
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name not in self.counter_fields
+            ]
+        super().save(*args, **kwargs)
+
+class TrackChangesMixin:
+    """
+    Запоминает значения tracked_fields на момент загрузки из базы, чтобы обработчики
+    сигналов видели, что поменялось (статус задачи, перенос в другой проект и т.п.).
+    Сохранение и пересчет счетчиков в сигналах идут в одной транзакции.
+    """
+    tracked_fields = ()
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance.remember_tracked()
+        return instance
+
+    def remember_tracked(self):
+        # Отложенные (defer/only) поля не попадают сюда, их дочитывает pre_save
+        self._tracked = {name: self.__dict__[name] for name in self.tracked_fields if name in self.__dict__}
+
+    def save(self, *args, **kwargs):
+        with transaction.atomic(using=kwargs.get('using'), savepoint=False):
+            super().save(*args, **kwargs)
 
 class TopicManager(models.Manager):
+    def get_queryset(self):
+        from .optimizations import TopicQuerySet
+        return TopicQuerySet(self.model, using=self._db)
+
     def get_active_topics(self):
         """Получить темы с активными проектами"""
-        return self.annotate(
-            active_projects=Count('projects', filter=Q(projects__tasks__status__in=['new', 'in_progress']))
-        ).filter(active_projects__gt=0)
+        return self.get_queryset().with_active_projects()
+
+    @cached_query('core.Topic', timeout=300)
+    def get_detail(self, pk):
+        """Тема для detail-ответа API (None, если ее нет); из кэша до записи в темы"""
+        return self.get_queryset().filter(pk=pk).first()
 
-class Topic(models.Model):
+    @cached_query('core.Topic', 'core.Project', 'core.Task', timeout=300)
+    def get_topics_with_stats(self):
+        return self.get_queryset().with_project_stats()
+
+class Topic(CounterFieldsMixin, models.Model):
     name = models.CharField(max_length=100)
     description = models.TextField(blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+    # Проекты темы, в которых есть задачи new/in_progress (поддерживается core/counters.py)
+    active_projects_count = models.PositiveIntegerField(default=0, editable=False)
+
+    counter_fields = ('active_projects_count',)
 
     objects = TopicManager()
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['created_at', 'id'], name='topic_created_id_idx'),
+            models.Index(fields=['name', 'id'], name='topic_name_id_idx'),
+        ]
+
     def __str__(self):
         return self.name
 
     def get_active_projects_count(self):
         """Получить количество активных проектов"""
-        return self.projects.filter(tasks__status__in=['new', 'in_progress']).distinct().count()
+        return self.projects.filter(tasks__status__in=ACTIVE_TASK_STATUSES).distinct().count()
 
 class ProjectManager(models.Manager):
+    def get_queryset(self):
+        from .optimizations import ProjectQuerySet
+        return ProjectQuerySet(self.model, using=self._db)
+
     def get_projects_with_tasks_count(self):
-        """Получить проекты с количеством задач"""
-        return self.annotate(tasks_count=Count('tasks'))
+        """Получить проекты с количеством задач (активных и завершенных) - хранятся в счетчиках"""
+        return self.get_queryset()
 
-class Project(models.Model):
+    # Правка настроек проекта сдвигает и версию проектов (core/signals.py, touch_parent)
+    @cached_query('core.Project', timeout=300)
+    def get_detail(self, pk):
+        """Проект с настройками для detail-ответа API (None, если его нет); из кэша до записи в проекты"""
+        return self.get_queryset().select_related('settings').filter(pk=pk).first()
+
+    @cached_query('core.Project', 'core.Task', timeout=300)
+    def get_projects_with_stats(self):
+        return self.get_queryset().with_task_stats()
+
+    @cached_query('core.Project', 'core.Topic', 'core.Task', 'core.Document', timeout=300)
+    def get_projects_with_related(self):
+        return self.get_queryset().with_related_data()
+
+class Project(CounterFieldsMixin, TrackChangesMixin, models.Model):
     name = models.CharField(max_length=100)
     description = models.TextField(blank=True)
     topic = models.ForeignKey(Topic, on_delete=models.CASCADE, related_name='projects')
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+    active_tasks_count = models.PositiveIntegerField(default=0, editable=False)
+    completed_tasks_count = models.PositiveIntegerField(default=0, editable=False)
+
+    counter_fields = ('active_tasks_count', 'completed_tasks_count')
+    tracked_fields = ('topic_id',)
 
     objects = ProjectManager()
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['created_at', 'id'], name='project_created_id_idx'),
+            models.Index(fields=['name', 'id'], name='project_name_id_idx'),
+            models.Index(fields=['topic', 'name'], name='project_topic_name_idx'),
+        ]
+
     def __str__(self):
         return self.name
 
     def get_active_tasks_count(self):
         """Получить количество активных задач"""
-        return self.tasks.filter(status__in=['new', 'in_progress']).count()
+        return self.tasks.filter(status__in=ACTIVE_TASK_STATUSES).count()
 
     def get_completed_tasks_count(self):
         """Получить количество завершенных задач"""
@@ -61,6 +157,10 @@ class ProjectSettings(models.Model):
         return f"Settings for {self.project.name}"
 
 class TaskManager(models.Manager):
+    def get_queryset(self):
+        from .optimizations import TaskQuerySet
+        return TaskQuerySet(self.model, using=self._db)
+
     def get_tasks_by_status(self, status):
         """Получить задачи по статусу"""
         return self.filter(status=status)
@@ -68,11 +168,19 @@ class TaskManager(models.Manager):
     def get_overdue_tasks(self):
         """Получить просроченные задачи"""
         return self.filter(
-            status__in=['new', 'in_progress'],
-            created_at__lt=timezone.now() - timezone.timedelta(days=7)
+            status__in=ACTIVE_TASK_STATUSES,
+            created_at__lt=timezone.now() - OVERDUE_AFTER
         )
 
-class Task(models.Model):
+    @cached_query('core.Task', 'core.TaskDetail', 'core.Subtask', 'core.Comment', timeout=300)
+    def get_tasks_with_related(self):
+        return self.get_queryset().with_related_data()
+
+    @cached_query('core.Task', 'core.Subtask', timeout=300)
+    def get_tasks_with_subtask_stats(self):
+        return self.get_queryset().with_subtask_stats()
+
+class Task(CounterFieldsMixin, TrackChangesMixin, models.Model):
     STATUS_CHOICES = [
         ('new', 'New'),
         ('in_progress', 'In Progress'),
@@ -87,16 +195,31 @@ class Task(models.Model):
     assigned_to = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+    subtasks_count = models.PositiveIntegerField(default=0, editable=False)
+    comments_count = models.PositiveIntegerField(default=0, editable=False)
+
+    counter_fields = ('subtasks_count', 'comments_count')
+    tracked_fields = ('status', 'project_id')
 
     objects = TaskManager()
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['created_at', 'id'], name='task_created_id_idx'),
+            models.Index(fields=['title', 'id'], name='task_title_id_idx'),
+            # И просроченные (get_overdue_tasks): status IN (...) AND created_at < ...
+            models.Index(fields=['status', 'created_at'], name='task_status_created_idx'),
+            models.Index(fields=['project', 'status'], name='task_project_status_idx'),
+            models.Index(fields=['assigned_to', 'status'], name='task_assignee_status_idx'),
+        ]
+
     def __str__(self):
         return self.title
 
     def is_overdue(self):
         """Проверить, просрочена ли задача"""
-        return (self.status in ['new', 'in_progress'] and 
-                self.created_at < timezone.now() - timezone.timedelta(days=7))
+        return (self.status in ACTIVE_TASK_STATUSES and 
+                self.created_at < timezone.now() - OVERDUE_AFTER)
 
     def get_subtasks_count(self):
         """Получить количество подзадач"""
@@ -116,7 +239,7 @@ class TaskDetail(models.Model):
     def __str__(self):
         return f"Details for {self.task.title}"
 
-class Subtask(models.Model):
+class Subtask(TrackChangesMixin, models.Model):
     title = models.CharField(max_length=200)
     description = models.TextField()
     task = models.ForeignKey(Task, on_delete=models.CASCADE, related_name='subtasks')
@@ -124,20 +247,50 @@ class Subtask(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    tracked_fields = ('task_id',)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['created_at', 'id'], name='subtask_created_id_idx'),
+            models.Index(fields=['task', 'status'], name='subtask_task_status_idx'),
+            models.Index(fields=['status', 'created_at'], name='subtask_status_created_idx'),
+        ]
+
     def __str__(self):
         return self.title
 
-class Comment(models.Model):
+class Comment(TrackChangesMixin, models.Model):
     content = models.TextField()
     task = models.ForeignKey(Task, on_delete=models.CASCADE, related_name='comments', null=True, blank=True)
     subtask = models.ForeignKey(Subtask, on_delete=models.CASCADE, related_name='comments', null=True, blank=True)
     author = models.ForeignKey(User, on_delete=models.CASCADE)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+    search_vector = SearchVectorField(null=True, editable=False)
+
+    tracked_fields = ('task_id',)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['created_at', 'id'], name='comment_created_id_idx'),
+            # Лента комментариев задачи и подзадачи (keyset по created_at, id) и последние комментарии
+            models.Index(fields=['task', 'created_at', 'id'], name='comment_task_created_id_idx'),
+            models.Index(fields=['subtask', 'created_at', 'id'], name='comment_subtask_created_id_idx'),
+            models.Index(fields=['author', 'created_at'], name='comment_author_created_idx'),
+        ]
 
     def __str__(self):
         return f"Comment by {self.author.username}"
 
+class DocumentManager(models.Manager):
+    def get_queryset(self):
+        from .optimizations import DocumentQuerySet
+        return DocumentQuerySet(self.model, using=self._db)
+
+    @cached_query('core.Document', 'core.DocumentVersion', timeout=300)
+    def get_documents_with_versions(self):
+        return self.get_queryset().with_versions()
+
 class Document(models.Model):
     title = models.CharField(max_length=200)
     content = models.TextField()
@@ -145,26 +298,225 @@ class Document(models.Model):
     task = models.ForeignKey(Task, on_delete=models.CASCADE, related_name='documents', null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+    # Поисковый вектор (только Postgres), поддерживается сигналами из core/signals.py
+    search_vector = SearchVectorField(null=True, editable=False)
+
+    objects = DocumentManager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['created_at', 'id'], name='document_created_id_idx'),
+            models.Index(fields=['project', 'created_at'], name='document_project_created_idx'),
+            models.Index(fields=['task', 'created_at'], name='document_task_created_idx'),
+        ]
 
     def __str__(self):
         return self.title
 
+    def add_version(self, content, created_by):
+        """
+        Сохраняет content новой версией документа и возвращает (версия, создана ли).
+        Если текст совпадает с последней версией, новая не создается - возвращается последняя.
+        Строка документа блокируется до конца транзакции, поэтому параллельные сохранения
+        получают номера по очереди, а не один и тот же "максимум плюс один".
+        """
+        with transaction.atomic():
+            list(Document.objects.select_for_update().filter(pk=self.pk).values_list('pk'))
+            latest = self.versions.order_by('-version_number').first()
+            if latest is not None and latest.content_hash == hash_content(content):
+                return latest, False
+            version = DocumentVersion(
+                document=self, version_number=latest.version_number + 1 if latest else 1, created_by=created_by
+            )
+            version.content = content
+            version.save()
+            return version, True
+
+class ContentBlob(models.Model):
+    """
+    Текст снимка версии, адресуемый хешем (SHA-256): одинаковые тексты - в том числе
+    шаблон, без правок размноженный по проектам, - хранятся одной строкой, сколько бы
+    версий на нее ни ссылалось. Блоб неизменяем.
+    """
+    hash = models.CharField(max_length=64, primary_key=True)
+    content = models.TextField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return self.hash[:12]
+
+    @classmethod
+    def store(cls, blobs):
+        """
+        Записывает еще не сохраненные блобы одним INSERT. Хеши, которые уже есть в базе,
+        пропускаются (ON CONFLICT DO NOTHING), так что гонка за один текст не страшна.
+        """
+        new = {blob.hash: blob for blob in blobs if blob._state.adding}
+        if new:
+            cls.objects.bulk_create(new.values(), ignore_conflicts=True)
+        for blob in blobs:
+            blob._state.adding = False
+
 class DocumentVersion(models.Model):
+    """
+    Версия документа. Хранится либо полным снимком (base пуст, текст в блобе blob),
+    либо дельтой относительно снимка base. Снимок делается каждые
+    DOCUMENT_VERSION_SNAPSHOT_INTERVAL версий, поэтому для восстановления любой версии
+    нужны один снимок и одна дельта. Текст версии читается и задается через content.
+    Снимки до миграции 0010 и созданные через bulk_create хранят текст в stored_content.
+    """
     document = models.ForeignKey(Document, on_delete=models.CASCADE, related_name='versions')
-    content = models.TextField()
+    stored_content = models.TextField(db_column='content', blank=True)
+    blob = models.ForeignKey(ContentBlob, on_delete=models.PROTECT, related_name='versions', null=True, blank=True)
+    # Хеш полного текста версии (и для дельт): по нему Document.add_version узнает повторное сохранение
+    content_hash = models.CharField(max_length=64, blank=True, default='')
+    base = models.ForeignKey('self', on_delete=models.RESTRICT, related_name='deltas', null=True, blank=True)
+    delta = models.TextField(blank=True, default='')
     version_number = models.IntegerField()
     created_at = models.DateTimeField(auto_now_add=True)
     created_by = models.ForeignKey(User, on_delete=models.CASCADE)
+    search_vector = SearchVectorField(null=True, editable=False)
+
+    _content = None
+    _content_changed = False
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['created_at', 'id'], name='documentversion_created_id_idx'),
+        ]
+        constraints = [
+            models.UniqueConstraint(fields=['document', 'version_number'], name='version_document_number_uniq'),
+        ]
 
     def __str__(self):
         return f"Version {self.version_number} of {self.document.title}"
 
+    @property
+    def content(self):
+        if self._content is None:
+            if self.base_id is None:
+                return self.snapshot_content
+            self._content = apply_delta(self.base.snapshot_content, self.delta)
+        return self._content
+
+    @content.setter
+    def content(self, value):
+        # До save() версия считается снимком с текстом в своей колонке, так что bulk_create
+        # сохраняет полный текст без блоба
+        self._content = value
+        self._content_changed = True
+        self.content_hash = hash_content(value)
+        self.stored_content = value
+        self.blob = None
+        self.base = None
+        self.delta = ''
+
+    @property
+    def snapshot_content(self):
+        return self.blob.content if self.blob_id else self.stored_content
+
+    @property
+    def is_snapshot(self):
+        return self.base_id is None
+
+    def save(self, *args, **kwargs):
+        if self._content_changed:
+            self.encode_content()
+        if self.blob_id and DocumentVersion.blob.is_cached(self):
+            ContentBlob.store([self.blob])
+        super().save(*args, **kwargs)
+
+    def encode_content(self):
+        """Решает, хранить версию снимком или дельтой к последнему снимку документа"""
+        if self.pk and self.deltas.exists():
+            raise ValueError('Нельзя изменить текст версии, от которой зависят дельты.')
+        snapshot = DocumentVersion.objects.filter(
+            document_id=self.document_id, base__isnull=True, version_number__lt=self.version_number
+        ).exclude(pk=self.pk).select_related('blob').order_by('-version_number', '-id').first()
+        snapshot_deltas = snapshot.deltas.count() if snapshot else 0
+        self.encode_against(snapshot, snapshot_deltas, settings.DOCUMENT_VERSION_SNAPSHOT_INTERVAL)
+
+    def encode_against(self, snapshot, snapshot_deltas, snapshot_interval):
+        """
+        Сохраняет текст дельтой к snapshot, если у снимка меньше snapshot_interval - 1 дельт
+        и дельта заметно меньше текста, иначе - полным снимком. Возвращает True для дельты.
+        Текст снимка уходит в блоб; несохраненный блоб пишет save() или вызывающий код
+        через ContentBlob.store до вставки версий.
+        """
+        content = self.content
+        self._content_changed = False
+        self.stored_content, self.base, self.delta = '', None, ''
+        self.blob = ContentBlob(hash=self.content_hash, content=content)
+        if snapshot is None or snapshot_interval <= 1 or snapshot_deltas >= snapshot_interval - 1:
+            return False
+        delta = make_delta(snapshot.snapshot_content, content)
+        # Дельта не окупается, если она сравнима по размеру с самим текстом
+        if len(delta) * 2 >= len(content):
+            return False
+        self.blob, self.base, self.delta = None, snapshot, delta
+        return True
+
+    @classmethod
+    def attach_bases(cls, versions):
+        """
+        Проставляет дельта-версиям их снимки: сначала из самого списка,
+        остальные - одним запросом (вместе с блобами). Возвращает список версий.
+        """
+        versions = list(versions)
+        by_id = {version.pk: version for version in versions}
+        missing = {
+            version.base_id for version in versions
+            if version.base_id and version.base_id not in by_id and not cls.base.is_cached(version)
+        }
+        if missing:
+            by_id.update(cls.objects.select_related('blob').only('id', 'stored_content', 'blob__content').in_bulk(missing))
+        for version in versions:
+            if version.base_id and not cls.base.is_cached(version):
+                cls.base.field.set_cached_value(version, by_id[version.base_id])
+        cls.attach_blobs([version.base if version.base_id else version for version in versions])
+        return versions
+
+    @classmethod
+    def attach_blobs(cls, snapshots):
+        """Подгружает одним запросом блобы снимков, не взятые через select_related('blob')"""
+        missing = {snapshot.blob_id for snapshot in snapshots if snapshot.blob_id and not cls.blob.is_cached(snapshot)}
+        if not missing:
+            return
+        blobs = ContentBlob.objects.in_bulk(missing)
+        for snapshot in snapshots:
+            if snapshot.blob_id and not cls.blob.is_cached(snapshot):
+                cls.blob.field.set_cached_value(snapshot, blobs[snapshot.blob_id])
+
+    @classmethod
+    def iter_contents(cls, queryset, *fields, chunk_size=2000):
+        """
+        Потоково отдает кортежи (текст версии, *fields) без создания объектов модели.
+        Текст снимка приходит вместе с дельтой через JOIN, поэтому память не зависит
+        от числа версий; на Postgres строки читаются серверным курсором по chunk_size.
+        """
+        rows = queryset.values_list(
+            'stored_content', 'blob__content', 'delta', 'base__stored_content', 'base__blob__content', *fields
+        )
+        for stored_content, blob_content, delta, base_content, base_blob_content, *values in rows.iterator(chunk_size=chunk_size):
+            if base_content is None:
+                content = stored_content if blob_content is None else blob_content
+            else:
+                content = apply_delta(base_content if base_blob_content is None else base_blob_content, delta)
+            yield (content, *values)
+
 class Template(models.Model):
     name = models.CharField(max_length=100)
     content = models.TextField()
     topic = models.ForeignKey(Topic, on_delete=models.CASCADE, related_name='templates')
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+    search_vector = SearchVectorField(null=True, editable=False)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['created_at', 'id'], name='template_created_id_idx'),
+            models.Index(fields=['topic', 'name'], name='template_topic_name_idx'),
+        ]
 
     def __str__(self):
         return self.name
@@ -180,8 +532,46 @@ class Favorite(models.Model):
             ('user', 'project'),
             ('user', 'task')
         ]
+        indexes = [
+            models.Index(fields=['created_at', 'id'], name='favorite_created_id_idx'),
+            models.Index(fields=['user', 'created_at'], name='favorite_user_created_idx'),
+        ]
 
     def __str__(self):
         if self.project:
             return f"{self.user.username} favorited project {self.project.name}"
         return f"{self.user.username} favorited task {self.task.title}"
+
+class ProjectStats(models.Model):
+    """
+    Статистика задач проекта из материализованного представления core_projectstats
+    (на SQLite - обычное представление). Обновляется командой refresh_stats, поэтому
+    отстает от данных не больше чем на STATS_MAX_AGE секунд плюс период ее запуска.
+    """
+    project = models.OneToOneField(
+        Project, on_delete=models.DO_NOTHING, primary_key=True, db_constraint=False, related_name='stats'
+    )
+    topic = models.ForeignKey(Topic, on_delete=models.DO_NOTHING, db_constraint=False, related_name='+')
+    total_tasks = models.IntegerField()
+    active_tasks = models.IntegerField()
+    completed_tasks = models.IntegerField()
+    refreshed_at = models.DateTimeField()
+
+    class Meta:
+        managed = False
+        db_table = 'core_projectstats'
+
+class TopicStats(models.Model):
+    """Статистика проектов темы из материализованного представления core_topicstats"""
+    topic = models.OneToOneField(
+        Topic, on_delete=models.DO_NOTHING, primary_key=True, db_constraint=False, related_name='stats'
+    )
+    total_projects = models.IntegerField()
+    active_projects = models.IntegerField()
+    completed_projects = models.IntegerField()
+    total_tasks = models.IntegerField()
+    refreshed_at = models.DateTimeField()
+
+    class Meta:
+        managed = False
+        db_table = 'core_topicstats'
@@ -1,63 +1,69 @@
 from django.db import models
 from django.core.cache import cache
+from django.db import transaction
 from django.conf import settings
-from django.db.models import Prefetch, Count, Q
-from functools import wraps
-import time
-
-def cache_result(timeout=300):
-    """
-    Декоратор для кэширования результатов функций
-    """
-    def decorator(func):
-        @wraps(func)
-        def wrapper(*args, **kwargs):
-            # Создаем ключ кэша на основе аргументов функции
-            cache_key = f"{func.__name__}:{str(args)}:{str(kwargs)}"
-            result = cache.get(cache_key)
-            
-            if result is None:
-                result = func(*args, **kwargs)
-                cache.set(cache_key, result, timeout)
-            
-            return result
-        return wrapper
-    return decorator
-
-def query_timer(func):
-    """
-    Декоратор для измерения времени выполнения запросов
-    """
-    @wraps(func)
-    def wrapper(*args, **kwargs):
-        start_time = time.time()
-        result = func(*args, **kwargs)
-        end_time = time.time()
-        print(f"Query time for {func.__name__}: {end_time - start_time:.2f} seconds")
-        return result
-    return wrapper
+from django.utils import timezone
+from django.db.models import (
+    Prefetch, Count, Q, Exists, OuterRef, Value, Case, When, F, ExpressionWrapper, DateTimeField,
+)
+from .caching import CACHE_PREFIX, bump_model_version_on_commit
+from .models import ACTIVE_TASK_STATUSES, OVERDUE_AFTER, Topic, Project, Task, TaskDetail, Subtask, Comment, Document, DocumentVersion, Favorite
+
+# Модели, запись в которые меняет их версию в кэше (сигналы в core/signals.py)
+CACHE_VERSIONED_MODELS = (Topic, Project, Task, TaskDetail, Subtask, Comment, Document, DocumentVersion)
+
+def _favorites_key(user_id):
+    return f"{CACHE_PREFIX}:favorites:{user_id}"
+
+def favorite_ids(user):
+    """
+    Id избранных проектов и задач пользователя: {'project': frozenset, 'task': frozenset}.
+    Строится одним запросом и лежит в кэше до изменения избранного (core/signals.py)
+    """
+    if not user.is_authenticated:
+        return {'project': frozenset(), 'task': frozenset()}
+    key = _favorites_key(user.pk)
+    ids = cache.get(key)
+    if ids is None:
+        rows = list(Favorite.objects.filter(user=user).values_list('project_id', 'task_id'))
+        ids = {
+            'project': frozenset(project_id for project_id, _ in rows if project_id is not None),
+            'task': frozenset(task_id for _, task_id in rows if task_id is not None),
+        }
+        cache.set(key, ids, None)
+    return ids
+
+def forget_favorites(user_id):
+    cache.delete(_favorites_key(user_id))
+
+class FavoritesQuerySetMixin:
+    favorite_field = None
+
+    def with_favorites(self, user):
+        """
+        is_favorited - в избранном ли строка у user. EXISTS по уникальному индексу
+        (user, проект/задача) в том же запросе, что и сами строки
+        """
+        if not user.is_authenticated:
+            return self.annotate(is_favorited=Value(False))
+        return self.annotate(is_favorited=Exists(
+            Favorite.objects.filter(user=user, **{self.favorite_field: OuterRef('pk')})
+        ))
 
 class TopicQuerySet(models.QuerySet):
-    @query_timer
     def with_active_projects(self):
         """
-        Оптимизированный запрос для получения тем с активными проектами
+        Темы с активными проектами - по хранимому счетчику, без JOIN с проектами и задачами
         """
-        return self.annotate(
-            active_projects_count=Count(
-                'projects',
-                filter=Q(projects__tasks__status__in=['new', 'in_progress']),
-                distinct=True
-            )
-        ).filter(active_projects_count__gt=0)
+        return self.filter(active_projects_count__gt=0)
 
-    @query_timer
     def with_project_stats(self):
         """
-        Оптимизированный запрос для получения тем со статистикой проектов
+        Оптимизированный запрос для получения тем со статистикой проектов.
+        Считается на лету и точно; API отдает ее из материализованного представления (core/stats.py)
         """
         return self.annotate(
-            total_projects=Count('projects'),
+            total_projects=Count('projects', distinct=True),
             active_projects=Count(
                 'projects',
                 filter=Q(projects__tasks__status__in=['new', 'in_progress']),
@@ -70,11 +76,13 @@ class TopicQuerySet(models.QuerySet):
             )
         )
 
-class ProjectQuerySet(models.QuerySet):
-    @query_timer
+class ProjectQuerySet(FavoritesQuerySetMixin, models.QuerySet):
+    favorite_field = 'project'
+
     def with_task_stats(self):
         """
-        Оптимизированный запрос для получения проектов со статистикой задач
+        Оптимизированный запрос для получения проектов со статистикой задач.
+        Считается на лету и точно; API отдает ее из материализованного представления (core/stats.py)
         """
         return self.annotate(
             total_tasks=Count('tasks'),
@@ -88,7 +96,6 @@ class ProjectQuerySet(models.QuerySet):
             )
         )
 
-    @query_timer
     def with_related_data(self):
         """
         Оптимизированный запрос для получения проектов со связанными данными
@@ -101,23 +108,45 @@ class ProjectQuerySet(models.QuerySet):
             'documents'
         )
 
-class TaskQuerySet(models.QuerySet):
-    @query_timer
+class TaskQuerySet(FavoritesQuerySetMixin, models.QuerySet):
+    favorite_field = 'task'
+
     def with_related_data(self):
         """
-        Оптимизированный запрос для получения задач со связанными данными
+        Оптимизированный запрос для получения задач со связанными данными,
+        которые отдает TaskSerializer (детали, исполнитель, подзадачи и последние
+        TASK_LATEST_COMMENTS комментариев с авторами - в latest_comments)
         """
         return self.select_related(
-            'project',
-            'project__topic',
-            'assigned_to'
+            'assigned_to',
+            'details'
         ).prefetch_related(
             'subtasks',
-            'comments',
-            'documents'
+            # Срез в Prefetch - один запрос с оконной функцией, а не все комментарии задач страницы
+            Prefetch(
+                'comments',
+                queryset=Comment.objects.select_related('author').order_by(
+                    '-created_at', '-id'
+                )[:settings.TASK_LATEST_COMMENTS],
+                to_attr='latest_comments'
+            )
         )
 
-    @query_timer
+    def with_overdue_at(self):
+        """
+        overdue_at - момент, когда задача стала просроченной (created_at + OVERDUE_AFTER),
+        или NULL, пока она не просрочена. Просрочка меняет is_overdue без записи в базу,
+        поэтому overdue_at входит в валидаторы ETag / Last-Modified (validator_time_fields)
+        """
+        return self.annotate(overdue_at=Case(
+            When(
+                status__in=ACTIVE_TASK_STATUSES,
+                created_at__lt=timezone.now() - OVERDUE_AFTER,
+                then=ExpressionWrapper(F('created_at') + OVERDUE_AFTER, output_field=DateTimeField()),
+            ),
+            output_field=DateTimeField(),
+        ))
+
     def with_subtask_stats(self):
         """
         Оптимизированный запрос для получения задач со статистикой подзадач
@@ -131,7 +160,6 @@ class TaskQuerySet(models.QuerySet):
         )
 
 class DocumentQuerySet(models.QuerySet):
-    @query_timer
     def with_versions(self):
         """
         Оптимизированный запрос для получения документов с версиями
@@ -139,80 +167,102 @@ class DocumentQuerySet(models.QuerySet):
         return self.prefetch_related(
             Prefetch(
                 'versions',
-                queryset=DocumentVersion.objects.select_related('created_by')
+                queryset=DocumentVersion.objects.select_related('created_by', 'blob')
             )
         )
 
-# Оптимизированные менеджеры для моделей
-class TopicManager(models.Manager):
-    def get_queryset(self):
-        return TopicQuerySet(self.model, using=self._db)
-
-    @cache_result(timeout=300)
-    def get_active_topics(self):
-        return self.get_queryset().with_active_projects()
-
-    @cache_result(timeout=300)
-    def get_topics_with_stats(self):
-        return self.get_queryset().with_project_stats()
-
-class ProjectManager(models.Manager):
-    def get_queryset(self):
-        return ProjectQuerySet(self.model, using=self._db)
-
-    @cache_result(timeout=300)
-    def get_projects_with_stats(self):
-        return self.get_queryset().with_task_stats()
-
-    @cache_result(timeout=300)
-    def get_projects_with_related(self):
-        return self.get_queryset().with_related_data()
-
-class TaskManager(models.Manager):
-    def get_queryset(self):
-        return TaskQuerySet(self.model, using=self._db)
-
-    @cache_result(timeout=300)
-    def get_tasks_with_related(self):
-        return self.get_queryset().with_related_data()
-
-    @cache_result(timeout=300)
-    def get_tasks_with_subtask_stats(self):
-        return self.get_queryset().with_subtask_stats()
-
-class DocumentManager(models.Manager):
-    def get_queryset(self):
-        return DocumentQuerySet(self.model, using=self._db)
-
-    @cache_result(timeout=300)
-    def get_documents_with_versions(self):
-        return self.get_queryset().with_versions()
-
 # Функции для массовых операций
 def bulk_create_topics(topics_data):
     """
     Оптимизированное создание множества тем
     """
     topics = [Topic(**data) for data in topics_data]
-    return Topic.objects.bulk_create(topics)
+    created = Topic.objects.bulk_create(topics)
+    bump_model_version_on_commit(Topic)
+    return created
 
 def bulk_create_projects(projects_data):
     """
     Оптимизированное создание множества проектов
     """
     projects = [Project(**data) for data in projects_data]
-    return Project.objects.bulk_create(projects)
+    created = Project.objects.bulk_create(projects)
+    bump_model_version_on_commit(Project)
+    return created
 
 def bulk_create_tasks(tasks_data):
     """
     Оптимизированное создание множества задач
     """
     tasks = [Task(**data) for data in tasks_data]
-    return Task.objects.bulk_create(tasks)
+    from .counters import tasks_created
+    with transaction.atomic(savepoint=False):
+        created = Task.objects.bulk_create(tasks)
+        # bulk_create не шлет сигналы: счетчики проектов и тем сдвигаем явно
+        tasks_created(created)
+    bump_model_version_on_commit(Task)
+    return created
+
+def bulk_create_subtasks(subtasks_data):
+    """
+    Оптимизированное создание множества подзадач
+    """
+    subtasks = [Subtask(**data) for data in subtasks_data]
+    from .counters import subtasks_created
+    with transaction.atomic(savepoint=False):
+        created = Subtask.objects.bulk_create(subtasks)
+        subtasks_created(created)
+    bump_model_version_on_commit(Subtask)
+    return created
+
+def touch(model, ids):
+    """
+    Сдвигает updated_at объектов, у которых изменились вложенные в их представление данные
+    (подзадачи и комментарии задачи, версии документа и т.п.): от updated_at считается ETag
+    """
+    ids = {pk for pk in ids if pk is not None}
+    if ids:
+        model.objects.filter(pk__in=ids).update(updated_at=timezone.now())
+        bump_model_version_on_commit(model)
+
+def _bulk_set_status(model, ids, status, *fields):
+    """
+    Переводит объекты с id из ids в статус status одним UPDATE ... WHERE id IN (...).
+    Возвращает строки (id, прежний статус, *fields) всех найденных объектов
+    """
+    rows = list(model.objects.select_for_update().filter(id__in=ids).values_list('id', 'status', *fields))
+    changed = [row[0] for row in rows if row[1] != status]
+    if changed:
+        model.objects.filter(id__in=changed).update(status=status, updated_at=timezone.now())
+    return rows
+
+def bulk_update_task_status(ids, status):
+    """
+    Массовая смена статуса задач. Возвращает {id: прежний статус} для найденных задач
+    """
+    from .counters import tasks_status_changed
+    with transaction.atomic(savepoint=False):
+        rows = _bulk_set_status(Task, ids, status, 'project_id')
+        # update() не шлет сигналы: счетчики проектов сдвигаем явно
+        tasks_status_changed([(old, project_id) for _, old, project_id in rows if old != status], status)
+    bump_model_version_on_commit(Task)
+    return {pk: old for pk, old, _ in rows}
+
+def bulk_update_subtask_status(ids, status):
+    """
+    Массовая смена статуса подзадач. Возвращает {id: прежний статус} для найденных подзадач
+    """
+    with transaction.atomic(savepoint=False):
+        rows = _bulk_set_status(Subtask, ids, status, 'task_id')
+        touch(Task, [task_id for _, old, task_id in rows if old != status])
+    bump_model_version_on_commit(Subtask)
+    return {pk: old for pk, old, _ in rows}
 
 def bulk_create_documents(documents_data):
     """
     Оптимизированное создание множества документов
     """
     documents = [Document(**data) for data in documents_data]
-    return Document.objects.bulk_create(documents) 
\ No newline at end of file
+    created = Document.objects.bulk_create(documents)
+    bump_model_version_on_commit(Document)
+    return created
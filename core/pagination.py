@@ -0,0 +1,205 @@
+import base64
+import binascii
+import json
+
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.core.paginator import InvalidPage, Paginator
+from django.db.models import Count, Max, Q
+from rest_framework.exceptions import NotFound, ValidationError
+from rest_framework.pagination import PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+class KeysetPagination(PageNumberPagination):
+    """
+    Пагинация по номеру страницы (по умолчанию) с опциональным keyset-режимом.
+
+    Keyset-режим включается параметром ?pagination=cursor (или наличием ?cursor=...).
+    Строки упорядочиваются по (поле, id), следующая страница выбирается условием
+    WHERE (поле, id) > (последнее значение) без COUNT(*) и OFFSET, поэтому
+    стоимость страницы не зависит от ее глубины. Поля keyset-режима задает
+    cursor_ordering_fields вьюсета.
+    """
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    cursor_query_param = 'cursor'
+    mode_query_param = 'pagination'
+    ordering_query_param = 'ordering'
+    # Поля, по которым разрешен keyset-режим; у каждого должен быть индекс (поле, id)
+    default_cursor_ordering_fields = ('created_at',)
+    invalid_cursor_message = 'Некорректный курсор.'
+    # COUNT(*), уже посчитанный для ETag (validator_state), - чтобы не считать его второй раз
+    known_count = None
+
+    def django_paginator_class(self, object_list, per_page):
+        paginator = Paginator(object_list, per_page)
+        if self.known_count is not None:
+            paginator.count = self.known_count
+        return paginator
+
+    def is_keyset_mode(self, request):
+        return (
+            request.query_params.get(self.mode_query_param) == 'cursor'
+            or self.cursor_query_param in request.query_params
+        )
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.keyset_mode = self.is_keyset_mode(request)
+        if not self.keyset_mode:
+            return super().paginate_queryset(queryset, request, view)
+        return self.keyset_results(list(self.keyset_page(queryset, request, view)))
+
+    async def apaginate_queryset(self, queryset, request, view=None):
+        """Вариант paginate_queryset для async-вьюх: те же режимы, строки читаются через async ORM"""
+        self.keyset_mode = self.is_keyset_mode(request)
+        if self.keyset_mode:
+            return self.keyset_results([obj async for obj in self.keyset_page(queryset, request, view)])
+
+        page_size = self.get_page_size(request)
+        if not page_size:
+            return None
+        self.known_count = await queryset.acount()
+        paginator = self.django_paginator_class(queryset, page_size)
+        page_number = self.get_page_number(request, paginator)
+        try:
+            self.page = paginator.page(page_number)
+        except InvalidPage as exc:
+            raise NotFound(self.invalid_page_message.format(page_number=page_number, message=str(exc)))
+        self.request = request
+        return [obj async for obj in self.page.object_list]
+
+    def keyset_results(self, results):
+        has_more = len(results) > self.page_size
+        results = results[:self.page_size]
+        if self.reverse:
+            results.reverse()
+
+        # Пришли с соседней страницы - значит, с той стороны строки точно есть
+        self.has_next = has_more if not self.reverse else self.cursor is not None
+        self.has_previous = has_more if self.reverse else self.cursor is not None
+        self.results = results
+        return results
+
+    def keyset_page(self, queryset, request, view):
+        """Queryset строк keyset-страницы (на одну больше размера страницы, чтобы узнать о следующей)"""
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        self.field, self.descending = self.get_cursor_ordering(request, view)
+        self.cursor = self.decode_cursor(request)
+        self.reverse = bool(self.cursor and self.cursor['reverse'])
+        descending = self.descending != self.reverse
+
+        queryset = queryset.order_by(*self.order_by(descending))
+        if self.cursor:
+            queryset = queryset.filter(self.position_filter(queryset.model, self.cursor, descending))
+        return queryset[:self.page_size + 1]
+
+    def validator_state(self, queryset, request, view, field, time_fields=()):
+        """
+        Данные для ETag списка одним запросом. В обычном режиме - MAX(field) и COUNT(*)
+        (COUNT потом переиспользуется пагинатором), в keyset-режиме - (id, field) строк
+        самой страницы: COUNT(*) по всей таблице этот режим как раз и не делает.
+        time_fields (validator_time_fields вьюсета) добавляются так же - MAX или значения строк.
+        """
+        if self.is_keyset_mode(request):
+            return list(self.keyset_page(queryset, request, view).values_list('pk', field, *time_fields))
+        state = queryset.aggregate(
+            last_modified=Max(field), count=Count('pk'),
+            **{f'max_{time_field}': Max(time_field) for time_field in time_fields},
+        )
+        self.known_count = state['count']
+        return tuple(state.values())
+
+    def get_cursor_ordering(self, request, view):
+        """Возвращает (поле, по убыванию) для keyset-режима"""
+        allowed = getattr(view, 'cursor_ordering_fields', self.default_cursor_ordering_fields)
+        ordering = request.query_params.get(self.ordering_query_param)
+        if not ordering:
+            return allowed[0], False
+        field = ordering.split(',')[0].strip()
+        descending = field.startswith('-')
+        field = field.lstrip('-')
+        if field not in allowed:
+            raise ValidationError({
+                self.ordering_query_param: f'В режиме cursor доступна сортировка только по: {", ".join(allowed)}.'
+            })
+        return field, descending
+
+    def order_by(self, descending):
+        prefix = '-' if descending else ''
+        return [f'{prefix}{self.field}', f'{prefix}id']
+
+    def position_filter(self, model, cursor, descending):
+        lookup, bound = ('lt', 'lte') if descending else ('gt', 'gte')
+        try:
+            value = model._meta.get_field(self.field).to_python(cursor['value'])
+        except DjangoValidationError:
+            raise NotFound(self.invalid_cursor_message)
+        # OR из двух условий индексом не ищется, и страница читала бы все строки до курсора.
+        # Граница поле >= значение - начало диапазона в индексе (поле, id), OR после нее
+        # отсекает только строки с тем же значением поля
+        return Q(**{f'{self.field}__{bound}': value}) & (
+            Q(**{f'{self.field}__{lookup}': value})
+            | Q(**{self.field: value, f'id__{lookup}': cursor['id']})
+        )
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            padded = encoded + '=' * (-len(encoded) % 4)
+            data = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+            return {'value': data['v'], 'id': int(data['id']), 'reverse': bool(data.get('r'))}
+        except (TypeError, ValueError, KeyError, UnicodeEncodeError, binascii.Error):
+            raise NotFound(self.invalid_cursor_message)
+
+    def encode_cursor(self, row, reverse):
+        value = getattr(row, self.field)
+        if hasattr(value, 'isoformat'):
+            value = value.isoformat()
+        data = {'v': value, 'id': row.pk}
+        if reverse:
+            data['r'] = 1
+        encoded = base64.urlsafe_b64encode(json.dumps(data, separators=(',', ':')).encode('utf-8'))
+        return encoded.decode('ascii').rstrip('=')
+
+    def get_cursor_link(self, row, reverse):
+        url = self.request.build_absolute_uri()
+        url = remove_query_param(url, self.mode_query_param)
+        return replace_query_param(url, self.cursor_query_param, self.encode_cursor(row, reverse))
+
+    def get_next_link(self):
+        if not getattr(self, 'keyset_mode', False):
+            return super().get_next_link()
+        if not self.has_next or not self.results:
+            return None
+        return self.get_cursor_link(self.results[-1], reverse=False)
+
+    def get_previous_link(self):
+        if not getattr(self, 'keyset_mode', False):
+            return super().get_previous_link()
+        if not self.has_previous or not self.results:
+            return None
+        return self.get_cursor_link(self.results[0], reverse=True)
+
+    def get_paginated_response(self, data):
+        if not self.keyset_mode:
+            return super().get_paginated_response(data)
+        return Response({
+            'next': self.get_next_link(),
+            'previous': self.get_previous_link(),
+            'results': data,
+        })
+
+
+class CommentThreadPagination(KeysetPagination):
+    """Лента комментариев задачи или подзадачи: всегда keyset по (created_at, id), без COUNT(*) и OFFSET"""
+
+    def is_keyset_mode(self, request):
+        return True
+
+    def get_cursor_ordering(self, request, view):
+        # cursor_ordering_fields вьюсета относятся к задачам и подзадачам, а не к комментариям
+        return super().get_cursor_ordering(request, None)
@@ -0,0 +1,192 @@
+import logging
+import queue
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import Future
+
+import mlflow.pyfunc
+from django.conf import settings
+from django.utils import timezone
+from mlflow.tracking import MlflowClient
+
+logger = logging.getLogger(__name__)
+
+LoadedModel = namedtuple('LoadedModel', ['version', 'model', 'loaded_at'])
+
+
+class ModelHolder:
+    """
+    Держит в памяти процесса модель из MLflow Model Registry (стадия Production).
+
+    Модель загружается один раз на процесс, фоновый поток периодически спрашивает
+    реестр о новой версии Production и подменяет модель целиком одной операцией
+    присваивания: запросы, уже получившие старую модель, спокойно дорабатывают с ней.
+    """
+
+    def __init__(self, name, stage='Production', poll_interval=60):
+        self.name = name
+        self.stage = stage
+        self.poll_interval = poll_interval
+        self._current = None
+        self._load_lock = threading.Lock()
+        self._poller_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._poller = None
+        self.last_check_at = None
+        self.last_error = None
+
+    def get(self):
+        """Возвращает загруженную модель (LoadedModel), при первом обращении загружает ее"""
+        current = self._current
+        if current is None:
+            self.refresh()
+            current = self._current
+            if current is None:
+                raise LookupError(f'В реестре нет модели {self.name} в стадии {self.stage}')
+        self.start_polling()
+        return current
+
+    def latest_version(self):
+        versions = MlflowClient().get_latest_versions(self.name, stages=[self.stage])
+        return versions[0].version if versions else None
+
+    def refresh(self):
+        """Загружает новую версию из реестра, если она появилась. Возвращает True при подмене"""
+        self.last_check_at = timezone.now()
+        version = self.latest_version()
+        with self._load_lock:
+            current = self._current
+            if version is None or (current is not None and current.version == version):
+                return False
+            # Грузим по номеру версии, а не по стадии: стадия могла смениться после запроса к реестру
+            model = mlflow.pyfunc.load_model(f'models:/{self.name}/{version}')
+            self._current = LoadedModel(version=version, model=model, loaded_at=timezone.now())
+        logger.info('Loaded model %s version %s', self.name, version)
+        return True
+
+    def start_polling(self):
+        if self.poll_interval <= 0 or (self._poller is not None and self._poller.is_alive()):
+            return
+        with self._poller_lock:
+            if self._poller is not None and self._poller.is_alive():
+                return
+            self._stop.clear()
+            self._poller = threading.Thread(target=self._poll, name='model-holder-poller', daemon=True)
+            self._poller.start()
+
+    def stop_polling(self):
+        self._stop.set()
+        if self._poller is not None:
+            self._poller.join()
+            self._poller = None
+
+    def _poll(self):
+        while not self._stop.wait(self.poll_interval):
+            try:
+                self.refresh()
+                self.last_error = None
+            except Exception as e:
+                self.last_error = str(e)
+                logger.exception('Model registry poll failed')
+
+    def status(self):
+        current = self._current
+        return {
+            'model_name': self.name,
+            'stage': self.stage,
+            'version': current.version if current else None,
+            'loaded_at': current.loaded_at if current else None,
+            'polling': self._poller is not None and self._poller.is_alive(),
+            'poll_interval': self.poll_interval,
+            'last_check_at': self.last_check_at,
+            'last_error': self.last_error,
+        }
+
+
+class MicroBatcher:
+    """
+    Склеивает одиночные предсказания, пришедшие из разных потоков почти одновременно
+    (в пределах max_wait_ms), в один векторизованный вызов model.predict.
+    Имеет смысл при многопоточных воркерах (gunicorn --threads / gthread).
+    """
+
+    def __init__(self, holder, max_batch_size=64, max_wait_ms=5):
+        self.holder = holder
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self._queue = queue.Queue()
+        self._worker = None
+        self._worker_lock = threading.Lock()
+
+    def predict(self, text, timeout=None):
+        """Возвращает (предсказание, версия модели) для одного текста"""
+        return self.submit(text).result(timeout)
+
+    def submit(self, text):
+        """
+        Ставит текст в очередь и сразу возвращает Future с (предсказание, версия модели).
+        Async-вьюхи ждут его через asyncio.wrap_future, не занимая поток.
+        """
+        future = Future()
+        self._ensure_worker()
+        self._queue.put((text, future))
+        return future
+
+    def _ensure_worker(self):
+        if self._worker is not None and self._worker.is_alive():
+            return
+        with self._worker_lock:
+            if self._worker is None or not self._worker.is_alive():
+                self._worker = threading.Thread(target=self._run, name='micro-batcher', daemon=True)
+                self._worker.start()
+
+    def _collect(self):
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            try:
+                loaded = self.holder.get()
+                predictions = loaded.model.predict([text for text, _ in batch])
+            except Exception as e:
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+            for (_, future), prediction in zip(batch, predictions):
+                future.set_result((prediction, loaded.version))
+
+
+def predict_many(texts, holder=None, chunk_size=None):
+    """Предсказывает классы списка текстов вызовами predict по chunk_size строк"""
+    holder = holder or model_holder
+    chunk_size = chunk_size or settings.ML_BATCH_CHUNK_SIZE
+    loaded = holder.get()
+    predictions = []
+    for start in range(0, len(texts), chunk_size):
+        predictions.extend(loaded.model.predict(texts[start:start + chunk_size]))
+    return predictions, loaded.version
+
+
+model_holder = ModelHolder(
+    name=settings.ML_MODEL_NAME,
+    stage=settings.ML_MODEL_STAGE,
+    poll_interval=settings.ML_MODEL_POLL_INTERVAL,
+)
+
+micro_batcher = MicroBatcher(
+    model_holder,
+    max_batch_size=settings.ML_MICRO_BATCH_MAX_SIZE,
+    max_wait_ms=settings.ML_MICRO_BATCH_MAX_WAIT_MS,
+)
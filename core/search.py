@@ -0,0 +1,130 @@
+from django.contrib.postgres.search import SearchQuery, SearchRank, SearchVector
+from django.core.exceptions import FieldDoesNotExist
+from django.db import connections
+from django.db.models import F, Q, Value
+from rest_framework import filters
+
+# Тексты в основном на русском, но встречаются и английские: индексируем обеими конфигурациями
+SEARCH_CONFIGS = ('russian', 'english')
+
+# Поля, попадающие в поисковый вектор модели, и их вес в ранжировании
+SEARCH_FIELDS = {
+    'Document': (('title', 'A'), ('content', 'B')),
+    'DocumentVersion': (('content', 'B'),),
+    'Comment': (('content', 'B'),),
+    'Template': (('name', 'A'), ('content', 'B')),
+}
+
+
+def is_postgres(using='default'):
+    return connections[using].vendor == 'postgresql'
+
+
+def search_fields(model):
+    return SEARCH_FIELDS[model.__name__]
+
+
+def stored_in_columns(model):
+    """True, если все индексируемые поля модели - настоящие колонки (у версий текст собирается из дельт)"""
+    try:
+        for name, _ in search_fields(model):
+            model._meta.get_field(name)
+    except FieldDoesNotExist:
+        return False
+    return True
+
+
+def build_vector(values):
+    """Собирает tsvector из пар (выражение, вес) во всех конфигурациях SEARCH_CONFIGS"""
+    vector = None
+    for expression, weight in values:
+        for config in SEARCH_CONFIGS:
+            part = SearchVector(expression, config=config, weight=weight)
+            vector = part if vector is None else vector + part
+    return vector
+
+
+def instance_vector(instance):
+    """Вектор по текущим значениям полей объекта"""
+    return build_vector(
+        (Value(getattr(instance, name) or ''), weight)
+        for name, weight in search_fields(type(instance))
+    )
+
+
+def column_vector(model):
+    """Вектор по колонкам таблицы - для пересчета одним UPDATE"""
+    return build_vector((F(name), weight) for name, weight in search_fields(model))
+
+
+def update_vectors(queryset, batch_size=1000):
+    """Пересчитывает search_vector строк queryset пачками по batch_size. Возвращает число строк"""
+    model = queryset.model
+    count, last_id = 0, 0
+    while True:
+        batch = queryset.filter(id__gt=last_id).order_by('id')[:batch_size]
+        if stored_in_columns(model):
+            # Вектор считается в самой базе, строки не гоняются через Python
+            ids = list(batch.values_list('id', flat=True))
+            model.objects.filter(id__in=ids).update(search_vector=column_vector(model))
+        else:
+            # Текст версии собирается из снимка и дельты, поэтому считаем его в Python
+            objects = model.attach_bases(list(batch))
+            for obj in objects:
+                obj.search_vector = instance_vector(obj)
+            model.objects.bulk_update(objects, ['search_vector'])
+            ids = [obj.id for obj in objects]
+        if not ids:
+            return count
+        count += len(ids)
+        last_id = ids[-1]
+
+
+def build_query(text):
+    query = None
+    for config in SEARCH_CONFIGS:
+        part = SearchQuery(text, config=config, search_type='websearch')
+        query = part if query is None else query | part
+    return query
+
+
+class FullTextSearchFilter(filters.SearchFilter):
+    """
+    Полнотекстовый поиск по ?q=.
+    На Postgres ищет по колонке search_vector (GIN-индекс) и сортирует по рангу,
+    на остальных базах откатывается к обычному SearchFilter по search_fields вьюсета.
+    """
+    search_param = 'q'
+    search_description = 'Полнотекстовый поиск (русская и английская морфология)'
+
+    def filter_queryset(self, request, queryset, view):
+        if not is_postgres(queryset.db):
+            return super().filter_queryset(request, queryset, view)
+        text = request.query_params.get(self.search_param, '').strip()
+        if not text:
+            return queryset
+        query = build_query(text)
+        return queryset.filter(search_vector=query).annotate(
+            search_rank=SearchRank(F('search_vector'), query)
+        ).order_by('-search_rank', 'id')
+
+
+class ContentSearchFilter(filters.SearchFilter):
+    """
+    ?search= по search_fields вьюсета и, на Postgres, еще по search_vector. У версий-дельт
+    полного текста нет ни в одной колонке (дельта - JSON только со вставленными строками),
+    он есть лишь в векторе, собранном из восстановленного содержимого. На остальных базах
+    такие версии по ?search= не находятся - только снимки.
+    """
+
+    def filter_queryset(self, request, queryset, view):
+        terms = self.get_search_terms(request)
+        if not terms or not is_postgres(queryset.db):
+            return super().filter_queryset(request, queryset, view)
+        lookups = [self.construct_search(str(field)) for field in self.get_search_fields(view, request) or ()]
+        for term in terms:
+            condition = Q(search_vector=build_query(term))
+            for lookup in lookups:
+                condition |= Q(**{lookup: term})
+            queryset = queryset.filter(condition)
+        return queryset
@@ -0,0 +1,356 @@
+import io
+import itertools
+import multiprocessing
+import random
+from collections import Counter
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone
+
+from django.conf import settings
+from django.db import connection, connections, transaction
+
+from .caching import bump_model_version
+from .counters import task_weight
+from .models import (
+    Topic, Project, ProjectSettings, Task, TaskDetail, Subtask,
+    Comment, Document, DocumentVersion, ContentBlob, Template
+)
+from .optimizations import CACHE_VERSIONED_MODELS
+from .search import is_postgres, update_vectors
+
+# Конец периода дат по умолчанию. Не текущий момент: иначе тот же --seed давал бы другие даты
+DEFAULT_UNTIL = datetime(2026, 1, 1, tzinfo=timezone.utc)
+
+# Доли статусов примерно как в рабочей базе: большая часть задач уже закрыта
+TASK_STATUS_WEIGHTS = {'new': 15, 'in_progress': 25, 'review': 10, 'done': 50}
+SUBTASK_STATUS_WEIGHTS = {'new': 25, 'in_progress': 20, 'review': 5, 'done': 50}
+
+TOPIC_NAMES = [
+    'CRM Система Авиакомпании', 'Программа лояльности', 'Обслуживание пассажиров',
+    'Грузовые перевозки', 'Продажи и тарифы', 'Наземное обслуживание',
+]
+PROJECT_KINDS = ['Разработка', 'Внедрение', 'Модернизация', 'Интеграция', 'Анализ', 'Поддержка']
+PROJECT_OBJECTS = [
+    'модуля бронирования', 'программы лояльности', 'личного кабинета', 'колл-центра',
+    'платежного шлюза', 'системы отчетности', 'мобильного приложения', 'сервиса уведомлений',
+    'справочника тарифов', 'обмена с GDS',
+]
+ACTIONS = [
+    'Доработать', 'Реализовать', 'Проверить', 'Согласовать', 'Описать', 'Протестировать',
+    'Исправить', 'Оптимизировать', 'Подготовить', 'Настроить', 'Обновить',
+]
+OBJECTS = [
+    'модуль бронирования', 'программу лояльности', 'личный кабинет пассажира', 'отчет по продажам',
+    'интеграцию с платежным шлюзом', 'выгрузку в бухгалтерию', 'расписание рейсов',
+    'уведомления о задержках', 'карточку клиента', 'справочник тарифов', 'обработку возвратов',
+    'регистрацию на рейс', 'сегментацию клиентов', 'API для партнеров', 'учет багажа',
+]
+DETAILS = [
+    'с учетом требований безопасности', 'для мобильного приложения', 'в рамках релиза',
+    'по замечаниям заказчика', 'для колл-центра', 'до конца квартала', 'без простоя сервиса',
+    'для международных рейсов', 'с поддержкой нескольких валют', 'согласно регламенту',
+]
+SUBJECTS = [
+    'Клиент', 'Оператор колл-центра', 'Менеджер по продажам', 'Система', 'Пассажир',
+    'Администратор', 'Служба поддержки', 'Отдел аналитики',
+]
+VERBS = [
+    'должен видеть', 'получает', 'формирует', 'отправляет', 'проверяет', 'может изменить',
+    'сохраняет', 'запрашивает', 'отменяет', 'подтверждает',
+]
+COMPLEMENTS = [
+    'статус бронирования', 'историю перелетов', 'начисленные мили', 'сведения о багаже',
+    'стоимость перелета', 'данные паспорта', 'список доступных мест', 'квитанцию об оплате',
+    'изменения в расписании', 'персональные предложения',
+]
+DOCUMENT_KINDS = [
+    'Техническое задание', 'Спецификация требований', 'Регламент', 'Протокол совещания',
+    'Руководство пользователя', 'План тестирования', 'Договор поставки', 'Акт выполненных работ',
+]
+SECTIONS = ['Назначение', 'Требования', 'Архитектура', 'Интеграции', 'Безопасность', 'Тестирование', 'Риски', 'План работ']
+
+# Все сочетания заранее: текст собирается одним rng.choices, а не десятком вызовов на предложение
+SENTENCES = [
+    f'{subject} {verb} {complement} {detail}.'
+    for subject, verb, complement, detail in itertools.product(SUBJECTS, VERBS, COMPLEMENTS, DETAILS)
+]
+TITLES = [f'{action} {obj}' for action, obj in itertools.product(ACTIONS, OBJECTS)]
+
+# Сколько предложений в тексте и с какой вероятностью: короткие тексты встречаются чаще длинных
+SHORT_TEXT = ((1, 2, 3), (6, 3, 1))
+LONG_TEXT = ((1, 2, 3, 4, 6, 8), (10, 20, 25, 20, 15, 10))
+
+
+@contextmanager
+def explicit_timestamps(*models):
+    """
+    Временно отключает auto_now/auto_now_add, чтобы bulk_create записал даты,
+    заданные в объектах, а не текущее время.
+    """
+    fields = [
+        field for model in models for field in model._meta.concrete_fields
+        if getattr(field, 'auto_now', False) or getattr(field, 'auto_now_add', False)
+    ]
+    saved = [(field, field.auto_now, field.auto_now_add) for field in fields]
+    for field in fields:
+        field.auto_now = field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field, auto_now, auto_now_add in saved:
+            field.auto_now, field.auto_now_add = auto_now, auto_now_add
+
+
+def copy_value(value):
+    """Значение в текстовом формате COPY"""
+    if value is None:
+        return '\\N'
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return str(value).replace('\\', '\\\\').replace('\t', '\\t').replace('\n', '\\n').replace('\r', '\\r')
+
+
+def copy_insert(model, objects):
+    """
+    Вставка через COPY FROM STDIN (только Postgres): в разы быстрее bulk_create, потому что
+    значения не проходят через компилятор запросов. id заранее берутся из последовательности
+    таблицы, так что внешние ключи на только что вставленные объекты проставляются как обычно.
+    """
+    opts = model._meta
+    quote = connection.ops.quote_name
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'SELECT nextval(pg_get_serial_sequence(%s, %s)) FROM generate_series(1, %s)',
+            [opts.db_table, opts.pk.column, len(objects)],
+        )
+        for obj, (pk,) in zip(objects, cursor.fetchall()):
+            obj.pk = pk
+        buffer = io.StringIO()
+        for obj in objects:
+            obj._prepare_related_fields_for_save(operation_name='bulk_create')
+            obj._state.adding, obj._state.db = False, connection.alias
+            buffer.write('\t'.join(copy_value(getattr(obj, field.attname)) for field in opts.concrete_fields))
+            buffer.write('\n')
+        buffer.seek(0)
+        columns = ', '.join(quote(field.column) for field in opts.concrete_fields)
+        cursor.copy_expert(f'COPY {quote(opts.db_table)} ({columns}) FROM STDIN', buffer)
+
+
+class Seeder:
+    """
+    Детерминированный генератор данных. Единица загрузки - тема со всеми проектами,
+    задачами, подзадачами, комментариями, документами и версиями; каждая тема строится
+    своим генератором random.Random(f'{seed}:{index}') и пишется одной транзакцией.
+    Уже загруженные темы (по имени) пропускаются, поэтому повторный запуск ничего
+    не дублирует, а запуск с большим scale догружает только недостающее.
+    Даты лежат в days днях до until, так что от момента запуска данные не зависят.
+    """
+
+    def __init__(self, users, seed=0, projects_per_topic=10, tasks_per_project=100, subtasks_per_task=2,
+                 comments_per_task=3, documents_per_project=5, versions_per_document=4,
+                 days=365, until=DEFAULT_UNTIL, batch_size=1000, search_index=True):
+        self.users = list(users)
+        self.seed = seed
+        self.projects_per_topic = projects_per_topic
+        self.tasks_per_project = tasks_per_project
+        self.subtasks_per_task = subtasks_per_task
+        self.comments_per_task = comments_per_task
+        self.documents_per_project = documents_per_project
+        self.versions_per_document = versions_per_document
+        self.batch_size = batch_size
+        self.copy = is_postgres()
+        self.search_index = search_index and self.copy
+        self.until = until
+        self.start = until - timedelta(days=days)
+
+    def topic_name(self, index):
+        return f'{TOPIC_NAMES[index % len(TOPIC_NAMES)]} №{index + 1} (seed {self.seed})'
+
+    def run(self, topics, workers=1):
+        """
+        Загружает темы 0..topics-1, которых еще нет. При workers > 1 темы пишутся параллельно
+        из нескольких процессов (имеет смысл на Postgres). Возвращает Counter созданных объектов.
+        """
+        names = {self.topic_name(index): index for index in range(topics)}
+        existing = set(Topic.objects.filter(name__in=names).values_list('name', flat=True))
+        missing = [index for name, index in names.items() if name not in existing]
+        created = Counter(skipped=len(existing))
+        with explicit_timestamps(*CACHE_VERSIONED_MODELS, ProjectSettings, Template):
+            if workers > 1 and len(missing) > 1:
+                # Дочерние процессы не должны делить соединение с родителем
+                connections.close_all()
+                with multiprocessing.get_context('fork').Pool(workers) as pool:
+                    for counts in pool.imap_unordered(self.seed_topic, missing):
+                        created.update(counts)
+            else:
+                for index in missing:
+                    created.update(self.seed_topic(index))
+        for model in CACHE_VERSIONED_MODELS:
+            bump_model_version(model)
+        return created
+
+    # Генерация значений
+
+    def moment(self, rng, after):
+        """Случайный момент между after и until"""
+        return after + (self.until - after) * rng.random()
+
+    def amount(self, rng, mean):
+        """Случайное количество со средним mean"""
+        return rng.randint(0, 2 * mean)
+
+    def text(self, rng, shape=SHORT_TEXT):
+        sizes, weights = shape
+        return ' '.join(rng.choices(SENTENCES, k=rng.choices(sizes, weights)[0]))
+
+    def title(self, rng):
+        return f'{rng.choice(TITLES)} {rng.choice(DETAILS)}'
+
+    def paragraphs(self, rng):
+        """Абзацы документа: заголовки разделов и текст, по строке на абзац (дельты версий построчные)"""
+        paragraphs = []
+        for section in rng.sample(SECTIONS, rng.randint(3, len(SECTIONS))):
+            paragraphs.append(f'## {section}')
+            paragraphs.extend(self.text(rng, LONG_TEXT) for _ in range(rng.randint(1, 4)))
+        return paragraphs
+
+    def edit(self, rng, paragraphs):
+        """Следующая версия документа: несколько абзацев заменены, добавлены или удалены"""
+        paragraphs = list(paragraphs)
+        for _ in range(rng.randint(1, 3)):
+            position = rng.randrange(len(paragraphs))
+            operation = rng.random()
+            if operation < 0.5:
+                paragraphs[position] = self.text(rng, LONG_TEXT)
+            elif operation < 0.8 or len(paragraphs) < 4:
+                paragraphs.insert(position, self.text(rng, LONG_TEXT))
+            else:
+                del paragraphs[position]
+        return paragraphs
+
+    # Загрузка темы
+
+    def seed_topic(self, index):
+        rng = random.Random(f'{self.seed}:{index}')
+        created_at = self.moment(rng, self.start)
+        topic = Topic(
+            name=self.topic_name(index), description=self.text(rng),
+            created_at=created_at, updated_at=self.moment(rng, created_at),
+        )
+        templates = [
+            Template(
+                name=f'Шаблон: {kind}', content='\n\n'.join(self.paragraphs(rng)), topic=topic,
+                created_at=topic.created_at, updated_at=topic.created_at,
+            )
+            for kind in rng.sample(DOCUMENT_KINDS, 2)
+        ]
+        projects, settings_, tasks, details, subtasks, comments, documents, versions = ([] for _ in range(8))
+
+        for number in range(self.projects_per_topic):
+            created_at = self.moment(rng, topic.created_at)
+            project = Project(
+                name=f'{rng.choice(PROJECT_KINDS)} {rng.choice(PROJECT_OBJECTS)} №{number + 1}',
+                description=self.text(rng), topic=topic,
+                created_at=created_at, updated_at=self.moment(rng, created_at),
+            )
+            projects.append(project)
+            settings_.append(ProjectSettings(
+                project=project, notification_enabled=rng.random() < 0.8,
+                template_default=rng.choice(templates), created_at=created_at, updated_at=created_at,
+            ))
+
+            statuses = rng.choices(list(TASK_STATUS_WEIGHTS), list(TASK_STATUS_WEIGHTS.values()), k=self.tasks_per_project)
+            for status in statuses:
+                tasks.append(self.build_task(rng, project, status, details, subtasks, comments))
+                active, completed = task_weight(status)
+                project.active_tasks_count += active
+                project.completed_tasks_count += completed
+            topic.active_projects_count += project.active_tasks_count > 0
+
+            for _ in range(self.amount(rng, self.documents_per_project)):
+                documents.append(self.build_document(rng, project, versions))
+
+        with transaction.atomic():
+            # Блобы не через COPY: одинаковый текст мог уже записать другой процесс
+            ContentBlob.store([version.blob for version in versions if version.blob_id])
+            for model, objects in (
+                (Topic, [topic]), (Template, templates), (Project, projects), (ProjectSettings, settings_),
+                (Task, tasks), (TaskDetail, details), (Subtask, subtasks), (Comment, comments),
+                (Document, documents),
+                # Снимки пишутся раньше дельт, которые на них ссылаются
+                (DocumentVersion, [version for version in versions if version.base is None]),
+                (DocumentVersion, [version for version in versions if version.base is not None]),
+            ):
+                self.insert(model, objects)
+            if self.search_index:
+                for model, objects in ((Template, templates), (Comment, comments), (Document, documents), (DocumentVersion, versions)):
+                    update_vectors(model.objects.filter(id__in=[obj.id for obj in objects]), self.batch_size)
+
+        return Counter({
+            'topics': 1, 'projects': len(projects), 'tasks': len(tasks), 'subtasks': len(subtasks),
+            'comments': len(comments), 'documents': len(documents), 'versions': len(versions),
+        })
+
+    def insert(self, model, objects):
+        if not objects:
+            return
+        if self.copy:
+            copy_insert(model, objects)
+        else:
+            model.objects.bulk_create(objects, batch_size=self.batch_size)
+
+    def build_task(self, rng, project, status, details, subtasks, comments):
+        created_at = self.moment(rng, project.created_at)
+        task = Task(
+            title=self.title(rng), description=self.text(rng, LONG_TEXT), project=project, status=status,
+            assigned_to=rng.choice(self.users) if rng.random() < 0.9 else None,
+            created_at=created_at, updated_at=self.moment(rng, created_at),
+        )
+        if rng.random() < 0.7:
+            details.append(TaskDetail(
+                task=task, requirements=self.text(rng, LONG_TEXT), acceptance_criteria=self.text(rng),
+                created_at=created_at, updated_at=created_at,
+            ))
+        task.subtasks_count = self.amount(rng, self.subtasks_per_task)
+        statuses = rng.choices(list(SUBTASK_STATUS_WEIGHTS), list(SUBTASK_STATUS_WEIGHTS.values()), k=task.subtasks_count)
+        for status in statuses:
+            subtask_created_at = self.moment(rng, created_at)
+            subtasks.append(Subtask(
+                title=self.title(rng), description=self.text(rng), task=task, status=status,
+                created_at=subtask_created_at, updated_at=self.moment(rng, subtask_created_at),
+            ))
+        task.comments_count = self.amount(rng, self.comments_per_task)
+        for _ in range(task.comments_count):
+            comment_created_at = self.moment(rng, created_at)
+            comments.append(Comment(
+                content=self.text(rng), task=task, author=rng.choice(self.users),
+                created_at=comment_created_at, updated_at=comment_created_at,
+            ))
+        return task
+
+    def build_document(self, rng, project, versions):
+        """
+        Документ с историей версий. Версии кодируются снимками и дельтами так же,
+        как при обычном сохранении (DOCUMENT_VERSION_SNAPSHOT_INTERVAL).
+        """
+        created_at = updated_at = self.moment(rng, project.created_at)
+        document = Document(
+            title=f'{rng.choice(DOCUMENT_KINDS)}: {rng.choice(OBJECTS)}', project=project, created_at=created_at,
+        )
+        paragraphs = self.paragraphs(rng)
+        snapshot, snapshot_deltas = None, 0
+        for number in range(1, rng.randint(1, 2 * self.versions_per_document - 1) + 1):
+            if number > 1:
+                paragraphs = self.edit(rng, paragraphs)
+                updated_at = self.moment(rng, updated_at)
+            version = DocumentVersion(
+                document=document, version_number=number, created_by=rng.choice(self.users), created_at=updated_at,
+            )
+            version.content = '\n\n'.join(paragraphs)
+            if version.encode_against(snapshot, snapshot_deltas, settings.DOCUMENT_VERSION_SNAPSHOT_INTERVAL):
+                snapshot_deltas += 1
+            else:
+                snapshot, snapshot_deltas = version, 0
+            versions.append(version)
+        document.content, document.updated_at = version.content, updated_at
+        return document
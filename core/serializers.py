@@ -1,10 +1,63 @@
+from django.conf import settings
+from django.db import models
 from rest_framework import serializers
 from django.contrib.auth.models import User
 from .models import (
     Topic, Project, ProjectSettings, Task, TaskDetail,
     Subtask, Comment, Document, DocumentVersion, Template,
-    Favorite
+    Favorite, TopicStats, ProjectStats
 )
+from .optimizations import favorite_ids
+
+class BulkPrimaryKeyRelatedField(serializers.PrimaryKeyRelatedField):
+    """
+    PrimaryKeyRelatedField, который при массовой валидации берет объекты из
+    context['related_objects'] (заполняет BulkListSerializer одним запросом на модель),
+    а не делает get() на каждый элемент списка.
+    """
+    def to_internal_value(self, data):
+        related = self.context.get('related_objects', {}).get(self.get_queryset().model)
+        if related is None:
+            return super().to_internal_value(data)
+        try:
+            return related[int(data)]
+        except KeyError:
+            self.fail('does_not_exist', pk_value=data)
+        except (TypeError, ValueError):
+            self.fail('incorrect_type', data_type=type(data).__name__)
+
+class BulkListSerializer(serializers.ListSerializer):
+    """
+    Список объектов для массового создания: связанные объекты всех элементов
+    загружаются заранее (по одному запросу на поле), затем элементы валидируются.
+    """
+    def to_internal_value(self, data):
+        if isinstance(data, list):
+            self.context['related_objects'] = self.load_related_objects(data)
+        return super().to_internal_value(data)
+
+    def load_related_objects(self, data):
+        related = {}
+        for name, field in self.child.fields.items():
+            if not isinstance(field, BulkPrimaryKeyRelatedField) or field.read_only:
+                continue
+            ids = set()
+            for item in data:
+                try:
+                    ids.add(int(item[name]))
+                except (KeyError, TypeError, ValueError):
+                    pass
+            related[field.get_queryset().model] = field.get_queryset().in_bulk(ids)
+        return related
+
+class IsFavoritedMixin:
+    def get_is_favorited(self, obj):
+        # Объекты из with_favorites несут аннотацию; у остальных (ответы на создание
+        # и изменение) - из закэшированного набора избранного пользователя
+        if hasattr(obj, 'is_favorited'):
+            return obj.is_favorited
+        request = self.context.get('request')
+        return request is not None and obj.pk in favorite_ids(request.user)[obj._meta.model_name]
 
 class UserSerializer(serializers.ModelSerializer):
     class Meta:
@@ -12,36 +65,34 @@ class UserSerializer(serializers.ModelSerializer):
         fields = ['id', 'username', 'email']
 
 class TopicSerializer(serializers.ModelSerializer):
-    active_projects_count = serializers.SerializerMethodField()
-
     class Meta:
         model = Topic
         fields = ['id', 'name', 'description', 'created_at', 'updated_at', 'active_projects_count']
 
-    def get_active_projects_count(self, obj):
-        return obj.get_active_projects_count()
+class TopicStatsSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = TopicStats
+        fields = ['topic', 'total_projects', 'active_projects', 'completed_projects', 'total_tasks', 'refreshed_at']
 
 class ProjectSettingsSerializer(serializers.ModelSerializer):
     class Meta:
         model = ProjectSettings
         fields = ['id', 'notification_enabled', 'template_default']
 
-class ProjectSerializer(serializers.ModelSerializer):
+class ProjectSerializer(IsFavoritedMixin, serializers.ModelSerializer):
     settings = ProjectSettingsSerializer(read_only=True)
-    active_tasks_count = serializers.SerializerMethodField()
-    completed_tasks_count = serializers.SerializerMethodField()
+    is_favorited = serializers.SerializerMethodField()
 
     class Meta:
         model = Project
         fields = ['id', 'name', 'description', 'topic', 'settings', 
                  'active_tasks_count', 'completed_tasks_count', 
-                 'created_at', 'updated_at']
-
-    def get_active_tasks_count(self, obj):
-        return obj.get_active_tasks_count()
+                 'is_favorited', 'created_at', 'updated_at']
 
-    def get_completed_tasks_count(self, obj):
-        return obj.get_completed_tasks_count()
+class ProjectStatsSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = ProjectStats
+        fields = ['project', 'total_tasks', 'active_tasks', 'completed_tasks', 'refreshed_at']
 
 class TaskDetailSerializer(serializers.ModelSerializer):
     class Meta:
@@ -49,9 +100,12 @@ class TaskDetailSerializer(serializers.ModelSerializer):
         fields = ['id', 'requirements', 'acceptance_criteria']
 
 class SubtaskSerializer(serializers.ModelSerializer):
+    serializer_related_field = BulkPrimaryKeyRelatedField
+
     class Meta:
         model = Subtask
-        fields = ['id', 'title', 'description', 'status', 'created_at', 'updated_at']
+        fields = ['id', 'task', 'title', 'description', 'status', 'created_at', 'updated_at']
+        list_serializer_class = BulkListSerializer
 
 class CommentSerializer(serializers.ModelSerializer):
     author = UserSerializer(read_only=True)
@@ -60,30 +114,44 @@ class CommentSerializer(serializers.ModelSerializer):
         model = Comment
         fields = ['id', 'content', 'author', 'created_at', 'updated_at']
 
-class TaskSerializer(serializers.ModelSerializer):
+class TaskSerializer(IsFavoritedMixin, serializers.ModelSerializer):
     details = TaskDetailSerializer(read_only=True)
     subtasks = SubtaskSerializer(many=True, read_only=True)
-    comments = CommentSerializer(many=True, read_only=True)
+    latest_comments = serializers.SerializerMethodField()
     assigned_to = UserSerializer(read_only=True)
     is_overdue = serializers.SerializerMethodField()
-    subtasks_count = serializers.SerializerMethodField()
-    comments_count = serializers.SerializerMethodField()
+    is_favorited = serializers.SerializerMethodField()
+    serializer_related_field = BulkPrimaryKeyRelatedField
 
     class Meta:
         model = Task
         fields = ['id', 'title', 'description', 'project', 'status',
-                 'assigned_to', 'details', 'subtasks', 'comments',
-                 'is_overdue', 'subtasks_count', 'comments_count',
+                 'assigned_to', 'details', 'subtasks', 'latest_comments',
+                 'is_overdue', 'is_favorited', 'subtasks_count', 'comments_count',
                  'created_at', 'updated_at']
+        list_serializer_class = BulkListSerializer
 
     def get_is_overdue(self, obj):
+        # overdue_at (TaskQuerySet.with_overdue_at) посчитан тем же моментом, что и валидаторы ответа
+        if hasattr(obj, 'overdue_at'):
+            return obj.overdue_at is not None
         return obj.is_overdue()
 
-    def get_subtasks_count(self, obj):
-        return obj.get_subtasks_count()
-
-    def get_comments_count(self, obj):
-        return obj.get_comments_count()
+    def get_latest_comments(self, obj):
+        """
+        Последние TASK_LATEST_COMMENTS комментариев, новые первыми: размер задачи не зависит
+        от объема обсуждения (всего их comments_count, целиком - /api/tasks/{id}/comments/)
+        """
+        comments = getattr(obj, 'latest_comments', None)
+        if comments is None:
+            comments = obj.comments.select_related('author').order_by('-created_at', '-id')[:settings.TASK_LATEST_COMMENTS]
+        return CommentSerializer(comments, many=True, context=self.context).data
+
+class DocumentVersionListSerializer(serializers.ListSerializer):
+    def to_representation(self, data):
+        # Снимки для дельта-версий берутся из того же списка, а не запросом на строку
+        iterable = data.all() if isinstance(data, models.manager.BaseManager) else data
+        return super().to_representation(DocumentVersion.attach_bases(iterable))
 
 class DocumentVersionSerializer(serializers.ModelSerializer):
     created_by = UserSerializer(read_only=True)
@@ -91,6 +159,7 @@ class DocumentVersionSerializer(serializers.ModelSerializer):
     class Meta:
         model = DocumentVersion
         fields = ['id', 'content', 'version_number', 'created_by', 'created_at']
+        list_serializer_class = DocumentVersionListSerializer
 
 class DocumentSerializer(serializers.ModelSerializer):
     versions = DocumentVersionSerializer(many=True, read_only=True)
@@ -109,4 +178,14 @@ class FavoriteSerializer(serializers.ModelSerializer):
     class Meta:
         model = Favorite
         fields = ['id', 'user', 'project', 'task', 'created_at']
-        read_only_fields = ['user', 'created_at'] 
\ No newline at end of file
+        read_only_fields = ['user', 'created_at']
+        # Валидаторы unique_together сделали бы обязательными и project, и task - проверяем в validate
+        validators = []
+
+    def validate(self, attrs):
+        project, task = attrs.get('project'), attrs.get('task')
+        if (project is None) == (task is None):
+            raise serializers.ValidationError('Нужно указать либо project, либо task.')
+        if Favorite.objects.filter(user=self.context['request'].user, project=project, task=task).exists():
+            raise serializers.ValidationError('Уже в избранном.')
+        return attrs 
\ No newline at end of file
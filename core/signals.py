@@ -0,0 +1,112 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from . import counters
+from .caching import bump_model_version_on_commit
+from .models import (
+    Project, ProjectSettings, Task, TaskDetail, Subtask, Comment, Document, DocumentVersion, Template, Favorite
+)
+from .optimizations import CACHE_VERSIONED_MODELS, forget_favorites, touch
+from .search import instance_vector, is_postgres
+
+
+@receiver(pre_save, sender=Document)
+@receiver(pre_save, sender=DocumentVersion)
+@receiver(pre_save, sender=Comment)
+@receiver(pre_save, sender=Template)
+def update_search_vector(sender, instance, raw=False, using='default', **kwargs):
+    """Пересчитывает поисковый вектор в том же INSERT/UPDATE, что и сам объект"""
+    if raw or not is_postgres(using):
+        return
+    instance.search_vector = instance_vector(instance)
+
+
+def bump_cache_version(sender, **kwargs):
+    """Инвалидирует кэш запросов, зависящих от модели: сразу и еще раз после коммита"""
+    bump_model_version_on_commit(sender, using=kwargs.get('using'))
+
+
+for model in CACHE_VERSIONED_MODELS:
+    post_save.connect(bump_cache_version, sender=model, dispatch_uid=f'bump_cache_version_{model.__name__}')
+    post_delete.connect(bump_cache_version, sender=model, dispatch_uid=f'bump_cache_version_{model.__name__}')
+
+
+# Объекты, вложенные в представление родителя в API: их изменение меняет и ETag родителя
+PARENT_FIELDS = {
+    TaskDetail: 'task', Subtask: 'task', Comment: 'task', ProjectSettings: 'project', DocumentVersion: 'document',
+}
+
+
+@receiver(post_save, sender=TaskDetail)
+@receiver(post_save, sender=Subtask)
+@receiver(post_save, sender=Comment)
+@receiver(post_save, sender=ProjectSettings)
+@receiver(post_save, sender=DocumentVersion)
+@receiver(post_delete, sender=TaskDetail)
+@receiver(post_delete, sender=ProjectSettings)
+@receiver(post_delete, sender=DocumentVersion)
+def touch_parent(sender, instance, created=False, raw=False, **kwargs):
+    # Создание, удаление и перенос подзадач и комментариев сдвигают счетчики задачи,
+    # а с ними и updated_at (core/counters.py) - здесь остается только правка
+    if raw or (created and sender in (Subtask, Comment)):
+        return
+    field = sender._meta.get_field(PARENT_FIELDS[sender])
+    touch(field.related_model, [getattr(instance, field.attname)])
+
+
+@receiver(post_save, sender=Favorite)
+@receiver(post_delete, sender=Favorite)
+def favorite_changed(sender, instance, raw=False, **kwargs):
+    """
+    is_favorited входит в представление проекта и задачи: сдвигаем их updated_at (а с ним ETag)
+    и сбрасываем набор избранного пользователя - сразу и после коммита, как версии кэша
+    """
+    if raw:
+        return
+    touch(Project, [instance.project_id])
+    touch(Task, [instance.task_id])
+    forget_favorites(instance.user_id)
+    transaction.on_commit(lambda: forget_favorites(instance.user_id), using=kwargs.get('using'))
+
+
+@receiver(pre_save, sender=Project)
+@receiver(pre_save, sender=Task)
+@receiver(pre_save, sender=Subtask)
+@receiver(pre_save, sender=Comment)
+def load_tracked_fields(sender, instance, raw=False, **kwargs):
+    if not raw:
+        counters.load_tracked(instance)
+
+
+@receiver(post_save, sender=Task)
+def update_task_counters(sender, instance, created, raw=False, **kwargs):
+    if not raw:
+        counters.task_saved(instance, created)
+    instance.remember_tracked()
+
+
+@receiver(post_delete, sender=Task)
+def update_task_counters_on_delete(sender, instance, **kwargs):
+    counters.task_deleted(instance)
+
+
+@receiver(post_save, sender=Project)
+def update_project_counters(sender, instance, created, raw=False, **kwargs):
+    if not raw:
+        counters.project_saved(instance, created)
+    instance.remember_tracked()
+
+
+@receiver(post_save, sender=Subtask)
+@receiver(post_save, sender=Comment)
+def update_child_counters(sender, instance, created, raw=False, **kwargs):
+    if not raw:
+        counters.child_saved(instance, created, 'subtasks' if sender is Subtask else 'comments')
+    instance.remember_tracked()
+
+
+@receiver(post_delete, sender=Subtask)
+@receiver(post_delete, sender=Comment)
+def update_child_counters_on_delete(sender, instance, **kwargs):
+    counters.child_deleted(instance, 'subtasks' if sender is Subtask else 'comments')
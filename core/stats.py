@@ -0,0 +1,67 @@
+"""
+Статистика тем и проектов из материализованных представлений core_projectstats и
+core_topicstats (миграция 0008). Чтение - один поиск по уникальному индексу вместо
+агрегаций с COUNT(DISTINCT) по всем задачам; цена - отставание от данных.
+
+Представления пересчитывает команда refresh_stats (cron раз в минуту): только если с прошлого
+пересчета было не меньше STATS_REFRESH_WRITES записей или он старше STATS_MAX_AGE секунд.
+Записи считаются по версиям моделей из кэша (их сдвигает каждое сохранение, удаление и
+массовая операция), так что отдельных счетчиков не нужно.
+"""
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection
+from django.utils import timezone
+
+from .models import Topic, Project, Task, TopicStats
+from .caching import CACHE_PREFIX, model_versions
+from .search import is_postgres
+
+# Порядок важен: статистика тем считается по статистике проектов
+STATS_VIEWS = ('core_projectstats', 'core_topicstats')
+STATS_MODELS = (Topic, Project, Task)
+
+_REFRESH_KEY = f'{CACHE_PREFIX}:stats-refresh:versions'
+
+
+def refresh_stats(concurrently=True):
+    """
+    Пересчитывает представления. CONCURRENTLY не блокирует чтение, но требует уже
+    заполненного представления. На базах без материализованных представлений ничего не делает.
+    """
+    # Версии берутся до пересчета: записи, пришедшие во время него, попадут в следующий
+    versions = model_versions(*STATS_MODELS)
+    if is_postgres():
+        with connection.cursor() as cursor:
+            for view in STATS_VIEWS:
+                cursor.execute(f'REFRESH MATERIALIZED VIEW {"CONCURRENTLY " if concurrently else ""}{view}')
+    cache.set(_REFRESH_KEY, versions, None)
+
+
+def writes_since_refresh():
+    """Число записей в STATS_MODELS с последнего пересчета; None, если пересчет неизвестен"""
+    refreshed = cache.get(_REFRESH_KEY)
+    if refreshed is None:
+        return None
+    return sum(current - old for current, old in zip(model_versions(*STATS_MODELS), refreshed))
+
+
+def last_refreshed_at():
+    return TopicStats.objects.order_by().values_list('refreshed_at', flat=True).first()
+
+
+def stats_age():
+    """Сколько секунд прошло с последнего пересчета (None - представления пусты)"""
+    refreshed_at = last_refreshed_at()
+    if refreshed_at is None:
+        return None
+    return (timezone.now() - refreshed_at).total_seconds()
+
+
+def refresh_needed(min_writes=None, max_age=None):
+    """Пора ли пересчитывать: накопилось min_writes записей или статистика старше max_age секунд"""
+    min_writes = settings.STATS_REFRESH_WRITES if min_writes is None else min_writes
+    max_age = settings.STATS_MAX_AGE if max_age is None else max_age
+    writes = writes_since_refresh()
+    age = stats_age()
+    return writes is None or age is None or writes >= min_writes or age >= max_age
@@ -1,12 +1,21 @@
-from django.test import TestCase
+import csv
+import io
+import json
+from django.test import TestCase, override_settings
+from unittest.mock import patch
 from django.contrib.auth.models import User
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 from rest_framework.test import APIClient
 from rest_framework import status
+from django.core.cache import cache
+from django.utils import timezone
 from ..models import (
-    Topic, Project, Task, Subtask,
-    Comment, Document, DocumentVersion, Template
+    Topic, Project, Task, TaskDetail, Subtask,
+    Comment, Document, DocumentVersion, Template, Favorite, OVERDUE_AFTER
 )
+from ..optimizations import favorite_ids
 
 class TopicAPITest(TestCase):
     def setUp(self):
@@ -42,6 +51,16 @@ class TopicAPITest(TestCase):
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.assertEqual(response.data['name'], self.topic.name)
 
+    def test_active_projects_count_from_annotation(self):
+        for i in range(3):
+            project = Project.objects.create(name=f"Project {i}", topic=self.topic)
+            Task.objects.create(title="Task", description="Description", project=project, status='new')
+            Task.objects.create(title="Task", description="Description", project=project, status='in_progress')
+        Project.objects.create(name="Idle Project", topic=self.topic)
+        with self.assertNumQueries(2):
+            response = self.client.get(self.url)
+        self.assertEqual(response.data['results'][0]['active_projects_count'], 3)
+
 class ProjectAPITest(TestCase):
     def setUp(self):
         self.client = APIClient()
@@ -79,6 +98,18 @@ class ProjectAPITest(TestCase):
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.assertEqual(response.data['name'], self.project.name)
 
+    def test_task_counts_from_counters(self):
+        for i in range(5):
+            project = Project.objects.create(name=f"Project {i}", topic=self.topic)
+            for task_status in ['new', 'in_progress', 'done', 'done']:
+                Task.objects.create(title="Task", description="Description", project=project, status=task_status)
+        with self.assertNumQueries(2):
+            response = self.client.get(self.url)
+        for project in response.data['results']:
+            if project['id'] != self.project.id:
+                self.assertEqual(project['active_tasks_count'], 2)
+                self.assertEqual(project['completed_tasks_count'], 2)
+
 class TaskAPITest(TestCase):
     def setUp(self):
         self.client = APIClient()
@@ -122,6 +153,317 @@ class TaskAPITest(TestCase):
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.assertEqual(response.data['title'], self.task.title)
 
+    def test_subtasks_and_comments_count_from_counters(self):
+        for i in range(3):
+            Subtask.objects.create(title=f"Subtask {i}", description="Description", task=self.task)
+        for i in range(2):
+            Comment.objects.create(content=f"Comment {i}", task=self.task, author=self.user)
+        with patch.object(Task, 'get_subtasks_count') as subtasks_count, \
+                patch.object(Task, 'get_comments_count') as comments_count:
+            response = self.client.get(self.url)
+        subtasks_count.assert_not_called()
+        comments_count.assert_not_called()
+        self.assertEqual(response.data['results'][0]['subtasks_count'], 3)
+        self.assertEqual(response.data['results'][0]['comments_count'], 2)
+
+    def test_list_query_count_independent_of_rows(self):
+        with self.assertNumQueries(4):
+            self.client.get(self.url)
+        for i in range(9):
+            task = Task.objects.create(title=f"Task {i}", description="Description",
+                                       project=self.project, assigned_to=self.user)
+            TaskDetail.objects.create(task=task, requirements="Requirements", acceptance_criteria="Criteria")
+            Subtask.objects.create(title="Subtask", description="Description", task=task)
+            for j in range(3):
+                author = User.objects.create(username=f"author-{i}-{j}")
+                Comment.objects.create(content="Comment", task=task, author=author)
+        with self.assertNumQueries(4):
+            response = self.client.get(self.url)
+        self.assertEqual(len(response.data['results']), 10)
+
+class BulkTaskAPITest(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(
+            username='testuser',
+            password='testpass123'
+        )
+        self.client.force_authenticate(user=self.user)
+        self.topic = Topic.objects.create(name="Test Topic")
+        self.project = Project.objects.create(name="Test Project", topic=self.topic)
+        self.other_project = Project.objects.create(name="Other Project", topic=self.topic)
+
+    def test_bulk_create_tasks_in_a_handful_of_queries(self):
+        data = [
+            {'title': f'Task {i}', 'description': 'Description',
+             'project': self.project.id if i % 2 else self.other_project.id,
+             'status': 'done' if i % 4 == 0 else 'new'}
+            for i in range(1000)
+        ]
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(reverse('task-bulk-create'), data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        # SQLite режет bulk_create на пачки по лимиту параметров, Postgres пишет одним INSERT
+        inserts = [q for q in queries.captured_queries if q['sql'].startswith('INSERT')]
+        self.assertLessEqual(len(queries) - len(inserts), 7)
+        if connection.vendor == 'postgresql':
+            self.assertEqual(len(inserts), 1)
+        self.assertEqual(response.data['created'], 1000)
+        self.assertEqual(len(response.data['ids']), 1000)
+        self.assertEqual(Task.objects.count(), 1000)
+        self.project.refresh_from_db()
+        self.other_project.refresh_from_db()
+        self.assertEqual((self.project.active_tasks_count, self.project.completed_tasks_count), (500, 0))
+        self.assertEqual((self.other_project.active_tasks_count, self.other_project.completed_tasks_count), (250, 250))
+
+    def test_bulk_create_reports_errors_per_item(self):
+        data = [
+            {'title': 'Task', 'description': 'Description', 'project': self.project.id},
+            {'title': 'Task', 'description': 'Description', 'project': 999999},
+            {'description': 'Description', 'project': self.project.id, 'status': 'unknown'},
+        ]
+        response = self.client.post(reverse('task-bulk-create'), data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.data[0], {})
+        self.assertIn('project', response.data[1])
+        self.assertEqual(set(response.data[2]), {'title', 'status'})
+        self.assertEqual(Task.objects.count(), 0)
+
+    def test_bulk_create_rejects_non_list(self):
+        for data in [{'title': 'Task'}, []]:
+            response = self.client.post(reverse('task-bulk-create'), data, format='json')
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_bulk_create_subtasks(self):
+        task = Task.objects.create(title="Task", description="Description", project=self.project)
+        data = [{'task': task.id, 'title': f'Subtask {i}', 'description': 'Description'} for i in range(5)]
+        response = self.client.post(reverse('subtask-bulk-create'), data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        task.refresh_from_db()
+        self.assertEqual(task.subtasks_count, 5)
+
+    def test_bulk_status_single_update(self):
+        tasks = [
+            Task.objects.create(title=f"Task {i}", description="Description", project=self.project,
+                                status='done' if i == 0 else 'new')
+            for i in range(3)
+        ]
+        ids = [task.id for task in tasks] + [999999]
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(reverse('task-bulk-status'), {'ids': ids, 'status': 'done'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        task_updates = [q['sql'] for q in queries.captured_queries if q['sql'].startswith('UPDATE "core_task"')]
+        self.assertEqual(len(task_updates), 1)
+        self.assertEqual(response.data['results'], [
+            {'id': tasks[0].id, 'result': 'unchanged', 'previous_status': 'done'},
+            {'id': tasks[1].id, 'result': 'updated', 'previous_status': 'new'},
+            {'id': tasks[2].id, 'result': 'updated', 'previous_status': 'new'},
+            {'id': 999999, 'result': 'not_found'},
+        ])
+        self.assertEqual(Task.objects.filter(status='done').count(), 3)
+        self.project.refresh_from_db()
+        self.topic.refresh_from_db()
+        self.assertEqual((self.project.active_tasks_count, self.project.completed_tasks_count), (0, 3))
+        self.assertEqual(self.topic.active_projects_count, 0)
+
+    def test_bulk_status_subtasks(self):
+        task = Task.objects.create(title="Task", description="Description", project=self.project)
+        subtask = Subtask.objects.create(title="Subtask", description="Description", task=task)
+        response = self.client.post(reverse('subtask-bulk-status'), {'ids': [subtask.id], 'status': 'review'}, format='json')
+        self.assertEqual(response.data['results'], [{'id': subtask.id, 'result': 'updated', 'previous_status': 'new'}])
+        subtask.refresh_from_db()
+        self.assertEqual(subtask.status, 'review')
+
+    def test_bulk_status_validation(self):
+        url = reverse('task-bulk-status')
+        for data in [{'ids': [1], 'status': 'unknown'}, {'status': 'done'}, {'ids': ['x'], 'status': 'done'}]:
+            response = self.client.post(url, data, format='json')
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST, data)
+
+class ExportAPITest(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(
+            username='testuser',
+            password='testpass123'
+        )
+        self.client.force_authenticate(user=self.user)
+        self.topic = Topic.objects.create(name="Test Topic")
+        self.project = Project.objects.create(name="Test Project", topic=self.topic)
+        self.tasks = [
+            Task.objects.create(
+                title=f'Задача {i}', description='Описание\nв две строки', project=self.project,
+                status='done' if i % 3 == 0 else 'new', assigned_to=self.user
+            )
+            for i in range(12)
+        ]
+        for task in self.tasks[:2]:
+            Comment.objects.create(content='Комментарий, с запятой', task=task, author=self.user)
+
+    def export(self, name, **params):
+        response = self.client.get(reverse(f'{name}-export'), params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response.streaming)
+        return response, b''.join(response.streaming_content).decode()
+
+    def test_tasks_ndjson_with_filters(self):
+        response, body = self.export('task', format='ndjson', status='done')
+        self.assertTrue(response['Content-Type'].startswith('application/x-ndjson'))
+        self.assertIn('tasks.ndjson', response['Content-Disposition'])
+        rows = [json.loads(line) for line in body.splitlines()]
+        expected = [task.id for task in self.tasks if task.status == 'done']
+        self.assertEqual([row['id'] for row in rows], expected)
+        self.assertEqual(rows[0]['project'], self.project.id)
+        self.assertEqual(rows[0]['assigned_to'], self.user.id)
+        self.assertEqual(rows[0]['description'], 'Описание\nв две строки')
+
+    def test_tasks_csv_with_ordering(self):
+        response, body = self.export('task', format='csv', ordering='-created_at')
+        self.assertTrue(response['Content-Type'].startswith('text/csv'))
+        rows = list(csv.DictReader(io.StringIO(body)))
+        self.assertEqual([int(row['id']) for row in rows], [task.id for task in reversed(self.tasks)])
+        self.assertEqual(rows[0]['description'], 'Описание\nв две строки')
+        self.assertEqual(rows[0]['comments_count'], '0')
+
+    def test_comments_and_documents(self):
+        _, body = self.export('comment', format='csv', task=self.tasks[0].id)
+        rows = list(csv.DictReader(io.StringIO(body)))
+        self.assertEqual(len(rows), 1)
+        self.assertEqual(rows[0]['content'], 'Комментарий, с запятой')
+        self.assertEqual(rows[0]['author'], str(self.user.id))
+
+        Document.objects.create(title='Документ', content='Текст', project=self.project)
+        _, body = self.export('document', format='ndjson')
+        self.assertEqual(json.loads(body)['title'], 'Документ')
+
+    @override_settings(EXPORT_CHUNK_SIZE=5)
+    def test_streams_without_per_row_queries(self):
+        with CaptureQueriesContext(connection) as queries:
+            _, body = self.export('task', format='ndjson')
+        self.assertEqual(len(body.splitlines()), len(self.tasks))
+        # Один запрос на всю выгрузку (на Postgres курсор читается через FETCH)
+        self.assertEqual(len(queries), 1)
+
+    def test_unknown_format(self):
+        response = self.client.get(reverse('task-export'), {'format': 'xml'})
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_requires_authentication(self):
+        self.client.force_authenticate(user=None)
+        response = self.client.get(reverse('task-export'), {'format': 'csv'})
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+        self.assertIn(b'detail', response.content)
+
+class ConditionalGetTest(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(
+            username='testuser',
+            password='testpass123'
+        )
+        self.client.force_authenticate(user=self.user)
+        self.topic = Topic.objects.create(name="Test Topic")
+        self.project = Project.objects.create(name="Test Project", topic=self.topic)
+        self.task = Task.objects.create(title="Test Task", description="Description", project=self.project)
+
+    def assertChanged(self, url, etag, **params):
+        response = self.client.get(url, params, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(response['ETag'], etag)
+        return response['ETag']
+
+    def assertNotModified(self, url, etag, **params):
+        response = self.client.get(url, params, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(response['ETag'], etag)
+        self.assertEqual(response.content, b'')
+
+    def test_list_etag(self):
+        url = reverse('task-list')
+        etag = self.client.get(url)['ETag']
+        self.assertNotModified(url, etag)
+        # Другой набор параметров - другое представление
+        self.assertChanged(url, etag, status='done')
+
+        Task.objects.create(title="Another Task", description="Description", project=self.project)
+        etag = self.assertChanged(url, etag)
+        Task.objects.filter(title="Another Task").delete()
+        etag = self.assertChanged(url, etag)
+        self.assertNotModified(url, etag)
+
+    def test_nested_changes_change_parent_etag(self):
+        task_url = reverse('task-detail', args=[self.task.id])
+        project_url = reverse('project-detail', args=[self.project.id])
+        task_etag = self.client.get(task_url)['ETag']
+        project_etag = self.client.get(project_url)['ETag']
+
+        comment = Comment.objects.create(content="Комментарий", task=self.task, author=self.user)
+        task_etag = self.assertChanged(task_url, task_etag)
+        comment.content = "Исправленный комментарий"
+        comment.save()
+        task_etag = self.assertChanged(task_url, task_etag)
+        subtask = Subtask.objects.create(title="Subtask", description="Description", task=self.task)
+        task_etag = self.assertChanged(task_url, task_etag)
+        self.client.post(reverse('subtask-bulk-status'), {'ids': [subtask.id], 'status': 'done'}, format='json')
+        task_etag = self.assertChanged(task_url, task_etag)
+        self.assertNotModified(task_url, task_etag)
+
+        # Счетчики проекта сдвинулись при создании задачи
+        Task.objects.create(title="Another Task", description="Description", project=self.project)
+        self.assertChanged(project_url, project_etag)
+
+    def test_document_versions_change_document_etag(self):
+        document = Document.objects.create(title="Test Document", content="Content", project=self.project)
+        url = reverse('document-detail', args=[document.id])
+        etag = self.client.get(url)['ETag']
+        DocumentVersion.objects.create(document=document, content="Content", version_number=1, created_by=self.user)
+        self.assertChanged(url, etag)
+
+    def test_detail_last_modified(self):
+        url = reverse('topic-detail', args=[self.topic.id])
+        response = self.client.get(url)
+        self.assertIn('Last-Modified', response)
+        response = self.client.get(url, HTTP_IF_MODIFIED_SINCE=response['Last-Modified'])
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        response = self.client.get(url, HTTP_IF_MODIFIED_SINCE='Thu, 01 Jan 2015 00:00:00 GMT')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_task_becomes_overdue(self):
+        # Задача становится просроченной без записи в базу - валидаторы все равно меняются
+        now = timezone.now()
+        created = now - OVERDUE_AFTER + timezone.timedelta(hours=1)
+        Task.objects.filter(pk=self.task.pk).update(created_at=created, updated_at=created)
+        detail_url = reverse('task-detail', args=[self.task.id])
+        list_url = reverse('task-list')
+        detail = self.client.get(detail_url)
+        self.assertFalse(detail.data['is_overdue'])
+        list_etag = self.client.get(list_url)['ETag']
+        cursor_etag = self.client.get(list_url, {'pagination': 'cursor'})['ETag']
+
+        with patch('django.utils.timezone.now', return_value=now + timezone.timedelta(hours=2)):
+            response = self.client.get(detail_url, HTTP_IF_MODIFIED_SINCE=detail['Last-Modified'])
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertTrue(response.data['is_overdue'])
+            self.assertNotEqual(response['ETag'], detail['ETag'])
+            self.assertNotEqual(response['Last-Modified'], detail['Last-Modified'])
+            self.assertNotModified(detail_url, response['ETag'])
+            self.assertChanged(list_url, list_etag)
+            self.assertChanged(list_url, cursor_etag, pagination='cursor')
+
+    def test_keyset_mode_without_count(self):
+        url = reverse('task-list')
+        etag = self.client.get(url, {'pagination': 'cursor'})['ETag']
+        with CaptureQueriesContext(connection) as queries:
+            self.assertNotModified(url, etag, pagination='cursor')
+        self.assertFalse(any('COUNT(' in query['sql'] for query in queries.captured_queries))
+        self.task.title = "Renamed"
+        self.task.save()
+        self.assertChanged(url, etag, pagination='cursor')
+
+    def test_missing_object(self):
+        response = self.client.get(reverse('task-detail', args=[999999]))
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
 class DocumentAPITest(TestCase):
     def setUp(self):
         self.client = APIClient()
@@ -156,6 +498,23 @@ class DocumentAPITest(TestCase):
         response = self.client.post(self.url, data)
         self.assertEqual(response.status_code, status.HTTP_201_CREATED)
         self.assertEqual(Document.objects.count(), 2)
+        self.assertEqual([version['version_number'] for version in response.data['versions']], [1])
+
+    def test_resave_without_edits_keeps_versions(self):
+        url = reverse('document-detail', args=[self.document.id])
+        data = {'title': 'Test Document', 'content': 'Новый текст', 'project': self.project.id}
+        for _ in range(2):
+            response = self.client.put(url, data)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+        data['title'] = 'Переименован'
+        response = self.client.put(url, data)
+        self.assertEqual(len(response.data['versions']), 1)
+        data['content'] = 'Правка'
+        response = self.client.put(url, data)
+        self.assertEqual(
+            [(version['version_number'], version['content']) for version in response.data['versions']],
+            [(1, 'Новый текст'), (2, 'Правка')]
+        )
 
     def test_get_document_detail(self):
         url = reverse('document-detail', args=[self.document.id])
@@ -163,6 +522,178 @@ class DocumentAPITest(TestCase):
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.assertEqual(response.data['title'], self.document.title)
 
+@override_settings(TASK_LATEST_COMMENTS=2)
+class CommentThreadAPITest(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(username='testuser', password='testpass123')
+        self.client.force_authenticate(user=self.user)
+        self.topic = Topic.objects.create(name="Test Topic")
+        self.project = Project.objects.create(name="Test Project", topic=self.topic)
+        self.busy_task = Task.objects.create(title="Busy", description="Description", project=self.project)
+        self.quiet_task = Task.objects.create(title="Quiet", description="Description", project=self.project)
+        self.subtask = Subtask.objects.create(title="Subtask", description="Description", task=self.quiet_task)
+        self.comments = Comment.objects.bulk_create([
+            Comment(content=f"Комментарий {i}", task=self.busy_task, author=self.user) for i in range(25)
+        ])
+        Comment.objects.create(content="Единственный", task=self.quiet_task, author=self.user)
+        Comment.objects.bulk_create([
+            Comment(content=f"К подзадаче {i}", subtask=self.subtask, author=self.user) for i in range(3)
+        ])
+
+    def test_task_embeds_only_latest_comments(self):
+        response = self.client.get(reverse('task-list'), {'ordering': 'title'})
+        busy, quiet = response.data['results']
+        self.assertEqual([c['content'] for c in busy['latest_comments']], ['Комментарий 24', 'Комментарий 23'])
+        self.assertEqual([c['content'] for c in quiet['latest_comments']], ['Единственный'])
+        self.assertNotIn('comments', busy)
+
+        # Размер задачи в списке не зависит от числа комментариев (меняются только тексты)
+        size = len(response.content)
+        Comment.objects.bulk_create([
+            Comment(content=f"Комментарий {i}", task=self.busy_task, author=self.user) for i in range(100, 1100)
+        ])
+        response = self.client.get(reverse('task-list'), {'ordering': 'title'})
+        self.assertEqual(response.data['results'][0]['latest_comments'][0]['content'], 'Комментарий 1099')
+        self.assertLess(len(response.content), size + 100)
+
+        response = self.client.get(reverse('task-detail', args=[self.busy_task.id]))
+        self.assertEqual(len(response.data['latest_comments']), 2)
+
+    def test_created_task_has_latest_comments(self):
+        response = self.client.post(
+            reverse('task-list'), {'title': 'New', 'description': 'Description', 'project': self.project.id}
+        )
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data['latest_comments'], [])
+
+    def test_task_comment_thread(self):
+        url = reverse('task-comments', args=[self.busy_task.id])
+        seen = []
+        params = {'page_size': 10}
+        while url:
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.get(url, params)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertFalse(any('COUNT(' in query['sql'] for query in queries.captured_queries))
+            seen += [comment['id'] for comment in response.data['results']]
+            url, params = response.data['next'], {}
+        self.assertEqual(seen, [comment.id for comment in self.comments])
+
+        response = self.client.get(reverse('task-comments', args=[self.busy_task.id]), {'ordering': '-created_at'})
+        self.assertEqual(response.data['results'][0]['id'], self.comments[-1].id)
+        self.assertEqual(response.data['results'][0]['author']['username'], 'testuser')
+
+    def test_subtask_comment_thread(self):
+        response = self.client.get(reverse('subtask-comments', args=[self.subtask.id]))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([c['content'] for c in response.data['results']], [f"К подзадаче {i}" for i in range(3)])
+        self.assertIsNone(response.data['next'])
+
+    def test_thread_errors(self):
+        response = self.client.get(reverse('task-comments', args=[999999]))
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+        for ordering in ('content', 'title'):
+            response = self.client.get(reverse('task-comments', args=[self.busy_task.id]), {'ordering': ordering})
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_deep_thread_page_seeks_by_index(self):
+        for ordering, bound, seek in (('created_at', '>=', 'created_at>?'), ('-created_at', '<=', 'created_at<?')):
+            with self.subTest(ordering=ordering):
+                url = reverse('task-comments', args=[self.busy_task.id])
+                response = self.client.get(url, {'ordering': ordering, 'page_size': 5})
+                for _ in range(3):
+                    with CaptureQueriesContext(connection) as queries:
+                        response = self.client.get(response.data['next'])
+                sql = next(query['sql'] for query in queries.captured_queries if 'FROM "core_comment"' in query['sql'])
+                # Курсор - начало диапазона в индексе, а не фильтр поверх чтения треда с начала
+                self.assertIn(f'"core_comment"."created_at" {bound} ', sql)
+                if connection.vendor == 'sqlite':
+                    with connection.cursor() as cursor:
+                        cursor.execute(f'EXPLAIN QUERY PLAN {sql}')
+                        plan = ' '.join(row[-1] for row in cursor.fetchall())
+                    self.assertIn(f'USING INDEX comment_task_created_id_idx (task_id=? AND {seek})', plan)
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'favorites-tests'}})
+class FavoritesAPITest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.user = User.objects.create_user(username='testuser', password='testpass123')
+        self.other_user = User.objects.create_user(username='otheruser', password='testpass123')
+        self.client.force_authenticate(user=self.user)
+        self.topic = Topic.objects.create(name="Test Topic")
+        self.projects = [Project.objects.create(name=f"Project {i}", topic=self.topic) for i in range(3)]
+        self.tasks = [
+            Task.objects.create(title=f"Task {i}", description="Description", project=self.projects[0]) for i in range(3)
+        ]
+        Favorite.objects.create(user=self.user, project=self.projects[1])
+        Favorite.objects.create(user=self.user, task=self.tasks[2])
+        Favorite.objects.create(user=self.other_user, project=self.projects[0])
+
+    def flags(self, url, **params):
+        response = self.client.get(url, params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return {row['id']: row['is_favorited'] for row in response.data['results']}
+
+    def test_lists_flag_current_user_favorites(self):
+        self.assertEqual(
+            self.flags(reverse('project-list')),
+            {self.projects[0].id: False, self.projects[1].id: True, self.projects[2].id: False},
+        )
+        self.assertEqual(
+            self.flags(reverse('task-list')),
+            {self.tasks[0].id: False, self.tasks[1].id: False, self.tasks[2].id: True},
+        )
+        response = self.client.get(reverse('task-detail', args=[self.tasks[2].id]))
+        self.assertTrue(response.data['is_favorited'])
+
+    def test_favorites_only(self):
+        self.assertEqual(self.flags(reverse('project-list'), favorites_only=1), {self.projects[1].id: True})
+        self.assertEqual(self.flags(reverse('task-list'), favorites_only=1), {self.tasks[2].id: True})
+
+    def test_board_is_one_query(self):
+        # COUNT(*) с ETag и страница, в которой is_favorited уже посчитан EXISTS
+        with self.assertNumQueries(2):
+            self.client.get(reverse('project-list'))
+
+    def test_favorite_changes_flag_and_etag(self):
+        url = reverse('task-list')
+        etag = self.client.get(url)['ETag']
+        response = self.client.post(reverse('favorite-list'), {'task': self.tasks[0].id})
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED, response.data)
+        favorite_id = response.data['id']
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue({row['id']: row['is_favorited'] for row in response.data['results']}[self.tasks[0].id])
+
+        response = self.client.delete(reverse('favorite-detail', args=[favorite_id]))
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+        self.assertFalse(self.flags(url)[self.tasks[0].id])
+
+    def test_create_favorite_validation(self):
+        url = reverse('favorite-list')
+        self.assertEqual(self.client.post(url, {}).status_code, status.HTTP_400_BAD_REQUEST)
+        both = {'project': self.projects[0].id, 'task': self.tasks[0].id}
+        self.assertEqual(self.client.post(url, both).status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self.client.post(url, {'task': self.tasks[2].id}).status_code, status.HTTP_400_BAD_REQUEST)
+        # Чужое избранное не мешает
+        self.assertEqual(self.client.post(url, {'project': self.projects[0].id}).status_code, status.HTTP_201_CREATED)
+
+    def test_cached_favorite_ids(self):
+        with self.assertNumQueries(1):
+            self.assertEqual(favorite_ids(self.user), {'project': {self.projects[1].id}, 'task': {self.tasks[2].id}})
+        with self.assertNumQueries(0):
+            favorite_ids(self.user)
+        self.client.post(reverse('favorite-list'), {'project': self.projects[2].id})
+        self.assertEqual(favorite_ids(self.user)['project'], {self.projects[1].id, self.projects[2].id})
+        # Ответ на изменение строится без аннотации - по закэшированному набору
+        response = self.client.put(
+            reverse('project-detail', args=[self.projects[2].id]), {'name': 'Renamed', 'topic': self.topic.id}
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response.data['is_favorited'])
+
 class AuthenticationTest(TestCase):
     def setUp(self):
         self.client = APIClient()
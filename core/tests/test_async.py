@@ -0,0 +1,103 @@
+from unittest.mock import patch
+
+from django.contrib.auth.models import User
+from django.test import AsyncClient, TestCase, override_settings
+from django.urls import reverse
+from rest_framework import status
+
+from ..models import Topic, Project, Task, Document, DocumentVersion
+from .test_predict import FakeHolder
+
+
+class AsyncEndpointsTest(TestCase):
+    """Async-эндпоинты отдают то же, что и синхронные вьюсеты"""
+
+    def setUp(self):
+        user = User.objects.create_user(username='testuser', password='testpass123')
+        self.async_client = AsyncClient()
+        self.async_client.force_login(user)
+        self.topic = Topic.objects.create(name="Test Topic")
+        self.project = Project.objects.create(name="Test Project", topic=self.topic)
+        self.other_project = Project.objects.create(name="Other Project", topic=self.topic)
+        self.tasks = [
+            Task.objects.create(title=f"Task {i}", project=self.project if i % 2 else self.other_project)
+            for i in range(5)
+        ]
+        self.document = Document.objects.create(title="Test Document", content="Test Content", project=self.project)
+        DocumentVersion.objects.create(document=self.document, content="Content", version_number=1, created_by=user)
+
+    async def assertSameResponse(self, async_url, sync_url):
+        response = await self.async_client.get(async_url)
+        expected = await self.async_client.get(sync_url, headers={'accept': 'application/json'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        # Ссылки на соседние страницы ведут на тот же эндпоинт, которым пришел запрос
+        self.assertEqual(response.content.decode().replace('/api/async/', '/api/'), expected.content.decode())
+        return response.json()
+
+    async def test_task_list(self):
+        data = await self.assertSameResponse(reverse('async-task-list'), reverse('task-list'))
+        self.assertEqual(data['count'], 5)
+        query = f'?project={self.project.id}&ordering=title&page_size=1&page=2'
+        data = await self.assertSameResponse(reverse('async-task-list') + query, reverse('task-list') + query)
+        self.assertEqual(data['results'][0]['title'], 'Task 3')
+
+    async def test_task_list_cursor(self):
+        query = '?pagination=cursor&page_size=2'
+        data = await self.assertSameResponse(reverse('async-task-list') + query, reverse('task-list') + query)
+        next_query = '?' + data['next'].split('?', 1)[1]
+        await self.assertSameResponse(reverse('async-task-list') + next_query, reverse('task-list') + next_query)
+
+    async def test_details(self):
+        await self.assertSameResponse(
+            reverse('async-task-detail', args=[self.tasks[0].id]), reverse('task-detail', args=[self.tasks[0].id])
+        )
+        data = await self.assertSameResponse(
+            reverse('async-document-detail', args=[self.document.id]), reverse('document-detail', args=[self.document.id])
+        )
+        self.assertEqual(len(data['versions']), 1)
+
+    async def test_project_list(self):
+        data = await self.assertSameResponse(reverse('async-project-list'), reverse('project-list'))
+        self.assertEqual(data['count'], 2)
+
+    async def test_errors(self):
+        response = await self.async_client.get(reverse('async-task-detail', args=[999999]))
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+        response = await self.async_client.get(reverse('async-task-list') + '?page=100')
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+        response = await self.async_client.get(reverse('async-task-list') + '?pagination=cursor&ordering=status')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        response = await self.async_client.post(reverse('async-task-list'))
+        self.assertEqual(response.status_code, status.HTTP_405_METHOD_NOT_ALLOWED)
+
+    async def test_authentication_required(self):
+        response = await AsyncClient().get(reverse('async-task-list'))
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+        self.assertIn('Basic', response['WWW-Authenticate'])
+
+
+class AsyncPredictTest(TestCase):
+    def setUp(self):
+        self.client = AsyncClient()
+        self.client.force_login(User.objects.create_user(username='testuser', password='testpass123'))
+        self.holder = FakeHolder()
+        patcher = patch('core.async_views.model_holder', self.holder)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.url = reverse('async-predict-document-class')
+
+    async def test_predict(self):
+        response = await self.client.post(self.url, {'text': 'abcd'}, content_type='application/json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.json(), {'prediction': 4, 'model_version': '7'})
+        self.assertEqual(self.holder.model.batch_sizes, [1])
+
+    async def test_predict_requires_text(self):
+        response = await self.client.post(self.url, {}, content_type='application/json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    @override_settings(ML_MICRO_BATCHING=True)
+    async def test_predict_micro_batching(self):
+        with patch('core.predictor.micro_batcher.holder', self.holder):
+            response = await self.client.post(self.url, {'text': 'abc'}, content_type='application/json')
+        self.assertEqual(response.json(), {'prediction': 3, 'model_version': '7'})
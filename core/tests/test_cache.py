@@ -0,0 +1,283 @@
+import os
+import time
+import uuid
+from unittest import skipUnless
+from unittest.mock import patch
+
+from django.contrib.auth.models import User
+from django.core.cache import cache, caches
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APIClient
+from ..cache_backends import TwoTierCache
+from ..caching import cache_stats, model_versions
+from ..counters import adjust_project, adjust_task, adjust_topic
+from ..models import Topic, Project, ProjectSettings, Task, Subtask, Favorite
+from ..optimizations import bulk_create_topics, bulk_update_subtask_status, bulk_update_task_status
+from ..views import ProjectViewSet
+
+LOCMEM_CACHE = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'unidoc-tests',
+    }
+}
+
+TWO_TIER_CACHE = {
+    'default': {
+        'BACKEND': 'core.cache_backends.TwoTierCache',
+        'LOCATION': 'unidoc-tests-two-tier',
+        'OPTIONS': {'SHARED': 'shared', 'LOCAL_KEY_PREFIXES': ['unidoc:version:', 'unidoc:core.', 'unidoc:payload:']},
+    },
+    'shared': LOCMEM_CACHE['default'],
+}
+
+
+@override_settings(CACHES=LOCMEM_CACHE)
+class CachedQueryTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.topic = Topic.objects.create(name="Test Topic")
+        self.project = Project.objects.create(name="Test Project", topic=self.topic)
+        self.task = Task.objects.create(title="Task", description="Description", project=self.project)
+        self.topics, self.projects, self.tasks = Topic.objects, Project.objects, Task.objects
+
+    def stats(self, name):
+        return cache_stats()[f'core.models.{name}']
+
+    def test_result_is_materialized_and_served_from_cache(self):
+        first = self.tasks.get_tasks_with_related()
+        self.assertIsInstance(first, list)
+        with self.assertNumQueries(0):
+            second = Task.objects.get_tasks_with_related()
+            self.assertEqual([task.title for task in second], ["Task"])
+            # Prefetch-данные тоже лежат в кэше
+            self.assertEqual(list(second[0].subtasks.all()), [])
+        self.assertEqual(self.stats('TaskManager.get_tasks_with_related'), {
+            'hits': 1, 'misses': 1, 'depends_on': ['core.Task', 'core.TaskDetail', 'core.Subtask', 'core.Comment'],
+        })
+
+    def test_save_invalidates(self):
+        self.assertEqual(self.topics.get_topics_with_stats()[0].active_projects, 1)
+        self.task.status = 'done'
+        self.task.save()
+        self.assertEqual(self.topics.get_topics_with_stats()[0].active_projects, 0)
+
+    def test_related_model_write_invalidates(self):
+        self.assertEqual(self.tasks.get_tasks_with_subtask_stats()[0].total_subtasks, 0)
+        Subtask.objects.create(title="Subtask", task=self.task)
+        self.assertEqual(self.tasks.get_tasks_with_subtask_stats()[0].total_subtasks, 1)
+
+    def test_delete_invalidates(self):
+        other = Project.objects.create(name="Other", topic=self.topic)
+        self.assertEqual(len(self.projects.get_projects_with_stats()), 2)
+        other.delete()
+        self.assertEqual(len(self.projects.get_projects_with_stats()), 1)
+        self.assertEqual(self.stats('ProjectManager.get_projects_with_stats')['misses'], 2)
+
+    def test_unrelated_write_keeps_entry(self):
+        self.tasks.get_tasks_with_subtask_stats()
+        Topic.objects.create(name="Other Topic")
+        self.tasks.get_tasks_with_subtask_stats()
+        self.assertEqual(self.stats('TaskManager.get_tasks_with_subtask_stats')['hits'], 1)
+
+    def test_bulk_create_invalidates(self):
+        self.assertEqual(len(self.topics.get_topics_with_stats()), 1)
+        bulk_create_topics([{'name': 'Bulk 1'}, {'name': 'Bulk 2'}])
+        self.assertEqual(len(self.topics.get_topics_with_stats()), 3)
+
+    def test_cache_stats_endpoint(self):
+        client = APIClient()
+        client.force_authenticate(user=User.objects.create_user(username='testuser', password='testpass123'))
+        self.topics.get_topics_with_stats()
+        self.topics.get_topics_with_stats()
+        response = client.get(reverse('cache-stats'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        stats = response.data['core.models.TopicManager.get_topics_with_stats']
+        self.assertEqual((stats['hits'], stats['misses']), (1, 1))
+
+
+    def test_detail_lookup_is_cached(self):
+        client, other_client = APIClient(), APIClient()
+        user = User.objects.create_user(username='testuser', password='testpass123')
+        client.force_authenticate(user=user)
+        other_client.force_authenticate(user=User.objects.create_user(username='otheruser', password='testpass123'))
+        ProjectSettings.objects.create(project=self.project)
+        for name, obj in (('topic', self.topic), ('project', self.project)):
+            with self.subTest(name):
+                url = reverse(f'{name}-detail', args=[obj.id])
+                client.get(url)
+                # Остается только запрос валидатора (updated_at для ETag)
+                with self.assertNumQueries(1):
+                    response = client.get(url)
+                self.assertEqual(response.data['name'], obj.name)
+                response = client.put(url, {'name': 'Renamed', 'topic': self.topic.id})
+                self.assertEqual(response.status_code, status.HTTP_200_OK)
+                self.assertEqual(client.get(url).data['name'], 'Renamed')
+        self.assertEqual(self.stats('ProjectManager.get_detail')['hits'], 1)
+
+        # is_favorited - из запроса валидатора, а не из общего для всех закэшированного объекта
+        Favorite.objects.create(user=user, project=self.project)
+        url = reverse('project-detail', args=[self.project.id])
+        self.assertTrue(client.get(url).data['is_favorited'])
+        self.assertFalse(other_client.get(url).data['is_favorited'])
+
+        # Настройки проекта - часть его detail-ответа
+        ProjectSettings.objects.filter(project=self.project).get().delete()
+        self.assertIsNone(client.get(reverse('project-detail', args=[self.project.id])).data['settings'])
+        self.assertEqual(client.get(reverse('topic-detail', args=[999999])).status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_counter_updates_bump_again_on_commit(self):
+        # update() счетчиков не шлет post_save: повторная смена версии после коммита - на самих счетчиках
+        with self.captureOnCommitCallbacks() as callbacks:
+            adjust_topic(self.topic.id, 1)
+            adjust_project(self.project.id, completed=1)
+            adjust_task(self.task.id, comments=1)
+            before = model_versions(Topic, Project, Task)
+        for callback in callbacks:
+            callback()
+        for old, new in zip(before, model_versions(Topic, Project, Task)):
+            self.assertGreater(new, old)
+
+    def test_bulk_updates_bump_again_on_commit(self):
+        subtask = Subtask.objects.create(title="Subtask", description="Description", task=self.task)
+        with self.captureOnCommitCallbacks() as callbacks:
+            bulk_update_task_status([self.task.id], 'done')
+            bulk_update_subtask_status([subtask.id], 'done')
+            before = model_versions(Project, Task, Subtask)
+        for callback in callbacks:
+            callback()
+        for old, new in zip(before, model_versions(Project, Task, Subtask)):
+            self.assertGreater(new, old)
+
+    def test_detail_payload_is_cached(self):
+        client = APIClient()
+        client.force_authenticate(user=User.objects.create_user(username='testuser', password='testpass123'))
+        url = reverse('project-detail', args=[self.project.id])
+        first = client.get(url).data
+        with patch.object(
+            ProjectViewSet, 'get_serializer', autospec=True, side_effect=ProjectViewSet.get_serializer
+        ) as get_serializer:
+            self.assertEqual(client.get(url).data, first)
+            # С параметрами ответ собирается как обычно
+            client.get(url, {'topic': self.topic.id})
+        self.assertEqual(get_serializer.call_count, 1)
+        # Новый updated_at - новый ключ, старый ответ больше не читается
+        client.put(url, {'name': 'Renamed', 'topic': self.topic.id})
+        self.assertEqual(client.get(url).data['name'], 'Renamed')
+
+@override_settings(CACHES=TWO_TIER_CACHE)
+class TwoTierCachedQueryTest(CachedQueryTest):
+    """Те же сценарии cached_query через двухуровневый кэш"""
+
+
+@override_settings(CACHES={'default': LOCMEM_CACHE['default'], 'shared': LOCMEM_CACHE['default']})
+class TwoTierCacheTest(TestCase):
+    """Два экземпляра TwoTierCache с разными LOCATION изображают два воркера"""
+
+    def setUp(self):
+        caches['shared'].clear()
+        self.channel = f'unidoc-tests:{uuid.uuid4().hex}'
+
+    def worker(self, **options):
+        return TwoTierCache(f'unidoc-tests-{uuid.uuid4().hex}', {'OPTIONS': {
+            'SHARED': 'shared', 'BROKER_OPTIONS': {'channel': self.channel}, **options,
+        }})
+
+    def test_reads_are_served_locally(self):
+        worker = self.worker()
+        worker.set('key', 1)
+        self.assertEqual(worker.get('key'), 1)
+        # Запись в общий кэш в обход слоя не видна, пока локальная копия жива
+        caches['shared'].set('key', 2)
+        self.assertEqual(worker.get('key'), 1)
+        self.assertEqual(worker.get_many(['key', 'missing']), {'key': 1})
+
+    def test_writes_invalidate_other_workers(self):
+        first, second = self.worker(), self.worker()
+        second.set('key', 1)
+        self.assertEqual(first.get('key'), 1)
+        second.set('key', 2)
+        self.assertEqual(first.get('key'), 2)
+        second.incr('key')
+        self.assertEqual(first.get('key'), 3)
+        second.delete('key')
+        self.assertIsNone(first.get('key'))
+        second.set('key', 4)
+        first.get('key')
+        second.clear()
+        self.assertIsNone(first.get('key'))
+
+    def test_missed_broadcast_has_bounded_staleness(self):
+        worker = self.worker(LOCAL_TIMEOUT=5)
+        worker.set('key', 1)
+        worker.get('key')
+        caches['shared'].set('key', 2)
+        self.assertEqual(worker.get('key'), 1)
+        with patch('core.cache_backends.time.monotonic', return_value=time.monotonic() + 6):
+            self.assertEqual(worker.get('key'), 2)
+
+    def test_value_read_before_invalidation_is_not_kept(self):
+        first, second = self.worker(), self.worker()
+        second.set('key', 1)
+        shared_get = caches['shared'].get
+
+        def slow_get(*args, **kwargs):
+            # Пока first читает старое значение, second успевает записать новое
+            value = shared_get(*args, **kwargs)
+            second.set('key', 2)
+            return value
+
+        with patch.object(caches['shared'], 'get', side_effect=slow_get):
+            self.assertEqual(first.get('key'), 1)
+        self.assertEqual(first.get('key'), 2)
+
+    def test_lru_is_bounded(self):
+        worker = self.worker(MAX_ENTRIES=2)
+        worker.set_many({'a': 1, 'b': 2, 'c': 3})
+        for key in ('a', 'b', 'c'):
+            worker.get(key)
+        self.assertEqual(len(worker.local), 2)
+        caches['shared'].set('a', 10)
+        caches['shared'].set('c', 30)
+        # a вытеснен и читается заново, c берется из локальной копии
+        self.assertEqual(worker.get_many(['a', 'c']), {'a': 10, 'c': 3})
+
+    def test_only_configured_prefixes_are_local(self):
+        worker = self.worker(LOCAL_KEY_PREFIXES=['hot:'])
+        worker.set_many({'hot:key': 1, 'cold:key': 1})
+        worker.get_many(['hot:key', 'cold:key'])
+        caches['shared'].set_many({'hot:key': 2, 'cold:key': 2})
+        self.assertEqual(worker.get_many(['hot:key', 'cold:key']), {'hot:key': 1, 'cold:key': 2})
+
+    def test_only_local_keys_are_broadcast(self):
+        first, second = self.worker(LOCAL_KEY_PREFIXES=['hot:']), self.worker(LOCAL_KEY_PREFIXES=['hot:'])
+        with patch.object(second.local.broker, 'publish') as publish:
+            second.set('cold:key', 1)
+            second.delete('cold:key')
+            # Новый ключ: add рассылки не шлет, а значение сразу лежит локально
+            self.assertTrue(second.add('hot:new', 1))
+            publish.assert_not_called()
+            second.set('hot:key', 1)
+            publish.assert_called_once()
+        caches['shared'].set('hot:new', 2)
+        self.assertEqual(second.get('hot:new'), 1)
+        self.assertEqual(first.get('hot:new'), 2)
+
+    @skipUnless(os.getenv('TEST_REDIS_URL'), 'нужен Redis: TEST_REDIS_URL=redis://localhost:6379/15')
+    def test_redis_broker(self):
+        options = {
+            'SHARED': 'shared', 'BROKER': 'core.cache_backends.RedisBroker',
+            'BROKER_OPTIONS': {'url': os.environ['TEST_REDIS_URL'], 'channel': self.channel},
+        }
+        first = TwoTierCache(f'unidoc-tests-{uuid.uuid4().hex}', {'OPTIONS': options})
+        second = TwoTierCache(f'unidoc-tests-{uuid.uuid4().hex}', {'OPTIONS': options})
+        time.sleep(0.5)
+        second.set('key', 1)
+        self.assertEqual(first.get('key'), 1)
+        second.set('key', 2)
+        deadline = time.monotonic() + 2
+        while first.get('key') != 2 and time.monotonic() < deadline:
+            time.sleep(0.05)
+        self.assertEqual(first.get('key'), 2)
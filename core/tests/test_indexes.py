@@ -0,0 +1,139 @@
+import os
+import re
+from unittest import skipUnless
+
+from django.contrib.auth.models import User
+from django.db import connection
+from django.db.models import Count
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from ..models import ACTIVE_TASK_STATUSES, Project, Task, Subtask, Document, DocumentVersion, Favorite
+from ..seeding import Seeder
+
+postgres_only = skipUnless(connection.vendor == 'postgresql', 'Планы запросов проверяются только на PostgreSQL')
+
+# Масштаб данных в темах (по 5 проектов и 50 задач в проекте)
+SCALE = int(os.getenv('EXPLAIN_SCALE', '20'))
+# Таблицы от стольких строк считаются большими: полный просмотр маленьких (пользователи, темы) дешевле индекса
+LARGE_TABLE_ROWS = 1000
+# Seq Scan большой таблицы допустим, если по оценке он возвращает хотя бы такую долю ее строк
+# (просроченные - около 40% засеянных задач): индекс тут не дешевле. Отбросить почти все - признак нехватки индекса
+FULL_SCAN_SHARE = 0.2
+SEQ_SCAN = re.compile(r'Seq Scan on (\w+).*? rows=(\d+)')
+
+# Горячие запросы API: (имя маршрута, строка запроса, *аргументы маршрута). Подстановки - id из засеянных данных
+HOT_REQUESTS = [
+    ('task-list', '?project={project}'),
+    ('task-list', '?project={project}&ordering=status'),
+    ('task-list', '?status=review&ordering=-created_at'),
+    ('task-list', '?assigned_to={user}&status=new'),
+    ('task-list', '?overdue=1'),
+    ('task-list', '?ordering=title'),
+    ('task-list', '?favorites_only=1'),
+    ('project-list', '?favorites_only=1&ordering=name'),
+    ('subtask-list', '?task={task}&status=new'),
+    ('subtask-list', '?status=review&ordering=created_at'),
+    ('comment-list', '?task={task}&ordering=-created_at'),
+    ('comment-list', '?author={user}&ordering=-created_at'),
+    ('task-comments', '?ordering=-created_at', 'task'),
+    ('subtask-comments', '', 'subtask'),
+    ('document-list', '?project={project}&ordering=-created_at'),
+    ('documentversion-list', '?document={document}&ordering=version_number'),
+    ('project-list', '?topic={topic}&ordering=name'),
+    ('project-list', '?name={project_name}'),
+    ('topic-list', '?ordering=name'),
+    ('template-list', '?topic={topic}&ordering=name'),
+    ('favorite-list', '?ordering=-created_at'),
+]
+
+
+@postgres_only
+class QueryPlanTest(TestCase):
+    """
+    EXPLAIN каждого SQL-запроса горячих эндпоинтов на засеянных данных после ANALYZE -
+    план, который планировщик выберет и в работе, без принудительных настроек. Seq Scan
+    большой таблицы, отбрасывающий почти все строки, означает, что подходящего индекса нет.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        users = User.objects.bulk_create([User(username=f'plan-user-{i}') for i in range(5)])
+        Seeder(users, projects_per_topic=5, tasks_per_project=50, search_index=False).run(SCALE)
+        cls.user = users[0]
+        project = Project.objects.order_by('id').first()
+        task = Task.objects.filter(subtasks_count__gt=0, comments_count__gt=0).order_by('id').first()
+        cls.ids = {
+            'user': cls.user.id,
+            'topic': project.topic_id,
+            'project': project.id,
+            'project_name': project.name,
+            'task': task.id,
+            'subtask': Subtask.objects.filter(task=task).values_list('id', flat=True).first(),
+            'document': DocumentVersion.objects.order_by('id').values_list('document_id', flat=True).first(),
+        }
+        Favorite.objects.bulk_create(
+            [Favorite(user=cls.user, task=task) for task in Task.objects.order_by('id')[:20]]
+            + [Favorite(user=cls.user, project=project) for project in Project.objects.order_by('id')[:5]]
+        )
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+            cursor.execute(
+                "SELECT relname, reltuples FROM pg_class WHERE relkind = 'r' AND reltuples >= %s", [LARGE_TABLE_ROWS]
+            )
+            cls.large_tables = dict(cursor.fetchall())
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+    def explain(self, sql, params=()):
+        with connection.cursor() as cursor:
+            cursor.execute(f'EXPLAIN {sql}', params)
+            return '\n'.join(row[0] for row in cursor.fetchall())
+
+    def assertIndexed(self, sql, params=(), label=''):
+        plan = self.explain(sql, params)
+        selective_scans = [
+            table for table, rows in SEQ_SCAN.findall(plan)
+            if table in self.large_tables and int(rows) < self.large_tables[table] * FULL_SCAN_SHARE
+        ]
+        self.assertFalse(selective_scans, f'{label}\n{sql}\n{plan}')
+        return plan
+
+    def test_hot_endpoints_use_indexes(self):
+        for name, query, *args in HOT_REQUESTS:
+            url = reverse(name, args=[self.ids[arg] for arg in args]) + query.format(**self.ids)
+            with self.subTest(url=url):
+                with CaptureQueriesContext(connection) as queries:
+                    response = self.client.get(url)
+                self.assertEqual(response.status_code, 200)
+                # COUNT/MAX по всей таблице (ETag списка без фильтров) читает ее целиком при любом индексе
+                selects = [
+                    query['sql'] for query in queries
+                    if query['sql'].startswith('SELECT') and (' WHERE ' in query['sql'] or ' ORDER BY ' in query['sql'])
+                ]
+                self.assertTrue(selects)
+                for sql in selects:
+                    self.assertIndexed(sql, label=url)
+
+    def test_hot_queries_use_indexes(self):
+        # Иначе проверка ничего не проверяет: маленькие таблицы Seq Scan читать вправе
+        self.assertLessEqual({'core_task', 'core_subtask', 'core_comment'}, set(self.large_tables))
+        querysets = {
+            # Страница просроченных; их COUNT ниже - около 40% задач, и там Seq Scan правильный план
+            'overdue page': Task.objects.get_overdue_tasks().order_by('created_at', 'id')[:20],
+            'overdue count': Task.objects.get_overdue_tasks().values('project').annotate(count=Count('id')),
+            # Поиск снимка для новой версии (DocumentVersion.encode_content)
+            'version snapshot': DocumentVersion.objects.filter(
+                document_id=self.ids['document'], base__isnull=True, version_number__lt=100
+            ).order_by('-version_number', '-id')[:1],
+            'open subtasks': Subtask.objects.filter(task_id=self.ids['task'], status__in=ACTIVE_TASK_STATUSES),
+            'project documents': Document.objects.filter(project_id=self.ids['project']).order_by('-created_at')[:20],
+        }
+        for label, queryset in querysets.items():
+            with self.subTest(label):
+                sql, params = queryset.query.sql_with_params()
+                self.assertIndexed(sql, params, label)
@@ -0,0 +1,77 @@
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APIClient
+from ..models import Topic, Project, Task
+from ..middleware import QueryStats
+
+
+def parse_server_timing(header):
+    metrics = {}
+    for entry in header.split(', '):
+        name, *params = entry.split(';')
+        metrics[name] = dict(param.split('=', 1) for param in params)
+    return metrics
+
+
+class QueryMetricsMiddlewareTest(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(
+            username='testuser',
+            password='testpass123'
+        )
+        self.client.force_authenticate(user=self.user)
+        self.topic = Topic.objects.create(name="Test Topic")
+        self.project = Project.objects.create(name="Test Project", topic=self.topic)
+        for i in range(3):
+            Task.objects.create(title=f"Task {i}", description="Description", project=self.project)
+
+    def test_server_timing_header(self):
+        response = self.client.get(reverse('task-list'))
+        metrics = parse_server_timing(response['Server-Timing'])
+        self.assertEqual(metrics['db']['desc'], '"4 queries"')
+        self.assertEqual(metrics['db-dup']['desc'], '"0 duplicate queries"')
+        self.assertGreaterEqual(float(metrics['app']['dur']), float(metrics['db']['dur']))
+        self.assertGreaterEqual(float(metrics['db']['dur']), float(metrics['db-slowest']['dur']))
+
+    def test_duplicate_queries_are_counted(self):
+        stats = QueryStats()
+        with connection.execute_wrapper(stats):
+            list(Task.objects.filter(title="Task 0"))
+            list(Task.objects.filter(title="Task 1"))
+            list(Task.objects.filter(title="Task 0"))
+        self.assertEqual((stats.count, stats.duplicates), (3, 1))
+        self.assertIn('core_task', stats.slowest_sql)
+
+    @override_settings(SERVER_TIMING_HEADER=False)
+    def test_header_can_be_disabled(self):
+        response = self.client.get(reverse('task-list'))
+        self.assertNotIn('Server-Timing', response)
+
+    @override_settings(SLOW_QUERY_MS=0)
+    def test_slow_query_is_logged(self):
+        with self.assertLogs('core.middleware', 'WARNING') as logs:
+            self.client.get(reverse('task-list'))
+        self.assertIn('SELECT', logs.output[0])
+
+    @override_settings(SLOW_QUERY_MS=0)
+    def test_request_without_queries(self):
+        with self.assertNumQueries(0), self.assertNoLogs('core.middleware', 'WARNING'):
+            response = self.client.get(reverse('metrics'), REMOTE_ADDR='127.0.0.1')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(parse_server_timing(response['Server-Timing'])['db']['desc'], '"0 queries"')
+
+    def test_metrics_endpoint(self):
+        self.client.get(reverse('task-list'))
+        response = self.client.get(reverse('metrics'), REMOTE_ADDR='127.0.0.1')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        body = response.content.decode()
+        self.assertIn('unidoc_db_queries_per_request_bucket{le="5.0",method="GET",view="task-list"}', body)
+        self.assertIn('unidoc_request_duration_seconds_count{method="GET",view="task-list"}', body)
+
+    def test_metrics_endpoint_is_internal(self):
+        response = self.client.get(reverse('metrics'), REMOTE_ADDR='10.1.2.3')
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
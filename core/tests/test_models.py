@@ -1,9 +1,15 @@
-from django.test import TestCase
+from django.test import TestCase, TransactionTestCase, override_settings
 from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.db import connection
+from concurrent.futures import ThreadPoolExecutor
+from io import StringIO
+from unittest import skipUnless
 from django.utils import timezone
+from ..optimizations import bulk_create_tasks
 from ..models import (
     Topic, Project, Task, Subtask,
-    Comment, Document, DocumentVersion, Template
+    Comment, Document, DocumentVersion, ContentBlob, Template
 )
 
 class TopicModelTest(TestCase):
@@ -186,6 +192,259 @@ class DocumentVersionModelTest(TestCase):
         self.assertTrue(isinstance(self.version, DocumentVersion))
         self.assertEqual(str(self.version), f"Version {self.version.version_number} of {self.document.title}")
 
+@override_settings(DOCUMENT_VERSION_SNAPSHOT_INTERVAL=3)
+class DocumentVersionStorageTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='testuser',
+            password='testpass123'
+        )
+        self.topic = Topic.objects.create(name="Test Topic")
+        self.project = Project.objects.create(name="Test Project", topic=self.topic)
+        self.document = Document.objects.create(title="Test Document", content="", project=self.project)
+        self.lines = [f"Строка {i} документа\n" for i in range(200)]
+
+    def edit(self, number):
+        self.lines[number * 7] = f"Правка {number}\n"
+        return ''.join(self.lines)
+
+    def create_versions(self, count):
+        contents = []
+        for number in range(1, count + 1):
+            contents.append(self.edit(number))
+            DocumentVersion.objects.create(
+                document=self.document, content=contents[-1],
+                version_number=number, created_by=self.user
+            )
+        return contents
+
+    def test_snapshot_every_interval(self):
+        contents = self.create_versions(7)
+        versions = DocumentVersion.objects.filter(document=self.document).order_by('version_number')
+        self.assertEqual(
+            [version.is_snapshot for version in versions],
+            [True, False, False, True, False, False, True]
+        )
+        self.assertEqual(versions[2].base_id, versions[0].id)
+        self.assertEqual(versions[2].stored_content, '')
+        self.assertEqual(ContentBlob.objects.count(), 3)
+        self.assertEqual([versions[number].blob.content for number in (0, 3, 6)], contents[::3])
+
+    def test_content_reconstruction(self):
+        contents = self.create_versions(7)
+        for number, content in enumerate(contents, start=1):
+            version = DocumentVersion.objects.get(document=self.document, version_number=number)
+            self.assertEqual(version.content, content)
+
+    def test_attach_bases_avoids_per_row_queries(self):
+        contents = self.create_versions(7)
+        with self.assertNumQueries(1):
+            versions = DocumentVersion.attach_bases(
+                DocumentVersion.objects.filter(document=self.document).select_related('blob').order_by('version_number')
+            )
+            self.assertEqual([version.content for version in versions], contents)
+
+    def test_iter_contents_streams_without_instances(self):
+        contents = self.create_versions(7)
+        other = Document.objects.create(title="No Project", content="")
+        DocumentVersion.objects.create(document=other, content="Без проекта", version_number=1, created_by=self.user)
+        with self.assertNumQueries(1):
+            rows = list(DocumentVersion.iter_contents(
+                DocumentVersion.objects.order_by('id'), 'document__project_id', chunk_size=3
+            ))
+        self.assertEqual(rows, [(content, self.project.id) for content in contents] + [("Без проекта", None)])
+
+    def test_snapshot_with_deltas_is_immutable(self):
+        self.create_versions(2)
+        snapshot = DocumentVersion.objects.get(document=self.document, version_number=1)
+        snapshot.content = "Новый текст"
+        with self.assertRaises(ValueError):
+            snapshot.save()
+
+    def test_compress_command(self):
+        with self.settings(DOCUMENT_VERSION_SNAPSHOT_INTERVAL=1):
+            contents = self.create_versions(10)
+        self.assertFalse(DocumentVersion.objects.filter(base__isnull=False).exists())
+        call_command('compress_document_versions', '--interval', '5', stdout=StringIO())
+        versions = DocumentVersion.objects.filter(document=self.document).order_by('version_number')
+        self.assertEqual(sum(version.is_snapshot for version in versions), 2)
+        self.assertEqual([version.content for version in versions], contents)
+        stored = sum(len(version.stored_content) + len(version.delta) for version in versions)
+        stored += sum(len(blob.content) for blob in ContentBlob.objects.filter(versions__document=self.document).distinct())
+        self.assertLess(stored * 3, sum(len(content) for content in contents))
+
+    def test_identical_snapshots_share_blob(self):
+        text = ''.join(self.lines)
+        other = Document.objects.create(title="Copy", content=text, project=self.project)
+        for document in (self.document, other):
+            DocumentVersion.objects.create(document=document, content=text, version_number=1, created_by=self.user)
+        self.assertEqual(ContentBlob.objects.count(), 1)
+        self.assertEqual([version.content for version in DocumentVersion.objects.order_by('id')], [text, text])
+        # bulk_create и версии до миграции 0010 держат текст в своей колонке
+        inline = DocumentVersion(document=other, version_number=2, created_by=self.user)
+        inline.content = "Без блоба"
+        DocumentVersion.objects.bulk_create([inline])
+        rows = list(DocumentVersion.iter_contents(DocumentVersion.objects.order_by('id')))
+        self.assertEqual(rows, [(text,), (text,), ("Без блоба",)])
+
+    def test_add_version_skips_unchanged_content(self):
+        first, created = self.document.add_version("Черновик", self.user)
+        self.assertEqual((first.version_number, created), (1, True))
+        same, created = self.document.add_version("Черновик", self.user)
+        self.assertEqual((same.pk, created), (first.pk, False))
+        second, created = self.document.add_version("Правка", self.user)
+        self.assertEqual((second.version_number, created), (2, True))
+        # Сравнивается только с последней версией: возврат к старому тексту - новая версия
+        third, created = self.document.add_version("Черновик", self.user)
+        self.assertEqual((third.version_number, created), (3, True))
+        self.assertEqual(third.blob_id, first.blob_id)
+        self.assertEqual(ContentBlob.objects.count(), 2)
+
+    def test_add_version_numbers_after_existing(self):
+        contents = self.create_versions(4)
+        version, created = self.document.add_version(contents[-1], self.user)
+        self.assertEqual((version.version_number, created), (4, False))
+        version, _ = self.document.add_version("Новый текст", self.user)
+        self.assertEqual(version.version_number, 5)
+        self.assertEqual(DocumentVersion.objects.get(pk=version.pk).content, "Новый текст")
+
+@skipUnless(connection.vendor == 'postgresql', 'Блокировка строк проверяется только на PostgreSQL')
+class DocumentAddVersionConcurrencyTest(TransactionTestCase):
+    def test_parallel_saves_get_distinct_numbers(self):
+        user = User.objects.create_user(username='testuser', password='testpass123')
+        project = Project.objects.create(name="Test Project", topic=Topic.objects.create(name="Test Topic"))
+        document = Document.objects.create(title="Test Document", content="", project=project)
+
+        def save(number):
+            try:
+                return Document.objects.get(pk=document.pk).add_version(f"Текст {number}", user)[0].version_number
+            finally:
+                connection.close()
+
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            numbers = list(pool.map(save, range(16)))
+        self.assertEqual(sorted(numbers), list(range(1, 17)))
+
+class CounterFieldsTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='testuser',
+            password='testpass123'
+        )
+        self.topic = Topic.objects.create(name="Test Topic")
+        self.project = Project.objects.create(name="Test Project", topic=self.topic)
+        self.other_project = Project.objects.create(name="Other Project", topic=self.topic)
+
+    def assertCounters(self, obj, **expected):
+        obj.refresh_from_db()
+        self.assertEqual({name: getattr(obj, name) for name in expected}, expected)
+
+    def create_task(self, project=None, **kwargs):
+        return Task.objects.create(title="Task", description="Description", project=project or self.project, **kwargs)
+
+    def test_task_create_status_change_and_delete(self):
+        task = self.create_task()
+        self.assertCounters(self.project, active_tasks_count=1, completed_tasks_count=0)
+        self.assertCounters(self.topic, active_projects_count=1)
+
+        task.status = 'review'
+        task.save()
+        self.assertCounters(self.project, active_tasks_count=0, completed_tasks_count=0)
+        self.assertCounters(self.topic, active_projects_count=0)
+
+        task.status = 'done'
+        task.save()
+        self.assertCounters(self.project, active_tasks_count=0, completed_tasks_count=1)
+
+        task.delete()
+        self.assertCounters(self.project, active_tasks_count=0, completed_tasks_count=0)
+
+    def test_task_moved_to_other_project(self):
+        task = self.create_task()
+        self.create_task(project=self.other_project)
+        task.project = self.other_project
+        task.save()
+        self.assertCounters(self.project, active_tasks_count=0)
+        self.assertCounters(self.other_project, active_tasks_count=2)
+        self.assertCounters(self.topic, active_projects_count=1)
+
+    def test_project_moved_to_other_topic(self):
+        other_topic = Topic.objects.create(name="Other Topic")
+        self.create_task()
+        project = Project.objects.get(pk=self.project.pk)
+        project.topic = other_topic
+        project.save()
+        self.assertCounters(self.topic, active_projects_count=0)
+        self.assertCounters(other_topic, active_projects_count=1)
+
+    def test_subtasks_and_comments(self):
+        task = self.create_task()
+        other_task = self.create_task()
+        subtask = Subtask.objects.create(title="Subtask", description="Description", task=task)
+        Comment.objects.create(content="Comment", task=task, author=self.user)
+        comment = Comment.objects.create(content="Comment", task=task, author=self.user)
+        Comment.objects.create(content="On subtask only", subtask=subtask, author=self.user)
+        self.assertCounters(task, subtasks_count=1, comments_count=2)
+
+        comment.task = other_task
+        comment.save()
+        self.assertCounters(task, comments_count=1)
+        self.assertCounters(other_task, comments_count=1)
+
+        subtask.delete()
+        comment.delete()
+        self.assertCounters(task, subtasks_count=0, comments_count=1)
+        self.assertCounters(other_task, comments_count=0)
+
+    def test_stale_instance_does_not_overwrite_counters(self):
+        task = self.create_task()
+        stale_project = Project.objects.get(pk=self.project.pk)
+        stale_task = Task.objects.get(pk=task.pk)
+        self.create_task()
+        Subtask.objects.create(title="Subtask", description="Description", task=task)
+        stale_project.name = "Renamed"
+        stale_project.save()
+        stale_task.title = "Renamed"
+        stale_task.save()
+        self.assertCounters(self.project, name="Renamed", active_tasks_count=2)
+        self.assertCounters(task, title="Renamed", subtasks_count=1)
+
+    def test_deferred_status_is_loaded_before_save(self):
+        task = self.create_task()
+        deferred = Task.objects.only('id', 'title').get(pk=task.pk)
+        deferred.status = 'done'
+        deferred.save()
+        self.assertCounters(self.project, active_tasks_count=0, completed_tasks_count=1)
+
+    def test_bulk_create_tasks(self):
+        bulk_create_tasks([
+            {'title': 'Task', 'description': 'Description', 'project': self.project, 'status': task_status}
+            for task_status in ['new', 'in_progress', 'done']
+        ])
+        self.assertCounters(self.project, active_tasks_count=2, completed_tasks_count=1)
+        self.assertCounters(self.topic, active_projects_count=1)
+
+    def test_reconcile_counters(self):
+        task = self.create_task()
+        Subtask.objects.create(title="Subtask", description="Description", task=task)
+        # update() идет в обход сигналов и оставляет счетчики рассинхронизированными
+        Task.objects.filter(pk=task.pk).update(status='done', subtasks_count=3, comments_count=5)
+
+        out = StringIO()
+        call_command('reconcile_counters', '--dry-run', stdout=out)
+        self.assertIn('Task: строк с расхождением 1, суммарное расхождение 7', out.getvalue())
+        self.assertIn('Project: строк с расхождением 1, суммарное расхождение 2', out.getvalue())
+        self.assertCounters(task, subtasks_count=3, comments_count=5)
+
+        call_command('reconcile_counters', stdout=StringIO())
+        self.assertCounters(task, subtasks_count=1, comments_count=0)
+        self.assertCounters(self.project, active_tasks_count=0, completed_tasks_count=1)
+        self.assertCounters(self.topic, active_projects_count=0)
+
+        out = StringIO()
+        call_command('reconcile_counters', stdout=out)
+        self.assertIn('Счетчики сходятся', out.getvalue())
+
 class TemplateModelTest(TestCase):
     def setUp(self):
         self.topic = Topic.objects.create(name="Test Topic")
@@ -0,0 +1,107 @@
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.test import APIClient
+from ..models import Topic, Project, Task, Comment
+
+class KeysetPaginationTest(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(
+            username='testuser',
+            password='testpass123'
+        )
+        self.client.force_authenticate(user=self.user)
+        self.topic = Topic.objects.create(name="Test Topic")
+        self.project = Project.objects.create(name="Test Project", topic=self.topic)
+        self.task = Task.objects.create(title="Task", description="Description", project=self.project)
+        self.other_task = Task.objects.create(title="Other", description="Description", project=self.project)
+        Comment.objects.bulk_create([
+            Comment(content=f"Comment {i}", task=self.task if i % 3 else self.other_task, author=self.user)
+            for i in range(25)
+        ])
+        # Половина комментариев с одинаковым created_at: порядок держится на id
+        Comment.objects.filter(id__lte=Comment.objects.order_by('id')[12].id).update(created_at=timezone.now())
+        self.url = reverse('comment-list')
+
+    def walk(self, params):
+        ids, url = [], self.url
+        response = self.client.get(url, params)
+        while True:
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            ids.extend(row['id'] for row in response.data['results'])
+            if not response.data['next']:
+                return ids, response
+            response = self.client.get(response.data['next'])
+
+    def expected_ids(self, queryset, *ordering):
+        return list(queryset.order_by(*ordering).values_list('id', flat=True))
+
+    def test_page_number_mode_is_default(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.data['count'], 25)
+        self.assertEqual(len(response.data['results']), 10)
+
+    def test_cursor_mode_walks_every_row_once(self):
+        ids, _ = self.walk({'pagination': 'cursor'})
+        self.assertEqual(ids, self.expected_ids(Comment.objects, 'created_at', 'id'))
+
+    def test_cursor_mode_descending(self):
+        ids, _ = self.walk({'pagination': 'cursor', 'ordering': '-created_at', 'page_size': 7})
+        self.assertEqual(ids, self.expected_ids(Comment.objects, '-created_at', '-id'))
+
+    def test_cursor_mode_composes_with_filters(self):
+        ids, _ = self.walk({'pagination': 'cursor', 'task': self.task.id})
+        self.assertEqual(ids, self.expected_ids(Comment.objects.filter(task=self.task), 'created_at', 'id'))
+
+    def test_previous_link_returns_previous_page(self):
+        first = self.client.get(self.url, {'pagination': 'cursor'})
+        self.assertIsNone(first.data['previous'])
+        second = self.client.get(first.data['next'])
+        back = self.client.get(second.data['previous'])
+        self.assertEqual(
+            [row['id'] for row in back.data['results']],
+            [row['id'] for row in first.data['results']]
+        )
+
+    def test_cursor_mode_skips_count_query(self):
+        first = self.client.get(self.url, {'pagination': 'cursor'})
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(first.data['next'])
+        self.assertFalse(any('COUNT(' in query['sql'] for query in queries.captured_queries))
+
+    def test_invalid_cursor(self):
+        response = self.client.get(self.url, {'cursor': 'not-a-cursor'})
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_unsupported_ordering(self):
+        response = self.client.get(reverse('task-list'), {'pagination': 'cursor', 'ordering': 'status'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_cursor_mode_by_indexed_ordering_fields(self):
+        Task.objects.bulk_create([
+            Task(title=f"Задача {i % 4}", description="", project=self.project) for i in range(12)
+        ])
+        self.url = reverse('task-list')
+        for ordering in ('title', '-title'):
+            with self.subTest(ordering=ordering):
+                ids, _ = self.walk({'pagination': 'cursor', 'ordering': ordering, 'page_size': 5})
+                prefix = ordering[:1] if ordering.startswith('-') else ''
+                self.assertEqual(ids, self.expected_ids(Task.objects, ordering, f'{prefix}id'))
+
+    def test_deep_page_seeks_by_index(self):
+        first = self.client.get(self.url, {'pagination': 'cursor', 'task': self.task.id})
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(first.data['next'])
+        sql = next(query['sql'] for query in queries.captured_queries if 'FROM "core_comment"' in query['sql'])
+        # Граница диапазона отдельным условием, а не только внутри OR
+        self.assertIn('"core_comment"."created_at" >= ', sql)
+        if connection.vendor == 'sqlite':
+            with connection.cursor() as cursor:
+                cursor.execute(f'EXPLAIN QUERY PLAN {sql}')
+                plan = ' '.join(row[-1] for row in cursor.fetchall())
+            self.assertIn('SEARCH core_comment USING INDEX comment_task_created_id_idx (task_id=? AND created_at>?)', plan)
@@ -0,0 +1,199 @@
+"""
+Бюджеты SQL-запросов и латентность каждого endpoint на заполненной базе. По умолчанию
+(PERF_SCALE=10) - 200 тем, 2000 проектов, 20 000 задач, 40 000 подзадач и 60 000
+комментариев; PERF_SCALE=1 - в десять раз меньше для быстрого прогона. Отчет с p50/p95
+пишется во временный каталог или в PERF_REPORT_PATH.
+"""
+import json
+import os
+import tempfile
+import time
+
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from ..factories import (
+    TopicFactory, ProjectFactory, TaskFactory, SubtaskFactory,
+    CommentFactory, DocumentFactory, DocumentVersionFactory, TemplateFactory
+)
+from ..models import (
+    Topic, Project, Task, TaskDetail, Subtask, Comment,
+    Document, DocumentVersion, Template, Favorite
+)
+from ..urls import router
+
+# Масштаб данных: 20 тем и 200 проектов на единицу
+SCALE = int(os.getenv('PERF_SCALE', '10'))
+ITERATIONS = int(os.getenv('PERF_ITERATIONS', '5'))
+REPORT_PATH = os.getenv('PERF_REPORT_PATH', os.path.join(tempfile.gettempdir(), 'unidoc-perf-report.json'))
+
+TOPICS = 20 * SCALE
+PROJECTS_PER_TOPIC = 10
+TASKS_PER_PROJECT = 10
+SUBTASKS_PER_TASK = 2
+COMMENTS_PER_TASK = 3
+DOCUMENTS_PER_PROJECT = 2
+VERSIONS_PER_DOCUMENT = 5
+TEMPLATES_PER_TOPIC = 2
+BATCH_SIZE = 1000
+
+# Потолок числа SQL-запросов на endpoint: (list, detail).
+# Не должен зависеть ни от размера страницы, ни от объема данных.
+# В detail входит запрос updated_at для ETag, в list он совмещен с COUNT(*) пагинации.
+QUERY_BUDGETS = {
+    'topic': (2, 2),
+    'project': (2, 2),
+    'task': (4, 4),
+    'subtask': (2, 2),
+    'comment': (2, 2),
+    'document': (3, 3),
+    'documentversion': (2, 2),
+    'template': (2, 2),
+    'favorite': (2, 2),
+}
+
+
+def percentile(samples, fraction):
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, max(0, round(fraction * len(ordered)) - 1))
+    return ordered[index]
+
+
+def build_batch(factory, size, **kwargs):
+    """Строит объекты фабрикой без сохранения, чтобы вставить их bulk_create"""
+    return [factory.build(**kwargs) for _ in range(size)]
+
+
+class APIPerformanceTest(TestCase):
+    report = {}
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='perfuser', password='testpass123')
+        authors = User.objects.bulk_create([User(username=f'perf-author-{i}') for i in range(10)])
+
+        topics = Topic.objects.bulk_create(build_batch(TopicFactory, TOPICS))
+        Template.objects.bulk_create(
+            [TemplateFactory.build(topic=topic) for topic in topics for _ in range(TEMPLATES_PER_TOPIC)],
+            batch_size=BATCH_SIZE
+        )
+        projects = Project.objects.bulk_create(
+            [ProjectFactory.build(topic=topic) for topic in topics for _ in range(PROJECTS_PER_TOPIC)],
+            batch_size=BATCH_SIZE
+        )
+        statuses = [choice for choice, _ in Task.STATUS_CHOICES]
+        tasks = Task.objects.bulk_create(
+            [
+                TaskFactory.build(project=project, assigned_to=authors[i % len(authors)],
+                                  status=statuses[i % len(statuses)])
+                for project in projects for i in range(TASKS_PER_PROJECT)
+            ],
+            batch_size=BATCH_SIZE
+        )
+        TaskDetail.objects.bulk_create(
+            [TaskDetail(task=task, requirements='Требования', acceptance_criteria='Критерии') for task in tasks],
+            batch_size=BATCH_SIZE
+        )
+        Subtask.objects.bulk_create(
+            [SubtaskFactory.build(task=task) for task in tasks for _ in range(SUBTASKS_PER_TASK)],
+            batch_size=BATCH_SIZE
+        )
+        Comment.objects.bulk_create(
+            [
+                CommentFactory.build(task=task, author=authors[i % len(authors)])
+                for task in tasks for i in range(COMMENTS_PER_TASK)
+            ],
+            batch_size=BATCH_SIZE
+        )
+        documents = Document.objects.bulk_create(
+            [DocumentFactory.build(project=project) for project in projects for _ in range(DOCUMENTS_PER_PROJECT)],
+            batch_size=BATCH_SIZE
+        )
+        DocumentVersion.objects.bulk_create(
+            [
+                DocumentVersionFactory.build(document=document, version_number=number,
+                                             created_by=authors[number % len(authors)])
+                for document in documents for number in range(1, VERSIONS_PER_DOCUMENT + 1)
+            ],
+            batch_size=BATCH_SIZE
+        )
+        Favorite.objects.bulk_create(
+            [Favorite(user=cls.user, project=project) for project in projects[:20]]
+            + [Favorite(user=cls.user, task=task) for task in tasks[:20]]
+        )
+
+    @classmethod
+    def tearDownClass(cls):
+        with open(REPORT_PATH, 'w', encoding='utf-8') as report_file:
+            json.dump({
+                'database': connection.vendor,
+                'scale': SCALE,
+                'iterations': ITERATIONS,
+                'endpoints': cls.report,
+            }, report_file, indent=2, ensure_ascii=False)
+        super().tearDownClass()
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+    def measure(self, name, url):
+        """Выполняет запрос, возвращает число SQL-запросов и пишет латентность в отчет"""
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200, url)
+        # request_started сбрасывает connection.queries, поэтому считаем сразу
+        query_count = len(queries)
+        timings = []
+        for _ in range(ITERATIONS):
+            start = time.perf_counter()
+            self.client.get(url)
+            timings.append((time.perf_counter() - start) * 1000)
+        self.report[name] = {
+            'url': url,
+            'queries': query_count,
+            'p50_ms': round(percentile(timings, 0.50), 2),
+            'p95_ms': round(percentile(timings, 0.95), 2),
+        }
+        return response, query_count
+
+    def test_query_budgets(self):
+        for prefix, viewset, basename in router.registry:
+            list_budget, detail_budget = QUERY_BUDGETS[basename]
+            with self.subTest(endpoint=basename, mode='list'):
+                response, count = self.measure(f'{basename}-list', reverse(f'{basename}-list'))
+                self.assertLessEqual(count, list_budget, f'{prefix} list: {count} queries')
+            with self.subTest(endpoint=basename, mode='detail'):
+                pk = response.data['results'][0]['id']
+                _, count = self.measure(f'{basename}-detail', reverse(f'{basename}-detail', args=[pk]))
+                self.assertLessEqual(count, detail_budget, f'{prefix} detail: {count} queries')
+
+    def test_unchanged_poll_costs_one_query(self):
+        for prefix, viewset, basename in router.registry:
+            list_url = reverse(f'{basename}-list')
+            response = self.client.get(list_url)
+            detail_url = reverse(f'{basename}-detail', args=[response.data['results'][0]['id']])
+            for mode, url, etag in [
+                ('list', list_url, response['ETag']),
+                ('detail', detail_url, self.client.get(detail_url)['ETag']),
+            ]:
+                with self.subTest(endpoint=basename, mode=mode):
+                    with CaptureQueriesContext(connection) as queries:
+                        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+                    self.assertEqual(response.status_code, 304, url)
+                    self.assertEqual(len(queries), 1, f'{prefix} {mode}: {len(queries)} queries')
+
+    def test_list_queries_do_not_depend_on_page(self):
+        for prefix, viewset, basename in router.registry:
+            with self.subTest(endpoint=basename):
+                url = reverse(f'{basename}-list')
+                with CaptureQueriesContext(connection) as first_page:
+                    self.client.get(url)
+                first_page_count = len(first_page)
+                with CaptureQueriesContext(connection) as second_page:
+                    self.client.get(url, {'page': 2})
+                self.assertEqual(first_page_count, len(second_page), prefix)
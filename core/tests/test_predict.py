@@ -0,0 +1,189 @@
+import shutil
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import patch
+
+import mlflow
+import mlflow.sklearn
+from django.contrib.auth.models import User
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from mlflow.tracking import MlflowClient
+from rest_framework import status
+from rest_framework.test import APIClient
+from sklearn.feature_extraction.text import TfidfVectorizer
+from sklearn.linear_model import LogisticRegression
+from sklearn.pipeline import make_pipeline
+
+from ..models import Topic, Project, Document
+from ..predictor import LoadedModel, MicroBatcher, ModelHolder
+
+MODEL_NAME = 'unidoc-test-classifier'
+
+
+class LocalRegistryMixin:
+    """Поднимает файловое хранилище MLflow во временной папке, без сети"""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.mlflow_dir = tempfile.mkdtemp()
+        cls.previous_tracking_uri = mlflow.get_tracking_uri()
+        mlflow.set_tracking_uri(f'file://{cls.mlflow_dir}')
+        mlflow.set_experiment('unidoc-tests')
+
+    @classmethod
+    def tearDownClass(cls):
+        mlflow.set_tracking_uri(cls.previous_tracking_uri)
+        shutil.rmtree(cls.mlflow_dir, ignore_errors=True)
+        super().tearDownClass()
+
+    def register_model(self, labels):
+        """Обучает крошечную модель, регистрирует ее и переводит в Production"""
+        texts = ['договор поставки', 'акт выполненных работ', 'техническое задание', 'счет на оплату']
+        model = make_pipeline(TfidfVectorizer(), LogisticRegression()).fit(texts, labels)
+        with mlflow.start_run():
+            mlflow.sklearn.log_model(model, 'model', registered_model_name=MODEL_NAME)
+        client = MlflowClient()
+        version = client.get_latest_versions(MODEL_NAME, stages=['None'])[0].version
+        client.transition_model_version_stage(MODEL_NAME, version, 'Production', archive_existing_versions=True)
+        return version
+
+
+class ModelHolderTest(LocalRegistryMixin, TestCase):
+    def test_loads_once_and_swaps_new_version(self):
+        first_version = self.register_model([1, 1, 2, 2])
+        holder = ModelHolder(MODEL_NAME, poll_interval=0)
+        with patch('core.predictor.mlflow.pyfunc.load_model', wraps=mlflow.pyfunc.load_model) as load_model:
+            loaded = holder.get()
+            holder.get()
+            self.assertEqual(load_model.call_count, 1)
+            self.assertEqual(loaded.version, first_version)
+            self.assertFalse(holder.refresh())
+
+            second_version = self.register_model([3, 3, 4, 4])
+            self.assertTrue(holder.refresh())
+            self.assertEqual(load_model.call_count, 2)
+        # Ссылка на старую модель остается рабочей после подмены
+        self.assertIn(loaded.model.predict(['договор поставки'])[0], [1, 2])
+        self.assertEqual(holder.get().version, second_version)
+        self.assertIn(holder.get().model.predict(['договор поставки'])[0], [3, 4])
+
+    def test_missing_model(self):
+        holder = ModelHolder('unidoc-missing-model', poll_interval=0)
+        with patch.object(ModelHolder, 'latest_version', return_value=None):
+            with self.assertRaises(LookupError):
+                holder.get()
+
+
+class PredictDocumentClassViewTest(LocalRegistryMixin, TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(
+            username='testuser',
+            password='testpass123'
+        )
+        self.client.force_authenticate(user=self.user)
+        self.holder = ModelHolder(MODEL_NAME, poll_interval=0)
+        patcher = patch('core.views.model_holder', self.holder)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_predict_reports_model_version(self):
+        version = self.register_model([1, 1, 2, 2])
+        response = self.client.post(reverse('predict-document-class'), {'text': 'счет на оплату'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['model_version'], version)
+        self.assertIn(response.data['prediction'], [1, 2])
+
+    def test_predict_requires_text(self):
+        response = self.client.post(reverse('predict-document-class'), {})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_status(self):
+        version = self.register_model([1, 1, 2, 2])
+        response = self.client.get(reverse('predict-document-class-status'))
+        self.assertIsNone(response.data['version'])
+        self.holder.get()
+        response = self.client.get(reverse('predict-document-class-status'))
+        self.assertEqual(response.data['version'], version)
+        self.assertEqual(response.data['model_name'], MODEL_NAME)
+
+
+class FakeModel:
+    """Модель-заглушка: класс текста - его длина, запоминает размеры пачек"""
+
+    def __init__(self):
+        self.batch_sizes = []
+        self.lock = threading.Lock()
+
+    def predict(self, texts):
+        with self.lock:
+            self.batch_sizes.append(len(texts))
+        return [len(text) for text in texts]
+
+
+class FakeHolder:
+    def __init__(self):
+        self.model = FakeModel()
+
+    def get(self):
+        return LoadedModel(version='7', model=self.model, loaded_at=timezone.now())
+
+
+class MicroBatcherTest(TestCase):
+    def test_concurrent_requests_share_predict_calls(self):
+        holder = FakeHolder()
+        batcher = MicroBatcher(holder, max_batch_size=64, max_wait_ms=200)
+        texts = ['a' * length for length in range(1, 17)]
+        with ThreadPoolExecutor(max_workers=len(texts)) as pool:
+            results = list(pool.map(batcher.predict, texts))
+        self.assertEqual(results, [(len(text), '7') for text in texts])
+        self.assertEqual(sum(holder.model.batch_sizes), len(texts))
+        self.assertLess(len(holder.model.batch_sizes), len(texts))
+
+    def test_batch_size_limit(self):
+        holder = FakeHolder()
+        batcher = MicroBatcher(holder, max_batch_size=4, max_wait_ms=200)
+        with ThreadPoolExecutor(max_workers=10) as pool:
+            list(pool.map(batcher.predict, ['text'] * 10))
+        self.assertTrue(all(size <= 4 for size in holder.model.batch_sizes))
+
+
+class PredictDocumentClassBatchViewTest(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(
+            username='testuser',
+            password='testpass123'
+        )
+        self.client.force_authenticate(user=self.user)
+        self.holder = FakeHolder()
+        patcher = patch('core.views.model_holder', self.holder)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.url = reverse('predict-document-class-batch')
+
+    @override_settings(ML_BATCH_CHUNK_SIZE=2)
+    def test_predict_texts(self):
+        response = self.client.post(self.url, {'texts': ['a', 'bb', 'ccc']}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['predictions'], [1, 2, 3])
+        self.assertEqual(response.data['model_version'], '7')
+        self.assertEqual(self.holder.model.batch_sizes, [2, 1])
+
+    def test_predict_documents(self):
+        project = Project.objects.create(name="Test Project", topic=Topic.objects.create(name="Test Topic"))
+        document = Document.objects.create(title="Test Document", content="Test Content", project=project)
+        response = self.client.post(self.url, {'document_ids': [document.id, 999999]}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['predictions'], [{'document_id': document.id, 'prediction': 12}])
+        self.assertEqual(response.data['not_found'], [999999])
+
+    @override_settings(ML_BATCH_MAX_ITEMS=2)
+    def test_invalid_payloads(self):
+        for payload in [{}, {'texts': ['a', 'b', 'c']}, {'texts': ['a', '']}, {'texts': ['a'], 'document_ids': [1]}]:
+            response = self.client.post(self.url, payload, format='json')
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST, payload)
@@ -0,0 +1,145 @@
+from io import StringIO
+from unittest import skipUnless
+
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APIClient
+from ..models import Topic, Project, Task, Comment, Document, DocumentVersion, Template
+
+postgres_only = skipUnless(connection.vendor == 'postgresql', 'Полнотекстовый индекс есть только на PostgreSQL')
+
+
+class FullTextSearchTestMixin:
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(
+            username='testuser',
+            password='testpass123'
+        )
+        self.client.force_authenticate(user=self.user)
+        self.topic = Topic.objects.create(name="Test Topic")
+        self.project = Project.objects.create(name="Test Project", topic=self.topic)
+        self.task = Task.objects.create(title="Test Task", description="Description", project=self.project)
+        self.contract = Document.objects.create(
+            title="Договор поставки",
+            content="Поставщик обязуется передать товар покупателю",
+            project=self.project
+        )
+        self.invoice = Document.objects.create(
+            title="Счет на оплату",
+            content="Оплата по договору поставки в течение пяти дней",
+            project=self.project
+        )
+        self.other = Document.objects.create(
+            title="Release notes",
+            content="Flights were rescheduled",
+            project=self.project
+        )
+        Comment.objects.create(content="Нужно проверить договор", task=self.task, author=self.user)
+        Comment.objects.create(content="Все готово", task=self.task, author=self.user)
+        Template.objects.create(name="Шаблон договора", content="Стороны договорились", topic=self.topic)
+
+    def search(self, name, text):
+        response = self.client.get(reverse(f'{name}-list'), {'q': text})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return [row['id'] for row in response.data['results']]
+
+
+class FullTextSearchTest(FullTextSearchTestMixin, TestCase):
+    """Проверки, которые проходят и на SQLite (там ?q= работает как ?search=)"""
+
+    def test_without_query_returns_everything(self):
+        self.assertEqual(len(self.search('document', '')), 3)
+
+    def test_documents(self):
+        self.assertEqual(set(self.search('document', 'поставки')), {self.contract.id, self.invoice.id})
+        self.assertEqual(self.search('document', 'Flights'), [self.other.id])
+
+    def test_comments_and_templates(self):
+        self.assertEqual(len(self.search('comment', 'договор')), 1)
+        self.assertEqual(len(self.search('template', 'договор')), 1)
+
+
+@postgres_only
+class PostgresFullTextSearchTest(FullTextSearchTestMixin, TestCase):
+    """Путь через tsvector/GIN: TEST_DB=postgres pytest core/tests/test_search.py"""
+
+    def test_vector_maintained_on_save(self):
+        self.assertTrue(Document.objects.filter(id=self.contract.id, search_vector__isnull=False).exists())
+        self.contract.title = "Акт приемки"
+        self.contract.content = "Работы приняты"
+        self.contract.save()
+        self.assertEqual(self.search('document', 'акты'), [self.contract.id])
+        self.assertEqual(self.search('document', 'поставщик'), [])
+
+    @override_settings(DOCUMENT_VERSION_SNAPSHOT_INTERVAL=3)
+    def test_versions_stored_as_deltas(self):
+        base = ''.join(f"Строка {i}\n" for i in range(50))
+        snapshot = DocumentVersion.objects.create(
+            document=self.contract, content=base, version_number=1, created_by=self.user
+        )
+        version = DocumentVersion.objects.create(
+            document=self.contract, content=base + "Дополнительное соглашение\n",
+            version_number=2, created_by=self.user
+        )
+        self.assertFalse(version.is_snapshot)
+        self.assertEqual(self.search('documentversion', 'соглашение'), [version.id])
+
+        def search(text):
+            response = self.client.get(reverse('documentversion-list'), {'search': text})
+            return {row['id'] for row in response.data['results']}
+
+        # Слово есть только в версии-дельте
+        self.assertEqual(search('соглашение'), {version.id})
+        # Текст из снимка, который дельта только копирует, находится в обеих версиях
+        self.assertEqual(search('Строка'), {snapshot.id, version.id})
+        # Сам JSON дельты не ищется
+        self.assertEqual(search('[0,50]'), set())
+
+    def test_russian_and_english_morphology(self):
+        # "оплаты" -> "оплата"/"оплату", "поставщиком" -> "поставщик", "flight" -> "flights"
+        self.assertEqual(self.search('document', 'оплаты'), [self.invoice.id])
+        self.assertEqual(self.search('document', 'поставщиком'), [self.contract.id])
+        self.assertEqual(self.search('document', 'flight'), [self.other.id])
+
+    def test_title_ranks_above_content(self):
+        self.assertEqual(self.search('document', 'поставка'), [self.contract.id, self.invoice.id])
+
+    def test_uses_gin_index(self):
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT indexname FROM pg_indexes WHERE indexname LIKE '%%_search_idx'")
+            indexes = {row[0] for row in cursor.fetchall()}
+        self.assertEqual(indexes, {
+            'core_document_search_idx', 'core_documentversion_search_idx',
+            'core_comment_search_idx', 'core_template_search_idx',
+        })
+
+    @override_settings(DOCUMENT_VERSION_SNAPSHOT_INTERVAL=3)
+    def test_rebuild_command(self):
+        base = ''.join(f"Строка {i}\n" for i in range(50))
+        DocumentVersion.objects.create(document=self.contract, content=base, version_number=1, created_by=self.user)
+        DocumentVersion.objects.create(
+            document=self.contract, content=base + "Дополнительное соглашение\n",
+            version_number=2, created_by=self.user
+        )
+        for model in (Document, DocumentVersion, Comment, Template):
+            model.objects.update(search_vector=None)
+        self.assertEqual(self.search('document', 'поставки'), [])
+
+        call_command('rebuild_search_index', '--batch-size', '2', stdout=StringIO())
+        self.assertEqual(len(self.search('document', 'поставки')), 2)
+        self.assertEqual(len(self.search('documentversion', 'соглашение')), 1)
+        self.assertEqual(len(self.search('comment', 'договор')), 1)
+        self.assertEqual(len(self.search('template', 'договор')), 1)
+
+
+class RebuildSearchIndexCommandTest(TestCase):
+    @skipUnless(connection.vendor != 'postgresql', 'Проверка отказа на базах без tsvector')
+    def test_requires_postgres(self):
+        with self.assertRaises(CommandError):
+            call_command('rebuild_search_index', stdout=StringIO())
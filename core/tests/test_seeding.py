@@ -0,0 +1,81 @@
+from datetime import date, datetime, timezone
+from io import StringIO
+
+from django.core.management import call_command
+from django.db import connection
+from django.db.models import Max, Min
+from django.test import TestCase
+from ..counters import reconcile
+from ..models import Topic, Project, Task, Subtask, Comment, Document, DocumentVersion, Template
+
+SMALL = {
+    'projects_per_topic': 2, 'tasks_per_project': 5, 'subtasks_per_task': 1, 'comments_per_task': 2,
+    'documents_per_project': 2, 'versions_per_document': 3, 'users': 3,
+}
+
+
+class GenerateTestDataCommandTest(TestCase):
+    def generate(self, **options):
+        out = StringIO()
+        call_command('generate_test_data', stdout=out, **{**SMALL, **options})
+        return out.getvalue()
+
+    def snapshot(self):
+        return (
+            list(Task.objects.order_by('id').values_list('title', 'status', 'description', 'subtasks_count', 'created_at')),
+            list(Comment.objects.order_by('id').values_list('content', 'author__username')),
+            [version.content for version in DocumentVersion.attach_bases(DocumentVersion.objects.order_by('id'))],
+        )
+
+    def test_loads_requested_scale(self):
+        output = self.generate(scale=2)
+        self.assertEqual(Topic.objects.count(), 2)
+        self.assertEqual(Project.objects.count(), 4)
+        self.assertEqual(Task.objects.count(), 20)
+        self.assertIn('Создано тем: 2, проектов: 4, задач: 20', output)
+        self.assertEqual(Template.objects.count(), 4)
+        self.assertTrue(Subtask.objects.exists())
+        self.assertTrue(Comment.objects.exists())
+        # Даты разнесены по времени, а не равны моменту загрузки
+        self.assertGreater(Task.objects.values('created_at').distinct().count(), 1)
+
+    def test_counters_consistent(self):
+        self.generate(scale=2)
+        for model in (Task, Project, Topic):
+            self.assertEqual(reconcile(model, fix=False), (0, 0), model.__name__)
+
+    def test_versions_decode_to_document_content(self):
+        self.generate(scale=1, documents_per_project=3, versions_per_document=6)
+        for document in Document.objects.all():
+            versions = DocumentVersion.attach_bases(document.versions.order_by('version_number'))
+            self.assertEqual([version.version_number for version in versions], list(range(1, len(versions) + 1)))
+            self.assertEqual(versions[-1].content, document.content)
+
+    def test_idempotent_and_incremental(self):
+        self.generate(scale=1)
+        output = self.generate(scale=1)
+        self.assertIn('Уже загружено тем: 1', output)
+        self.assertEqual(Task.objects.count(), 10)
+        self.generate(scale=2)
+        self.assertEqual(Topic.objects.count(), 2)
+        self.assertEqual(Task.objects.count(), 20)
+
+    def test_deterministic(self):
+        self.generate(scale=1, seed=7)
+        first = self.snapshot()
+        Topic.objects.all().delete()
+        self.generate(scale=1, seed=7)
+        self.assertEqual(self.snapshot(), first)
+        self.generate(scale=1, seed=8)
+        self.assertEqual(Topic.objects.count(), 2)
+
+    def test_dates_end_at_until(self):
+        self.generate(scale=1, until=date(2025, 3, 1), days=30)
+        dates = Task.objects.aggregate(first=Min('created_at'), last=Max('created_at'))
+        self.assertGreaterEqual(dates['first'], datetime(2025, 1, 30, tzinfo=timezone.utc))
+        self.assertLessEqual(dates['last'], datetime(2025, 3, 1, tzinfo=timezone.utc))
+
+    def test_search_vectors(self):
+        self.generate(scale=1)
+        has_vectors = not Comment.objects.filter(search_vector__isnull=True).exists()
+        self.assertEqual(has_vectors, connection.vendor == 'postgresql')
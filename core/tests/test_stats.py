@@ -0,0 +1,104 @@
+from io import StringIO
+from unittest import skipUnless
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from ..models import Topic, Project, Task, TopicStats, ProjectStats
+from ..stats import refresh_stats, writes_since_refresh
+from .test_cache import LOCMEM_CACHE
+
+postgres_only = skipUnless(connection.vendor == 'postgresql', 'Материализованные представления есть только на PostgreSQL')
+
+
+@override_settings(CACHES=LOCMEM_CACHE)
+class StatsViewsTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(user=User.objects.create_user(username='testuser', password='testpass123'))
+        self.topic = Topic.objects.create(name="Test Topic")
+        self.empty_topic = Topic.objects.create(name="Empty Topic")
+        self.project = Project.objects.create(name="Test Project", topic=self.topic)
+        self.idle_project = Project.objects.create(name="Idle Project", topic=self.topic)
+        Project.objects.create(name="Done Project", topic=self.topic)
+        for status_, count in (('new', 2), ('in_progress', 1), ('review', 1), ('done', 3)):
+            for i in range(count):
+                Task.objects.create(title=f"{status_} {i}", description="", project=self.project, status=status_)
+        Task.objects.create(title="Done", description="", project=Project.objects.get(name="Done Project"), status='done')
+        refresh_stats()
+
+    def test_views_match_live_aggregates(self):
+        for topic in Topic.objects.all().with_project_stats():
+            stats = TopicStats.objects.get(topic=topic)
+            self.assertEqual(
+                (stats.total_projects, stats.active_projects, stats.completed_projects),
+                (topic.total_projects, topic.active_projects, topic.completed_projects),
+            )
+        for project in Project.objects.all().with_task_stats():
+            stats = ProjectStats.objects.get(project=project)
+            self.assertEqual(
+                (stats.total_tasks, stats.active_tasks, stats.completed_tasks, stats.topic_id),
+                (project.total_tasks, project.active_tasks, project.completed_tasks, project.topic_id),
+            )
+        self.assertEqual(TopicStats.objects.get(topic=self.topic).total_tasks, 8)
+
+    def test_stats_endpoints_are_single_lookups(self):
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse('topic-stats', args=[self.topic.id]))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['total_projects'], 3)
+        self.assertEqual(response.data['active_projects'], 1)
+        self.assertEqual(response.data['completed_projects'], 2)
+        self.assertIsNotNone(response.data['refreshed_at'])
+
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse('project-stats', args=[self.project.id]))
+        self.assertEqual(
+            {key: response.data[key] for key in ('project', 'total_tasks', 'active_tasks', 'completed_tasks')},
+            {'project': self.project.id, 'total_tasks': 7, 'active_tasks': 3, 'completed_tasks': 3},
+        )
+        response = self.client.get(reverse('project-stats', args=[self.idle_project.id]))
+        self.assertEqual(response.data['total_tasks'], 0)
+
+    def test_missing_object(self):
+        response = self.client.get(reverse('topic-stats', args=[999999]))
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    @postgres_only
+    def test_stats_lag_until_refresh(self):
+        Task.objects.create(title="Another", description="", project=self.idle_project)
+        new_project = Project.objects.create(name="New Project", topic=self.empty_topic)
+        url = reverse('project-stats', args=[self.idle_project.id])
+        self.assertEqual(self.client.get(url).data['active_tasks'], 0)
+        # Проект появился после пересчета: нули вместо 404
+        response = self.client.get(reverse('project-stats', args=[new_project.id]))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual((response.data['total_tasks'], response.data['refreshed_at']), (0, None))
+
+        refresh_stats()
+        self.assertEqual(self.client.get(url).data['active_tasks'], 1)
+        self.assertEqual(self.client.get(reverse('topic-stats', args=[self.empty_topic.id])).data['total_projects'], 1)
+
+    def test_refresh_command_thresholds(self):
+        def run(*args):
+            out = StringIO()
+            call_command('refresh_stats', *args, stdout=out)
+            return out.getvalue()
+
+        self.assertEqual(writes_since_refresh(), 0)
+        self.assertIn('актуальна', run('--min-writes', '3', '--max-age', '3600'))
+        for i in range(3):
+            Task.objects.create(title=f"Extra {i}", description="", project=self.idle_project)
+        self.assertGreaterEqual(writes_since_refresh(), 3)
+        self.assertIn('пересчитана', run('--min-writes', '3', '--max-age', '3600'))
+        self.assertEqual(writes_since_refresh(), 0)
+        # По возрасту: статистика старше max-age пересчитывается и без записей
+        self.assertIn('пересчитана', run('--min-writes', '1000', '--max-age', '0'))
+        self.assertIn('пересчитана', run('--force', '--blocking'))
@@ -0,0 +1,147 @@
+import os
+import shutil
+import tempfile
+from unittest.mock import Mock, patch
+
+import mlflow
+from django.contrib.auth.models import User
+from django.test import TestCase
+from mlflow.tracking import MlflowClient
+from scipy import sparse
+
+from unidoc.ml import train
+from ..models import Topic, Project, Document, DocumentVersion
+from .test_predict import LocalRegistryMixin, MODEL_NAME
+
+TEXTS = ['договор поставки оборудования', 'акт выполненных работ по ремонту']
+
+
+class IncrementalTrainingTest(LocalRegistryMixin, TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='testuser', password='testpass123')
+        topic = Topic.objects.create(name="Test Topic")
+        self.documents = [
+            Document.objects.create(title=text, content="", project=Project.objects.create(name=text, topic=topic))
+            for text in TEXTS
+        ]
+        self.add_versions(20)
+        with mlflow.start_run():
+            watermark = train.current_watermark()
+            pipeline, _, _ = train.train_model_streaming(batch_size=8, n_features=2 ** 10, epochs=5, until=watermark)
+            model_info = mlflow.sklearn.log_model(pipeline, "model")
+            train.log_watermark(watermark)
+            self.first_version = train.register_and_promote(model_info, MODEL_NAME, 'Production')
+
+    def add_versions(self, count):
+        """count версий в каждом документе; текст версии - текст его проекта с номером"""
+        ids = []
+        for document, text in zip(self.documents, TEXTS):
+            start = document.versions.count()
+            for number in range(start + 1, start + count + 1):
+                ids.append(DocumentVersion.objects.create(
+                    document=document, content=f"{text} {number}", version_number=number, created_by=self.user
+                ).id)
+        return ids
+
+    def retrain(self, **kwargs):
+        with mlflow.start_run():
+            return train.retrain_incremental(batch_size=8, model_name=MODEL_NAME, stage='Production', **kwargs)
+
+    def production_version(self):
+        return MlflowClient().get_latest_versions(MODEL_NAME, stages=['Production'])[0].version
+
+    def test_trains_only_on_new_versions_and_promotes(self):
+        new_ids = self.add_versions(5)
+        result = self.retrain()
+        self.assertEqual(result['trained'], sum(pk % 10 >= train.TEST_BUCKETS for pk in new_ids))
+        self.assertTrue(result['promoted'])
+        self.assertEqual(self.production_version(), result['version'])
+        self.assertNotEqual(result['version'], self.first_version)
+        # Следующий запуск продолжает с нового водяного знака
+        self.assertEqual(self.retrain()['trained'], 0)
+
+    def test_regression_is_not_promoted(self):
+        self.add_versions(5)
+        # Сначала оценивается текущая модель, затем дообученная
+        with patch.object(train, 'evaluate_pipeline', side_effect=[(0.9, ''), (0.85, '')]):
+            result = self.retrain(tolerance=0.01)
+        self.assertFalse(result['promoted'])
+        self.assertEqual(self.production_version(), self.first_version)
+
+    def test_unknown_projects_are_skipped(self):
+        project = Project.objects.create(name="Новый проект", topic=Topic.objects.get())
+        document = Document.objects.create(title="Новый", content="", project=project)
+        ids = [
+            DocumentVersion.objects.create(document=document, content=f"накладная {number}", version_number=number, created_by=self.user).id
+            for number in range(1, 11)
+        ]
+        result = self.retrain()
+        self.assertEqual(result['trained'], 0)
+        self.assertEqual(result['skipped'], sum(pk % 10 >= train.TEST_BUCKETS for pk in ids))
+
+
+class FeatureCacheTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='testuser', password='testpass123')
+        topic = Topic.objects.create(name="Test Topic")
+        self.documents = [
+            Document.objects.create(title=text, content="", project=Project.objects.create(name=text, topic=topic))
+            for text in TEXTS
+        ]
+        self.add_versions(10)
+        self.cache_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.cache_dir, ignore_errors=True)
+
+    def add_versions(self, count):
+        for document, text in zip(self.documents, TEXTS):
+            start = document.versions.count()
+            for number in range(start + 1, start + count + 1):
+                DocumentVersion.objects.create(
+                    document=document, content=f"{text} {number}", version_number=number, created_by=self.user
+                )
+
+    def ensure_features(self, load_texts):
+        return train.ensure_features({'max_features': 50}, train.data_snapshot(), self.cache_dir, load_texts)
+
+    def test_cache_hit_skips_vectorization(self):
+        load_texts = Mock(wraps=train.load_data)
+        path = self.ensure_features(load_texts)
+        self.assertEqual(load_texts.call_count, 1)
+        with patch.object(train, 'TfidfVectorizer') as vectorizer:
+            self.assertEqual(self.ensure_features(load_texts), path)
+        vectorizer.assert_not_called()
+        self.assertEqual(load_texts.call_count, 1)
+
+    def test_changed_snapshot_invalidates_and_evicts(self):
+        load_texts = Mock(wraps=train.load_data)
+        old_path = self.ensure_features(load_texts)
+        self.add_versions(1)
+        path = self.ensure_features(load_texts)
+        self.assertNotEqual(path, old_path)
+        self.assertEqual(load_texts.call_count, 2)
+        # Признаки прежнего снимка удалены, остались только файлы нового
+        prefix = os.path.basename(path)
+        self.assertTrue(os.listdir(self.cache_dir))
+        self.assertTrue(all(name.startswith(prefix) for name in os.listdir(self.cache_dir)))
+        self.assertEqual(sparse.load_npz(path + '.npz').shape[0], len(TEXTS) * 11)
+
+    def test_search_in_process_pool(self):
+        output_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, output_dir, ignore_errors=True)
+        vectorizer_grid = {'max_features': [20, 50]}
+        model_grid = {'n_estimators': [5, 10]}
+        with patch.object(train, 'ProcessPoolExecutor', wraps=train.ProcessPoolExecutor) as pool, \
+                patch.object(train, 'load_data', wraps=train.load_data) as load_data:
+            candidates = train.search(vectorizer_grid, model_grid, output_dir, n_jobs=2, cache_dir=self.cache_dir)
+        pool.assert_called_once_with(max_workers=2)
+        # Тексты читаются один раз на все векторизаторы, матрица - одна на векторизатор
+        load_data.assert_called_once()
+        self.assertEqual(len(candidates), 4)
+        self.assertEqual(len({candidate['features_path'] for candidate in candidates}), 2)
+        for candidate in candidates:
+            self.assertTrue(0 <= candidate['accuracy'] <= 1)
+            self.assertTrue(os.path.exists(candidate['model_path']))
+        # Повторный перебор на тех же данных берет признаки из кэша
+        with patch.object(train, 'load_data') as load_data:
+            train.search(vectorizer_grid, {'n_estimators': [5]}, output_dir, n_jobs=1, cache_dir=self.cache_dir)
+        load_data.assert_not_called()
@@ -1,10 +1,12 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
+from . import async_views
 from .views import (
     TopicViewSet, ProjectViewSet, TaskViewSet,
     SubtaskViewSet, CommentViewSet, DocumentViewSet,
     DocumentVersionViewSet, TemplateViewSet, FavoriteViewSet,
-    PredictDocumentClassView
+    PredictDocumentClassView, PredictDocumentClassBatchView, PredictorStatusView,
+    CacheStatsView
 )
 from drf_yasg.views import get_schema_view
 from drf_yasg import openapi
@@ -39,4 +41,13 @@ urlpatterns = [
     path('swagger/', schema_view.with_ui('swagger', cache_timeout=0), name='schema-swagger-ui'),
     path('redoc/', schema_view.with_ui('redoc', cache_timeout=0), name='schema-redoc'),
     path('predict-document-class/', PredictDocumentClassView.as_view(), name='predict-document-class'),
+    path('predict-document-class/batch/', PredictDocumentClassBatchView.as_view(), name='predict-document-class-batch'),
+    path('predict-document-class/status/', PredictorStatusView.as_view(), name='predict-document-class-status'),
+    path('cache-stats/', CacheStatsView.as_view(), name='cache-stats'),
+    # Async-версии горячих read-эндпоинтов (для запуска под ASGI)
+    path('async/tasks/', async_views.task_list, name='async-task-list'),
+    path('async/tasks/<int:pk>/', async_views.task_detail, name='async-task-detail'),
+    path('async/projects/', async_views.project_list, name='async-project-list'),
+    path('async/documents/<int:pk>/', async_views.document_detail, name='async-document-detail'),
+    path('async/predict-document-class/', async_views.predict_document_class, name='async-predict-document-class'),
 ] 
\ No newline at end of file
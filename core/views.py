@@ -1,4 +1,7 @@
+import hashlib
+
 from django.shortcuts import render
+from django.db.models import Count, IntegerField, Max, Prefetch
 from rest_framework import viewsets, permissions, filters
 from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework.decorators import action
@@ -6,27 +9,189 @@ from rest_framework.response import Response
 from .models import (
     Topic, Project, ProjectSettings, Task, TaskDetail,
     Subtask, Comment, Document, DocumentVersion, Template,
-    Favorite
+    Favorite, TopicStats, ProjectStats
 )
 from .serializers import (
     TopicSerializer, ProjectSerializer, TaskSerializer,
     SubtaskSerializer, CommentSerializer, DocumentSerializer,
-    DocumentVersionSerializer, TemplateSerializer, FavoriteSerializer
+    DocumentVersionSerializer, TemplateSerializer, FavoriteSerializer,
+    TopicStatsSerializer, ProjectStatsSerializer
 )
 from rest_framework.views import APIView
 from rest_framework import status
-import mlflow.pyfunc
+from .predictor import model_holder, micro_batcher, predict_many
+from .search import ContentSearchFilter, FullTextSearchFilter
+from .pagination import CommentThreadPagination
+from .export import NDJSONRenderer, CSVRenderer
+from .caching import cache_stats, payload_key
+from .optimizations import (
+    bulk_create_tasks, bulk_create_subtasks,
+    bulk_update_task_status, bulk_update_subtask_status
+)
+from django.conf import settings
+from django.core.cache import cache
+from django.http import Http404, StreamingHttpResponse
+from rest_framework.generics import get_object_or_404
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
 
 # Create your views here.
 
-class TopicViewSet(viewsets.ModelViewSet):
+class ConditionalGetMixin:
+    """
+    ETag / Last-Modified для list и retrieve. Валидатор считается одним запросом до
+    сериализации: для списка - MAX(updated_at) и COUNT(*) по отфильтрованному queryset
+    (в keyset-режиме пагинации - id и updated_at строк страницы), для объекта - его updated_at. Изменения вложенных данных (подзадачи, комментарии,
+    версии, счетчики) сдвигают updated_at родителя, так что он меняется вместе с ответом.
+    Если If-None-Match или If-Modified-Since совпали - сразу 304 без сериализаторов.
+
+    Поля, которые меняются со временем без записи в базу (is_overdue задачи), дают
+    validator_time_fields - аннотации с моментом такого изменения (NULL, пока он не
+    наступил). Для списка в ETag идет их MAX, для объекта Last-Modified - самый поздний
+    из validator_field и этих моментов.
+
+    У списков Last-Modified не отдается: удаление строки не сдвигает MAX(updated_at),
+    и ответ по одной дате был бы устаревшим. Изменение COUNT(*) учитывает только ETag.
+    """
+    validator_field = 'updated_at'
+    # Аннотации строки (is_favorited и т.п.), которые retrieve читает тем же запросом, что и валидатор
+    validator_annotations = ()
+    validator_time_fields = ()
+    validator_row = None
+
+    def make_etag(self, request, *parts):
+        # Тело ответа зависит еще от параметров запроса, пользователя и формата
+        key = repr((request.get_full_path(), request.user.pk, request.accepted_media_type, *parts))
+        return '"%s"' % hashlib.md5(key.encode(), usedforsecurity=False).hexdigest()
+
+    def conditional_response(self, request, etag, last_modified=None):
+        response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+        if response is not None:
+            response['ETag'] = etag
+        return response
+
+    def with_validators(self, response, etag, last_modified=None):
+        if response.status_code == status.HTTP_200_OK:
+            response['ETag'] = etag
+            if last_modified is not None:
+                response['Last-Modified'] = http_date(last_modified)
+        return response
+
+    def list(self, request, *args, **kwargs):
+        queryset = self.filter_queryset(self.get_queryset())
+        if hasattr(self.paginator, 'validator_state'):
+            state = self.paginator.validator_state(
+                queryset, request, self, self.validator_field, self.validator_time_fields
+            )
+        else:
+            state = queryset.aggregate(
+                last_modified=Max(self.validator_field), count=Count('pk'),
+                **{f'max_{field}': Max(field) for field in self.validator_time_fields},
+            )
+        etag = self.make_etag(request, state)
+        return self.conditional_response(request, etag) or self.with_validators(
+            super().list(request, *args, **kwargs), etag
+        )
+
+    def retrieve(self, request, *args, **kwargs):
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        self.validator_row = self.filter_queryset(self.get_queryset()).filter(
+            **{self.lookup_field: kwargs[lookup_url_kwarg]}
+        ).values(self.validator_field, *self.validator_time_fields, *self.validator_annotations).first()
+        if self.validator_row is None:
+            return super().retrieve(request, *args, **kwargs)
+        last_modified = max(
+            moment for field in (self.validator_field, *self.validator_time_fields)
+            if (moment := self.validator_row[field]) is not None
+        )
+        etag = self.make_etag(request, last_modified)
+        # HTTP-даты с точностью до секунды, поэтому и сравниваем по целым секундам
+        timestamp = int(last_modified.timestamp())
+        return self.conditional_response(request, etag, timestamp) or self.with_validators(
+            super().retrieve(request, *args, **kwargs), etag, timestamp
+        )
+
+class CachedDetailMixin:
+    """
+    retrieve берет объект из Manager.get_detail (cached_query по версии модели), а не
+    запросом get_object: после валидатора ConditionalGetMixin detail-ответ не идет в базу.
+    Данные конкретного пользователя (validator_annotations) приходят из строки валидатора.
+    Сериализованный ответ тоже кэшируется - по ключу из строки валидатора (payload_key),
+    так что повторный запрос не сериализует объект. С параметрами фильтров объект ищется
+    как обычно - по отфильтрованному queryset. Ставится после ConditionalGetMixin.
+    """
+    payload_timeout = 300
+
+    def uses_cached_detail(self):
+        return (
+            self.action == 'retrieve' and self.validator_row is not None
+            and not set(self.request.query_params) - {'format'}
+        )
+
+    def retrieve(self, request, *args, **kwargs):
+        if not self.uses_cached_detail():
+            return super().retrieve(request, *args, **kwargs)
+        instance = self.get_object()
+        key = payload_key(self.queryset.model, instance.pk, *self.validator_row.values())
+        data = cache.get(key)
+        if data is None:
+            data = self.get_serializer(instance).data
+            cache.add(key, data, self.payload_timeout)
+        return Response(data)
+
+    def get_object(self):
+        if not self.uses_cached_detail():
+            return super().get_object()
+        try:
+            pk = int(self.kwargs[self.lookup_url_kwarg or self.lookup_field])
+        except ValueError:
+            raise Http404
+        obj = self.queryset.model.objects.get_detail(pk)
+        if obj is None:
+            raise Http404
+        for name in self.validator_annotations:
+            setattr(obj, name, self.validator_row[name])
+        self.check_object_permissions(self.request, obj)
+        return obj
+
+def favorites_filter(queryset, request):
+    """?favorites_only=1 - только избранное: тот же EXISTS, что и в аннотации is_favorited"""
+    if request.query_params.get('favorites_only'):
+        queryset = queryset.filter(is_favorited=True)
+    return queryset
+
+class StatsMixin:
+    """
+    GET {id}/stats/ - статистика объекта из материализованного представления (core/stats.py):
+    один поиск по его уникальному индексу. Отстает от данных не больше чем на STATS_MAX_AGE
+    секунд плюс период запуска refresh_stats; момент пересчета - в refreshed_at.
+    """
+    stats_model = None
+    stats_serializer_class = None
+
+    @action(detail=True, methods=['get'])
+    def stats(self, request, pk=None):
+        try:
+            stats = get_object_or_404(self.stats_model.objects.all(), pk=pk)
+        except Http404:
+            # Объект создан после последнего пересчета (если его нет совсем - get_object отдаст 404)
+            stats = self.stats_model(pk=self.get_object().pk)
+            for field in self.stats_model._meta.concrete_fields:
+                if isinstance(field, IntegerField):
+                    setattr(stats, field.attname, 0)
+        return Response(self.stats_serializer_class(stats).data)
+
+class TopicViewSet(StatsMixin, ConditionalGetMixin, CachedDetailMixin, viewsets.ModelViewSet):
     queryset = Topic.objects.all()
     serializer_class = TopicSerializer
     filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
     filterset_fields = ['name']
     search_fields = ['name', 'description']
     ordering_fields = ['name', 'created_at']
+    cursor_ordering_fields = ('created_at', 'name')
     http_method_names = ['get', 'post', 'put', 'delete']
+    stats_model = TopicStats
+    stats_serializer_class = TopicStatsSerializer
 
     def get_queryset(self):
         queryset = Topic.objects.all()
@@ -34,26 +199,135 @@ class TopicViewSet(viewsets.ModelViewSet):
             queryset = Topic.objects.get_active_topics()
         return queryset
 
-class ProjectViewSet(viewsets.ModelViewSet):
+class ProjectViewSet(StatsMixin, ConditionalGetMixin, CachedDetailMixin, viewsets.ModelViewSet):
     queryset = Project.objects.all()
     serializer_class = ProjectSerializer
     filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
     filterset_fields = ['topic', 'name']
     search_fields = ['name', 'description']
     ordering_fields = ['name', 'created_at']
+    cursor_ordering_fields = ('created_at', 'name')
     http_method_names = ['get', 'post', 'put', 'delete']
+    stats_model = ProjectStats
+    stats_serializer_class = ProjectStatsSerializer
+    validator_annotations = ('is_favorited',)
 
     def get_queryset(self):
-        return Project.objects.get_projects_with_tasks_count()
+        queryset = Project.objects.get_projects_with_tasks_count().select_related('settings')
+        return favorites_filter(queryset.with_favorites(self.request.user), self.request)
+
+class BulkActionsMixin:
+    """
+    Массовые операции:
+    POST bulk/ - создание списка объектов (валидация за один проход, запись одним bulk_create),
+    POST bulk-status/ - перевод объектов {"ids": [...], "status": "..."} в статус одним UPDATE.
+    """
+    bulk_create_function = None
+    bulk_status_function = None
+
+    @action(detail=False, methods=['post'], url_path='bulk')
+    def bulk_create(self, request):
+        if not isinstance(request.data, list) or not 0 < len(request.data) <= settings.BULK_MAX_ITEMS:
+            return Response(
+                {'error': f'Ожидается непустой список не длиннее {settings.BULK_MAX_ITEMS} элементов.'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        serializer = self.get_serializer(data=request.data, many=True)
+        serializer.is_valid(raise_exception=True)
+        created = self.bulk_create_function(serializer.validated_data)
+        return Response({'created': len(created), 'ids': [obj.pk for obj in created]}, status=status.HTTP_201_CREATED)
+
+    @action(detail=False, methods=['post'], url_path='bulk-status')
+    def bulk_status(self, request):
+        data = request.data if isinstance(request.data, dict) else {}
+        ids = data.get('ids')
+        new_status = data.get('status')
+        if new_status not in dict(Task.STATUS_CHOICES):
+            return Response({'error': 'Недопустимый статус.'}, status=status.HTTP_400_BAD_REQUEST)
+        if not isinstance(ids, list) or not 0 < len(ids) <= settings.BULK_MAX_ITEMS:
+            return Response(
+                {'error': f'ids: ожидается непустой список не длиннее {settings.BULK_MAX_ITEMS} элементов.'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        try:
+            ids = [int(pk) for pk in ids]
+        except (TypeError, ValueError):
+            return Response({'error': 'ids должны быть числами.'}, status=status.HTTP_400_BAD_REQUEST)
+
+        previous = self.bulk_status_function(ids, new_status)
+        results = []
+        for pk in ids:
+            if pk not in previous:
+                results.append({'id': pk, 'result': 'not_found'})
+            else:
+                results.append({
+                    'id': pk,
+                    'result': 'unchanged' if previous[pk] == new_status else 'updated',
+                    'previous_status': previous[pk],
+                })
+        return Response({'status': new_status, 'results': results})
 
-class TaskViewSet(viewsets.ModelViewSet):
+class ExportMixin:
+    """
+    GET export/?format=ndjson|csv - выгрузка всех строк с теми же фильтрами, поиском и
+    сортировкой, что и у списка, но без пагинации. Строки читаются values() через
+    серверный курсор (iterator) и сразу отдаются клиенту, поэтому память не растет
+    с размером выгрузки, а связанные объекты не догружаются запросом на строку.
+    """
+    export_fields = ()
+
+    @action(detail=False, methods=['get'], url_path='export', renderer_classes=[NDJSONRenderer, CSVRenderer])
+    def export(self, request):
+        queryset = self.filter_queryset(self.get_queryset())
+        # prefetch_related несовместим с values(), а select_related для плоских колонок не нужен
+        queryset = queryset.prefetch_related(None).select_related(None)
+        if not queryset.query.order_by:
+            queryset = queryset.order_by('id')
+        rows = queryset.values(*self.export_fields).iterator(chunk_size=settings.EXPORT_CHUNK_SIZE)
+        renderer = request.accepted_renderer
+        response = StreamingHttpResponse(
+            renderer.render_rows(rows, self.export_fields, settings.EXPORT_CHUNK_SIZE),
+            content_type=f'{renderer.media_type}; charset={renderer.charset}',
+        )
+        response['Content-Disposition'] = f'attachment; filename="{self.basename}s.{renderer.format}"'
+        return response
+
+class CommentThreadMixin:
+    """
+    GET {id}/comments/ - все комментарии задачи или подзадачи keyset-страницами по
+    (created_at, id) с индексом (task|subtask, created_at, id); по умолчанию старые первыми,
+    ?ordering=-created_at - новые первыми. Сама задача несет только счетчик и последние комментарии.
+    """
+    comment_field = None
+
+    @action(detail=True, methods=['get'], url_path='comments')
+    def comments(self, request, pk=None):
+        parent = get_object_or_404(self.queryset.model.objects.only('pk'), pk=pk)
+        self.check_object_permissions(request, parent)
+        queryset = Comment.objects.filter(**{self.comment_field: parent}).select_related('author')
+        paginator = CommentThreadPagination()
+        page = paginator.paginate_queryset(queryset, request, self)
+        serializer = CommentSerializer(page, many=True, context=self.get_serializer_context())
+        return paginator.get_paginated_response(serializer.data)
+
+class TaskViewSet(CommentThreadMixin, ConditionalGetMixin, ExportMixin, BulkActionsMixin, viewsets.ModelViewSet):
     queryset = Task.objects.all()
     serializer_class = TaskSerializer
     filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
     filterset_fields = ['project', 'status', 'assigned_to']
     search_fields = ['title', 'description']
     ordering_fields = ['title', 'status', 'created_at']
+    # status не годится для курсора: значений пять, и в пределах каждого нужен индекс с id
+    cursor_ordering_fields = ('created_at', 'title')
+    validator_time_fields = ('overdue_at',)
     http_method_names = ['get', 'post', 'put', 'patch', 'delete']
+    bulk_create_function = staticmethod(bulk_create_tasks)
+    bulk_status_function = staticmethod(bulk_update_task_status)
+    comment_field = 'task'
+    export_fields = (
+        'id', 'title', 'description', 'project', 'status', 'assigned_to',
+        'subtasks_count', 'comments_count', 'created_at', 'updated_at',
+    )
 
     def get_queryset(self):
         queryset = Task.objects.all()
@@ -62,60 +336,87 @@ class TaskViewSet(viewsets.ModelViewSet):
             queryset = Task.objects.get_tasks_by_status(status)
         if self.request.query_params.get('overdue'):
             queryset = Task.objects.get_overdue_tasks()
-        return queryset
+        return favorites_filter(
+            queryset.with_related_data().with_overdue_at().with_favorites(self.request.user), self.request
+        )
 
-class SubtaskViewSet(viewsets.ModelViewSet):
+class SubtaskViewSet(CommentThreadMixin, ConditionalGetMixin, BulkActionsMixin, viewsets.ModelViewSet):
     queryset = Subtask.objects.all()
     serializer_class = SubtaskSerializer
     filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
     filterset_fields = ['task', 'status']
     search_fields = ['title', 'description']
     ordering_fields = ['title', 'status', 'created_at']
+    cursor_ordering_fields = ('created_at',)
     http_method_names = ['get', 'post', 'put', 'patch', 'delete']
+    bulk_create_function = staticmethod(bulk_create_subtasks)
+    bulk_status_function = staticmethod(bulk_update_subtask_status)
+    comment_field = 'subtask'
 
-class CommentViewSet(viewsets.ModelViewSet):
-    queryset = Comment.objects.all()
+class CommentViewSet(ConditionalGetMixin, ExportMixin, viewsets.ModelViewSet):
+    queryset = Comment.objects.select_related('author')
     serializer_class = CommentSerializer
-    filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
+    filter_backends = [DjangoFilterBackend, filters.SearchFilter, FullTextSearchFilter, filters.OrderingFilter]
     filterset_fields = ['task', 'subtask', 'author']
     search_fields = ['content']
     ordering_fields = ['created_at']
+    cursor_ordering_fields = ('created_at',)
+    export_fields = ('id', 'content', 'task', 'subtask', 'author', 'created_at', 'updated_at')
     http_method_names = ['get', 'post', 'put', 'delete']
 
-class DocumentViewSet(viewsets.ModelViewSet):
-    queryset = Document.objects.all()
+class DocumentViewSet(ConditionalGetMixin, ExportMixin, viewsets.ModelViewSet):
+    queryset = Document.objects.prefetch_related(
+        Prefetch('versions', queryset=DocumentVersion.objects.select_related('created_by', 'blob'))
+    )
     serializer_class = DocumentSerializer
-    filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
+    filter_backends = [DjangoFilterBackend, filters.SearchFilter, FullTextSearchFilter, filters.OrderingFilter]
     filterset_fields = ['project', 'task']
     search_fields = ['title', 'content']
     ordering_fields = ['title', 'created_at']
+    cursor_ordering_fields = ('created_at',)
+    export_fields = ('id', 'title', 'content', 'project', 'task', 'created_at', 'updated_at')
     http_method_names = ['get', 'post', 'put', 'delete']
 
-class DocumentVersionViewSet(viewsets.ReadOnlyModelViewSet):
-    queryset = DocumentVersion.objects.all()
+    # Каждое сохранение через API - версия документа; повтор без правок версию не создает
+    def perform_create(self, serializer):
+        serializer.save().add_version(serializer.instance.content, self.request.user)
+
+    def perform_update(self, serializer):
+        serializer.save().add_version(serializer.instance.content, self.request.user)
+
+class DocumentVersionViewSet(ConditionalGetMixin, viewsets.ReadOnlyModelViewSet):
+    queryset = DocumentVersion.objects.select_related('created_by', 'blob')
     serializer_class = DocumentVersionSerializer
-    filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
+    filter_backends = [DjangoFilterBackend, ContentSearchFilter, FullTextSearchFilter, filters.OrderingFilter]
     filterset_fields = ['document', 'created_by']
-    search_fields = ['content']
+    # Текст снимков; текст дельт - через search_vector (ContentSearchFilter)
+    search_fields = ['stored_content', 'blob__content']
     ordering_fields = ['version_number', 'created_at']
+    # version_number - внутри документа (?document=): индекс (document, version_number) уникален
+    cursor_ordering_fields = ('created_at', 'version_number')
     http_method_names = ['get']
+    validator_field = 'created_at'
 
-class TemplateViewSet(viewsets.ModelViewSet):
+class TemplateViewSet(ConditionalGetMixin, viewsets.ModelViewSet):
     queryset = Template.objects.all()
     serializer_class = TemplateSerializer
-    filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
+    filter_backends = [DjangoFilterBackend, filters.SearchFilter, FullTextSearchFilter, filters.OrderingFilter]
     filterset_fields = ['topic']
     search_fields = ['name', 'content']
     ordering_fields = ['name', 'created_at']
+    # name - внутри темы (?topic=), по индексу (topic, name)
+    cursor_ordering_fields = ('created_at', 'name')
     http_method_names = ['get', 'post', 'put', 'delete']
 
-class FavoriteViewSet(viewsets.ModelViewSet):
+class FavoriteViewSet(ConditionalGetMixin, viewsets.ModelViewSet):
     serializer_class = FavoriteSerializer
     permission_classes = [permissions.IsAuthenticated]
     filter_backends = [DjangoFilterBackend, filters.OrderingFilter]
     filterset_fields = ['project', 'task']
     ordering_fields = ['created_at']
+    cursor_ordering_fields = ('created_at',)
     http_method_names = ['get', 'post', 'delete']
+    validator_field = 'created_at'
 
     def get_queryset(self):
         return Favorite.objects.filter(user=self.request.user)
@@ -131,15 +432,72 @@ class PredictDocumentClassView(APIView):
         text = request.data.get('text')
         if not text:
             return Response({'error': 'Поле text обязательно.'}, status=status.HTTP_400_BAD_REQUEST)
-        # Загружаем последнюю модель и векторизатор из MLflow
-        model_uri = "models:/unidoc-document-tfidf-classification/Production"
+        # Модель Production уже загружена в процесс и обновляется в фоне
         try:
-            model = mlflow.pyfunc.load_model(model_uri)
+            loaded = model_holder.get()
         except Exception as e:
             return Response({'error': f'Ошибка загрузки модели: {str(e)}'}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
         # Предсказываем класс
         try:
-            prediction = model.predict([text])[0]
+            if settings.ML_MICRO_BATCHING:
+                prediction, version = micro_batcher.predict(text)
+            else:
+                prediction, version = loaded.model.predict([text])[0], loaded.version
+        except Exception as e:
+            return Response({'error': f'Ошибка предсказания: {str(e)}'}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+        return Response({'prediction': int(prediction), 'model_version': version})
+
+class PredictDocumentClassBatchView(APIView):
+    """
+    API endpoint для пакетного предсказания: список текстов (texts) или id документов (document_ids).
+    """
+    def post(self, request):
+        texts = request.data.get('texts')
+        document_ids = request.data.get('document_ids')
+        if bool(texts) == bool(document_ids):
+            return Response({'error': 'Нужно передать либо texts, либо document_ids.'}, status=status.HTTP_400_BAD_REQUEST)
+        items = texts or document_ids
+        if not isinstance(items, list) or len(items) > settings.ML_BATCH_MAX_ITEMS:
+            return Response(
+                {'error': f'Ожидается список не длиннее {settings.ML_BATCH_MAX_ITEMS} элементов.'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        not_found = []
+        if document_ids:
+            try:
+                document_ids = [int(document_id) for document_id in document_ids]
+            except (TypeError, ValueError):
+                return Response({'error': 'document_ids должны быть числами.'}, status=status.HTTP_400_BAD_REQUEST)
+            contents = dict(Document.objects.filter(id__in=document_ids).values_list('id', 'content'))
+            not_found = [document_id for document_id in document_ids if document_id not in contents]
+            document_ids = [document_id for document_id in document_ids if document_id in contents]
+            texts = [contents[document_id] for document_id in document_ids]
+        elif not all(isinstance(text, str) and text for text in texts):
+            return Response({'error': 'texts должны быть непустыми строками.'}, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            predictions, version = predict_many(texts, model_holder)
         except Exception as e:
             return Response({'error': f'Ошибка предсказания: {str(e)}'}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
-        return Response({'prediction': int(prediction)})
+        predictions = [int(prediction) for prediction in predictions]
+        if document_ids:
+            predictions = [
+                {'document_id': document_id, 'prediction': prediction}
+                for document_id, prediction in zip(document_ids, predictions)
+            ]
+        return Response({'predictions': predictions, 'not_found': not_found, 'model_version': version})
+
+class PredictorStatusView(APIView):
+    """
+    Состояние модели классификации в текущем процессе: загруженная версия и опрос реестра.
+    """
+    def get(self, request):
+        return Response(model_holder.status())
+
+class CacheStatsView(APIView):
+    """
+    Попадания и промахи кэша запросов по каждой закэшированной функции.
+    """
+    def get(self, request):
+        return Response(cache_stats())
@@ -3,7 +3,8 @@ set -e
 
 echo "Applying database migrations..."
 python manage.py migrate
-python manage.py shell -c "from core.management.commands.generate_test_data import Command; Command().handle()"
+# Идемпотентно: уже загруженные темы пропускаются
+python manage.py generate_test_data --scale "${SEED_SCALE:-1}"
 
 
 echo "Starting server..."
@@ -1,4 +1,16 @@
+import argparse
+import copy
+import hashlib
+import json
 import os
+import shutil
+import tempfile
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from functools import cache
+from itertools import islice
+
 import mlflow
 
 mlflow.set_tracking_uri(os.getenv("MLFLOW_TRACKING_URI", "http://mlflow:5000"))
@@ -9,12 +21,56 @@ django.setup()
 
 import mlflow
 import mlflow.sklearn
+import joblib
+from django.conf import settings
+from django.db.models import Count, F, Max, Q, Sum
+from mlflow.tracking import MlflowClient
+from scipy import sparse
 from sklearn.ensemble import RandomForestClassifier
-from sklearn.model_selection import train_test_split
+from sklearn.model_selection import ParameterGrid, train_test_split
 from sklearn.metrics import accuracy_score, classification_report
-from sklearn.feature_extraction.text import TfidfVectorizer
+from sklearn.feature_extraction.text import HashingVectorizer, TfidfVectorizer
+from sklearn.linear_model import SGDClassifier
+from sklearn.pipeline import make_pipeline
 import numpy as np
-from core.models import DocumentVersion
+from core.models import Document, DocumentVersion, Project
+
+# Строк за одно чтение серверного курсора и за один шаг partial_fit
+LOAD_CHUNK_SIZE = int(os.getenv("TRAIN_CHUNK_SIZE", "10000"))
+# Доля версий в тестовой выборке потокового режима, в десятых (выборка по id, детерминированная)
+TEST_BUCKETS = 3
+# Матрицы признаков, ключ - отпечаток данных и параметры векторизатора
+CACHE_DIR = os.getenv("TRAIN_CACHE_DIR", os.path.join(tempfile.gettempdir(), "unidoc-train-cache"))
+
+DEFAULT_VECTORIZER_PARAMS = {"max_features": 300}
+DEFAULT_MODEL_PARAMS = {"n_estimators": 100}
+# Сетка режима --search: каждая матрица признаков считается один раз на все модели
+SEARCH_VECTORIZER_GRID = {"max_features": [300, 1000, 5000], "ngram_range": [(1, 1), (1, 2)]}
+SEARCH_MODEL_GRID = {"n_estimators": [100, 300], "max_depth": [None, 30]}
+
+
+def current_watermark():
+    """(created_at, id) последней версии - граница данных, на которых обучается модель"""
+    return DocumentVersion.objects.order_by('-created_at', '-id').values_list('created_at', 'id').first()
+
+def versions_between(after=None, until=None):
+    """Версии с водяным знаком больше after и не больше until, по порядку (created_at, id)"""
+    queryset = DocumentVersion.objects.order_by('created_at', 'id')
+    if after is not None:
+        queryset = queryset.filter(Q(created_at__gt=after[0]) | Q(created_at=after[0], id__gt=after[1]))
+    if until is not None:
+        queryset = queryset.filter(Q(created_at__lt=until[0]) | Q(created_at=until[0], id__lte=until[1]))
+    return queryset
+
+def iter_training_rows(queryset=None, chunk_size=LOAD_CHUNK_SIZE):
+    """
+    Потоково отдает пары (текст версии, метка) без загрузки всех версий в память.
+    Метка — id проекта документа (или 0, если нет проекта).
+    """
+    if queryset is None:
+        queryset = versions_between()
+    for content, project_id in DocumentVersion.iter_contents(queryset, 'document__project_id', chunk_size=chunk_size):
+        yield content, project_id or 0
 
 
 def load_data():
@@ -23,51 +79,366 @@ def load_data():
     Признак: TF-IDF по тексту версии.
     Метка: id проекта документа (или 0, если нет проекта).
     """
-    versions = DocumentVersion.objects.select_related('document').all()
-    if not versions.exists():
-        print("В базе нет версий документов. Сгенерируйте тестовые данные!")
-        return None, None
     texts = []
     labels = []
-    for v in versions:
-        texts.append(v.content)
-        # Метка — id проекта, если есть, иначе 0
-        labels.append(v.document.project.id if v.document and v.document.project else 0)
+    for content, label in iter_training_rows():
+        texts.append(content)
+        labels.append(label)
+    if not texts:
+        print("В базе нет версий документов. Сгенерируйте тестовые данные!")
+        return None, None
     return texts, np.array(labels)
 
-def train_model(X_texts, y):
+def data_snapshot():
     """
-    Обработка текста через TF-IDF, обучение модели классификации.
+    Отпечаток обучающих данных: меняется при добавлении и удалении версий и при изменении
+    документов (новая версия сдвигает updated_at документа, перенос в другой проект - тоже).
     """
-    vectorizer = TfidfVectorizer(max_features=300)
-    X = vectorizer.fit_transform(X_texts)
+    versions = DocumentVersion.objects.aggregate(count=Count('id'), max_id=Max('id'), id_sum=Sum('id'))
+    documents = Document.objects.aggregate(updated_at=Max('updated_at'))
+    return [versions['count'], versions['max_id'], versions['id_sum'], documents['updated_at']]
+
+def _digest(value):
+    return hashlib.md5(json.dumps(value, sort_keys=True, default=str).encode()).hexdigest()
+
+def features_path(cache_dir, snapshot, vectorizer_params):
+    """Имя файлов кэша - отпечаток снимка и параметры векторизатора: по префиксу видно, чей это снимок"""
+    return os.path.join(cache_dir, f'{_digest(snapshot)}-{_digest(vectorizer_params)}')
+
+def evict_stale_features(cache_dir, snapshot):
+    """
+    Удаляет из cache_dir признаки других снимков: после изменения данных они уже не
+    понадобятся, а без очистки каждый новый снимок добавлял бы по матрице на векторизатор
+    """
+    prefix = f'{_digest(snapshot)}-'
+    for name in os.listdir(cache_dir):
+        if not name.startswith(prefix):
+            try:
+                os.remove(os.path.join(cache_dir, name))
+            except FileNotFoundError:
+                pass
+
+def ensure_features(vectorizer_params, snapshot, cache_dir, load_texts):
+    """
+    Возвращает путь к закэшированным признакам (path.npz - разреженная матрица,
+    path.labels.npy - метки, path.vectorizer.joblib - обученный векторизатор).
+    Если их нет, векторизует тексты из load_texts(), сохраняет и удаляет признаки
+    прежних снимков (evict_stale_features).
+    """
+    path = features_path(cache_dir, snapshot, vectorizer_params)
+    if os.path.exists(path + '.npz'):
+        return path
+    texts, y = load_texts()
+    vectorizer = TfidfVectorizer(**vectorizer_params)
+    X = vectorizer.fit_transform(texts)
+    # stop_words_ хранит все отброшенные слова и нужен только для интроспекции
+    vectorizer.stop_words_ = None
+    os.makedirs(cache_dir, exist_ok=True)
+    # Матрица записывается последней и через rename: ее наличие означает, что кэш полный
+    np.save(path + '.labels.npy', y)
+    joblib.dump(vectorizer, path + '.vectorizer.joblib')
+    sparse.save_npz(path + '.tmp.npz', X, compressed=False)
+    os.replace(path + '.tmp.npz', path + '.npz')
+    evict_stale_features(cache_dir, snapshot)
+    return path
+
+def evaluate_candidate(path, model_params, output_dir, n_jobs=1):
+    """
+    Обучает RandomForest на закэшированных признаках и оценивает на отложенных 30%.
+    Модель сохраняется в output_dir (между процессами передается только путь).
+    """
+    X = sparse.load_npz(path + '.npz')
+    y = np.load(path + '.labels.npy')
     X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.3, random_state=42)
-    model = RandomForestClassifier(n_estimators=100, random_state=42)
+    model = RandomForestClassifier(random_state=42, n_jobs=n_jobs, **model_params)
     model.fit(X_train, y_train)
     y_pred = model.predict(X_test)
-    accuracy = accuracy_score(y_test, y_pred)
-    report = classification_report(y_test, y_pred)
-    return model, vectorizer, accuracy, report
+    model_path = os.path.join(output_dir, f'{uuid.uuid4().hex}.joblib')
+    joblib.dump(model, model_path)
+    return accuracy_score(y_test, y_pred), classification_report(y_test, y_pred, zero_division=0), model_path
+
+def search(vectorizer_grid, model_grid, output_dir, n_jobs=-1, cache_dir=CACHE_DIR):
+    """
+    Перебирает все сочетания параметров векторизатора и модели в n_jobs процессах
+    (-1 - по числу ядер). Признаки для каждого векторизатора берутся из кэша или считаются
+    один раз; тексты читаются из базы, только если чего-то в кэше нет.
+    Возвращает список кандидатов с точностью, отчетом и путем к модели.
+    """
+    snapshot = data_snapshot()
+    if not snapshot[0]:
+        return []
+    load_texts = cache(load_data)
+    candidates = [
+        {'vectorizer_params': vectorizer_params, 'model_params': model_params,
+         'features_path': ensure_features(vectorizer_params, snapshot, cache_dir, load_texts)}
+        for vectorizer_params in ParameterGrid(vectorizer_grid)
+        for model_params in ParameterGrid(model_grid)
+    ]
+    n_jobs = os.cpu_count() if n_jobs == -1 else n_jobs
+    if len(candidates) == 1:
+        # Единственный кандидат параллелится внутри леса
+        results = [evaluate_candidate(candidates[0]['features_path'], candidates[0]['model_params'], output_dir, n_jobs)]
+    else:
+        with ProcessPoolExecutor(max_workers=min(n_jobs, len(candidates))) as pool:
+            results = list(pool.map(
+                evaluate_candidate,
+                [candidate['features_path'] for candidate in candidates],
+                [candidate['model_params'] for candidate in candidates],
+                [output_dir] * len(candidates),
+            ))
+    for candidate, (accuracy, report, model_path) in zip(candidates, results):
+        candidate.update(accuracy=accuracy, report=report, model_path=model_path)
+    return candidates
+
+def candidate_params(candidate):
+    params = {f'vectorizer__{name}': value for name, value in candidate['vectorizer_params'].items()}
+    params.update({f'model__{name}': value for name, value in candidate['model_params'].items()})
+    return params
+
+def batches(rows, size):
+    """Режет поток строк на списки по size"""
+    batch = list(islice(rows, size))
+    while batch:
+        yield batch
+        batch = list(islice(rows, size))
+
+def split_versions(test, queryset=None):
+    """Детерминированное деление версий на обучающую и тестовую выборки по остатку id"""
+    if queryset is None:
+        queryset = versions_between()
+    queryset = queryset.annotate(split_bucket=F('id') % 10)
+    if test:
+        return queryset.filter(split_bucket__lt=TEST_BUCKETS)
+    return queryset.filter(split_bucket__gte=TEST_BUCKETS)
+
+def evaluate_pipeline(pipeline, queryset, batch_size=LOAD_CHUNK_SIZE):
+    """Точность и отчет пайплайна на версиях queryset (читаются пачками). (None, None) - если версий нет"""
+    y_test, y_pred = [], []
+    for batch in batches(iter_training_rows(queryset, batch_size), batch_size):
+        texts, labels = zip(*batch)
+        y_test.append(np.array(labels))
+        y_pred.append(pipeline.predict(texts))
+    if not y_test:
+        return None, None
+    y_test, y_pred = np.concatenate(y_test), np.concatenate(y_pred)
+    return accuracy_score(y_test, y_pred), classification_report(y_test, y_pred, zero_division=0)
+
+def train_model_streaming(batch_size=LOAD_CHUNK_SIZE, n_features=2 ** 18, epochs=1, until=None):
+    """
+    Обучение без загрузки корпуса в память: HashingVectorizer не требует словаря,
+    SGDClassifier дообучается пачками через partial_fit. Память - пачка текстов плюс веса
+    модели (классов x n_features) и не растет с числом версий. until - водяной знак,
+    после которого версии не берутся.
+    Возвращает пайплайн (векторизатор + модель), точность и отчет на тестовой выборке.
+    """
+    # partial_fit должен заранее знать все классы: это id проектов и 0 для документов без проекта
+    classes = np.array([0, *Project.objects.order_by('id').values_list('id', flat=True)])
+    vectorizer = HashingVectorizer(n_features=n_features, alternate_sign=False)
+    model = SGDClassifier(random_state=42)
+    versions = versions_between(until=until)
+    trained = False
+    for _ in range(epochs):
+        for batch in batches(iter_training_rows(split_versions(False, versions), batch_size), batch_size):
+            texts, labels = zip(*batch)
+            model.partial_fit(vectorizer.transform(texts), labels, classes=classes)
+            trained = True
+    if not trained:
+        return None, None, None
+    pipeline = make_pipeline(vectorizer, model)
+    accuracy, report = evaluate_pipeline(pipeline, split_versions(True, versions), batch_size)
+    return pipeline, accuracy, report or "Тестовая выборка пуста"
+
+def update_model_incremental(pipeline, after, until, batch_size=LOAD_CHUNK_SIZE):
+    """
+    Дообучает копию пайплайна (partial_fit) на обучающей части версий между водяными знаками.
+    Версии проектов, которых модель не знает (появились после полного обучения), пропускаются:
+    добавить класс в SGDClassifier можно только полным переобучением.
+    Возвращает (новый пайплайн, обучено строк, пропущено строк).
+    """
+    pipeline = copy.deepcopy(pipeline)
+    vectorizer, model = pipeline[0], pipeline[-1]
+    known = set(model.classes_)
+    trained = skipped = 0
+    rows = iter_training_rows(split_versions(False, versions_between(after, until)), batch_size)
+    for batch in batches(rows, batch_size):
+        batch_known = [(text, label) for text, label in batch if label in known]
+        skipped += len(batch) - len(batch_known)
+        if batch_known:
+            texts, labels = zip(*batch_known)
+            model.partial_fit(vectorizer.transform(texts), labels)
+            trained += len(batch_known)
+    return pipeline, trained, skipped
+
+def holdout_versions(size, until):
+    """Отложенная выборка для сравнения моделей: последние size версий тестовой части"""
+    queryset = versions_between(until=until).order_by('-created_at', '-id')
+    return split_versions(True, queryset)[:size]
+
+def log_watermark(watermark):
+    mlflow.set_tags({'watermark_created_at': watermark[0].isoformat(), 'watermark_id': watermark[1]})
+
+def read_watermark(run_id):
+    tags = MlflowClient().get_run(run_id).data.tags
+    if 'watermark_id' not in tags:
+        return None
+    return datetime.fromisoformat(tags['watermark_created_at']), int(tags['watermark_id'])
+
+def register_and_promote(model_info, model_name=None, stage=None):
+    """Регистрирует залогированную модель и переводит ее в стадию (по умолчанию - из настроек)"""
+    model_name = model_name or settings.ML_MODEL_NAME
+    version = mlflow.register_model(model_info.model_uri, model_name)
+    MlflowClient().transition_model_version_stage(
+        model_name, version.version, stage or settings.ML_MODEL_STAGE, archive_existing_versions=True
+    )
+    return version.version
+
+def retrain_incremental(batch_size=LOAD_CHUNK_SIZE, holdout_size=10000, tolerance=0.0, model_name=None, stage=None):
+    """
+    Дообучает текущую модель стадии Production на версиях, появившихся после ее водяного
+    знака, и продвигает новую модель, только если на отложенной выборке она не хуже текущей
+    больше чем на tolerance. Время зависит от числа новых версий и holdout_size, а не от
+    размера таблицы. Работает внутри активного run MLflow, возвращает словарь с итогами.
+    """
+    model_name = model_name or settings.ML_MODEL_NAME
+    stage = stage or settings.ML_MODEL_STAGE
+    versions = MlflowClient().get_latest_versions(model_name, stages=[stage])
+    if not versions:
+        raise LookupError(f'В реестре нет модели {model_name} в стадии {stage}, сначала: train.py --streaming --register')
+    production = versions[0]
+    after = read_watermark(production.run_id)
+    if after is None:
+        raise LookupError(f'У версии {production.version} нет водяного знака, сначала: train.py --streaming --register')
+    current = mlflow.sklearn.load_model(f'models:/{model_name}/{production.version}')
+    if not hasattr(current[-1], 'partial_fit'):
+        raise LookupError(f'Модель версии {production.version} не поддерживает partial_fit')
+
+    until = current_watermark()
+    mlflow.log_params({'mode': 'incremental', 'base_model_version': production.version, 'batch_size': batch_size})
+    updated, trained, skipped = update_model_incremental(current, after, until, batch_size)
+    result = {'base_version': production.version, 'trained': trained, 'skipped': skipped, 'promoted': False, 'version': None}
+    mlflow.log_metrics({'trained_rows': trained, 'skipped_rows': skipped})
+    if not trained:
+        mlflow.set_tag('promoted', 'false')
+        return result
+
+    holdout = holdout_versions(holdout_size, until)
+    result['baseline_accuracy'], _ = evaluate_pipeline(current, holdout, batch_size)
+    result['accuracy'], result['report'] = evaluate_pipeline(updated, holdout, batch_size)
+    mlflow.log_metrics({'baseline_accuracy': result['baseline_accuracy'], 'accuracy': result['accuracy']})
+    log_watermark(until)
+    model_info = mlflow.sklearn.log_model(updated, "model")
+    if result['accuracy'] >= result['baseline_accuracy'] - tolerance:
+        result['version'] = register_and_promote(model_info, model_name, stage)
+        result['promoted'] = True
+    mlflow.set_tag('promoted', str(result['promoted']).lower())
+    return result
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Обучение классификатора документов")
+    parser.add_argument(
+        "--streaming", action="store_true",
+        help="HashingVectorizer + SGDClassifier.partial_fit: версии читаются пачками, корпус не держится в памяти"
+    )
+    parser.add_argument("--batch-size", type=int, default=LOAD_CHUNK_SIZE)
+    parser.add_argument("--n-features", type=int, default=2 ** 18, help="Размерность HashingVectorizer")
+    parser.add_argument("--epochs", type=int, default=1, help="Проходов по обучающей выборке")
+    parser.add_argument(
+        "--search", action="store_true",
+        help="Перебор параметров TF-IDF и RandomForest в n_jobs процессах, все кандидаты логируются в MLflow"
+    )
+    parser.add_argument("--n-jobs", type=int, default=-1, help="Процессов для --search (-1 - все ядра)")
+    parser.add_argument("--cache-dir", default=CACHE_DIR, help="Кэш матриц признаков (TRAIN_CACHE_DIR)")
+    parser.add_argument("--no-cache", action="store_true", help="Векторизовать заново, не трогая кэш")
+    parser.add_argument("--register", action="store_true", help="Для --streaming: зарегистрировать модель и перевести в Production")
+    parser.add_argument(
+        "--incremental", action="store_true",
+        help="Дообучить модель Production на версиях новее ее водяного знака и продвинуть, если она не хуже"
+    )
+    parser.add_argument("--holdout-size", type=int, default=10000, help="Для --incremental: версий в отложенной выборке")
+    parser.add_argument("--tolerance", type=float, default=0.0, help="Для --incremental: допустимое падение точности")
+    args = parser.parse_args()
+
     # Настройка MLflow
     mlflow.set_tracking_uri("http://mlflow:5000")
     mlflow.set_experiment("unidoc-document-tfidf-classification")
 
-    # Загрузка данных
-    X_texts, y = load_data()
-    if X_texts is None or y is None:
-        print("Нет данных для обучения. Завершение работы.")
-        exit(1)
-
-    # Тренировка модели и логирование в MLflow
-    with mlflow.start_run():
-        model, vectorizer, accuracy, report = train_model(X_texts, y)
-        mlflow.log_param("n_estimators", 100)
-        mlflow.log_param("vectorizer", "tfidf")
-        mlflow.log_metric("accuracy", accuracy)
-        mlflow.sklearn.log_model(model, "model")
-        mlflow.sklearn.log_model(vectorizer, "vectorizer")
-        print(f"Точность модели: {accuracy:.3f}")
-        print("Classification report:\n", report)
-        print("Эксперимент успешно залогирован в MLflow!") 
\ No newline at end of file
+    if args.incremental:
+        with mlflow.start_run():
+            try:
+                result = retrain_incremental(args.batch_size, args.holdout_size, args.tolerance)
+            except LookupError as e:
+                print(e)
+                exit(1)
+        print(f"Дообучено на {result['trained']} новых версиях (пропущено {result['skipped']}, новые проекты)")
+        if not result['trained']:
+            print("Новых версий нет, модель не изменилась.")
+        elif result['promoted']:
+            print(f"Точность {result['accuracy']:.3f} (была {result['baseline_accuracy']:.3f}), "
+                  f"версия {result['version']} переведена в {settings.ML_MODEL_STAGE}")
+        else:
+            print(f"Точность упала: {result['accuracy']:.3f} против {result['baseline_accuracy']:.3f}, модель не продвинута")
+        exit(0)
+
+    if args.streaming:
+        with mlflow.start_run():
+            watermark = current_watermark()
+            pipeline, accuracy, report = train_model_streaming(args.batch_size, args.n_features, args.epochs, watermark)
+            if pipeline is None:
+                print("Нет данных для обучения. Завершение работы.")
+                exit(1)
+            mlflow.log_param("vectorizer", "hashing")
+            mlflow.log_param("model", "sgd")
+            mlflow.log_param("n_features", args.n_features)
+            mlflow.log_param("epochs", args.epochs)
+            mlflow.log_param("batch_size", args.batch_size)
+            if accuracy is not None:
+                mlflow.log_metric("accuracy", accuracy)
+                print(f"Точность модели: {accuracy:.3f}")
+            # Векторизатор без состояния, поэтому логируется один пайплайн: он сразу принимает текст
+            model_info = mlflow.sklearn.log_model(pipeline, "model")
+            # Водяной знак - отсюда продолжит --incremental
+            log_watermark(watermark)
+            if args.register:
+                version = register_and_promote(model_info)
+                print(f"Версия {version} переведена в {settings.ML_MODEL_STAGE}")
+            print("Classification report:\n", report)
+            print("Эксперимент успешно залогирован в MLflow!")
+        exit(0)
+
+    # Обычный режим - один кандидат с параметрами по умолчанию, --search - вся сетка
+    if args.search:
+        vectorizer_grid, model_grid = SEARCH_VECTORIZER_GRID, SEARCH_MODEL_GRID
+    else:
+        vectorizer_grid = {name: [value] for name, value in DEFAULT_VECTORIZER_PARAMS.items()}
+        model_grid = {name: [value] for name, value in DEFAULT_MODEL_PARAMS.items()}
+    # Без кэша признаки все равно пишутся на диск (так их читают процессы), но во временную папку
+    cache_dir = tempfile.mkdtemp() if args.no_cache else args.cache_dir
+    output_dir = tempfile.mkdtemp()
+    try:
+        with mlflow.start_run():
+            candidates = search(vectorizer_grid, model_grid, output_dir, args.n_jobs, cache_dir)
+            if not candidates:
+                print("Нет данных для обучения. Завершение работы.")
+                exit(1)
+            if len(candidates) > 1:
+                for candidate in candidates:
+                    with mlflow.start_run(nested=True):
+                        mlflow.log_params(candidate_params(candidate))
+                        mlflow.log_metric("accuracy", candidate['accuracy'])
+                mlflow.log_param("candidates", len(candidates))
+            best = max(candidates, key=lambda candidate: candidate['accuracy'])
+            mlflow.log_params({name: value for name, value in best['model_params'].items()})
+            mlflow.log_param("vectorizer", "tfidf")
+            mlflow.log_params({f"vectorizer__{name}": value for name, value in best['vectorizer_params'].items()})
+            mlflow.log_metric("accuracy", best['accuracy'])
+            mlflow.sklearn.log_model(joblib.load(best['model_path']), "model")
+            mlflow.sklearn.log_model(joblib.load(best['features_path'] + '.vectorizer.joblib'), "vectorizer")
+            if len(candidates) > 1:
+                print(f"Лучший из {len(candidates)} кандидатов: {candidate_params(best)}")
+            print(f"Точность модели: {best['accuracy']:.3f}")
+            print("Classification report:\n", best['report'])
+            print("Эксперимент успешно залогирован в MLflow!")
+    finally:
+        shutil.rmtree(output_dir, ignore_errors=True)
+        if args.no_cache:
+            shutil.rmtree(cache_dir, ignore_errors=True)
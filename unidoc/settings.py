@@ -62,6 +62,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    "core.middleware.QueryMetricsMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "whitenoise.middleware.WhiteNoiseMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
@@ -73,6 +74,12 @@ MIDDLEWARE = [
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
 ]
 
+# WhiteNoise умеет только синхронный режим: под ASGI он заставил бы каждый запрос
+# проходить через поток. В ASGI-развертывании статику раздает nginx или WSGI-сервис
+STATIC_VIA_WHITENOISE = os.getenv('STATIC_VIA_WHITENOISE', 'True') == 'True'
+if not STATIC_VIA_WHITENOISE:
+    MIDDLEWARE.remove("whitenoise.middleware.WhiteNoiseMiddleware")
+
 ROOT_URLCONF = "unidoc.urls"
 
 TEMPLATES = [
@@ -92,6 +99,7 @@ TEMPLATES = [
 ]
 
 WSGI_APPLICATION = "unidoc.wsgi.application"
+ASGI_APPLICATION = "unidoc.asgi.application"
 
 
 # Database
@@ -176,7 +184,7 @@ REST_FRAMEWORK = {
         'rest_framework.filters.SearchFilter',
         'rest_framework.filters.OrderingFilter',
     ],
-    'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
+    'DEFAULT_PAGINATION_CLASS': 'core.pagination.KeysetPagination',
     'PAGE_SIZE': 10,
 }
 
@@ -203,13 +211,69 @@ CORS_ALLOWED_ORIGINS = [
 ]
 
 # Cache settings
+# Двухуровневый кэш (core/cache_backends.py): LRU в процессе перед общим кэшем. Локально
+# держатся версии моделей, результаты cached_query (в том числе объекты тем и проектов для
+# detail) и сериализованные detail-ответы (unidoc:payload:); инвалидации рассылаются остальным
+# процессам через брокер, пропущенная рассылка устаревает не дольше CACHE_LOCAL_TIMEOUT секунд.
+# В разработке общий кэш - LocMem и брокер внутри процесса, в продакшене - Redis (settings_prod.py)
+CACHE_LOCAL_OPTIONS = {
+    "SHARED": "shared",
+    "BROKER": "core.cache_backends.LocalBroker",
+    "MAX_ENTRIES": int(os.getenv('CACHE_LOCAL_MAX_ENTRIES', '1000')),
+    "LOCAL_TIMEOUT": float(os.getenv('CACHE_LOCAL_TIMEOUT', '5')),
+    # Счетчики попаданий (unidoc:stats:) меняются на каждом запросе, держать их локально незачем
+    "LOCAL_KEY_PREFIXES": ["unidoc:version:", "unidoc:core.", "unidoc:payload:"],
+}
 CACHES = {
     "default": {
+        "BACKEND": "core.cache_backends.TwoTierCache",
+        "LOCATION": "unidoc-local",
+        "OPTIONS": CACHE_LOCAL_OPTIONS,
+    },
+    "shared": {
         "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
         "LOCATION": "unique-snowflake",
-    }
+    },
 }
 
+# Максимальный размер списка в массовых операциях (tasks/bulk/, subtasks/bulk/, bulk-status/)
+BULK_MAX_ITEMS = int(os.getenv('BULK_MAX_ITEMS', '1000'))
+
+# Сколько последних комментариев встраивается в задачу (остальные - /api/tasks/{id}/comments/)
+TASK_LATEST_COMMENTS = int(os.getenv('TASK_LATEST_COMMENTS', '3'))
+
+# Потоковый экспорт (export/?format=ndjson|csv): строк на одно чтение из курсора и на один кусок ответа
+EXPORT_CHUNK_SIZE = int(os.getenv('EXPORT_CHUNK_SIZE', '2000'))
+
+# Статистика тем и проектов (материализованные представления, manage.py refresh_stats из cron):
+# пересчет после STATS_REFRESH_WRITES записей или когда статистика старше STATS_MAX_AGE секунд
+STATS_REFRESH_WRITES = int(os.getenv('STATS_REFRESH_WRITES', '1000'))
+STATS_MAX_AGE = int(os.getenv('STATS_MAX_AGE', '300'))
+
+# Метрики запросов: заголовок Server-Timing, лог медленных SQL и /metrics (Prometheus)
+SERVER_TIMING_HEADER = os.getenv('SERVER_TIMING_HEADER', 'True') == 'True'
+SLOW_QUERY_MS = int(os.getenv('SLOW_QUERY_MS', '200'))
+METRICS_ALLOWED_IPS = os.getenv('METRICS_ALLOWED_IPS', '127.0.0.1,::1').split(',')
+
+# Хранение версий документов: полный снимок раз в N версий, между ними - дельты.
+# 1 - хранить каждую версию целиком.
+DOCUMENT_VERSION_SNAPSHOT_INTERVAL = int(os.getenv('DOCUMENT_VERSION_SNAPSHOT_INTERVAL', '10'))
+
+# Модель классификации документов из MLflow Model Registry
+ML_MODEL_NAME = os.getenv('ML_MODEL_NAME', 'unidoc-document-tfidf-classification')
+ML_MODEL_STAGE = os.getenv('ML_MODEL_STAGE', 'Production')
+# Как часто (сек) проверять реестр на новую версию; 0 - не проверять
+ML_MODEL_POLL_INTERVAL = int(os.getenv('ML_MODEL_POLL_INTERVAL', '60'))
+# Загружать модель при старте процесса, а не на первом запросе
+ML_MODEL_PRELOAD = os.getenv('ML_MODEL_PRELOAD', 'False') == 'True'
+# Склейка одновременных одиночных предсказаний в один вызов predict (для gthread-воркеров)
+ML_MICRO_BATCHING = os.getenv('ML_MICRO_BATCHING', 'False') == 'True'
+ML_MICRO_BATCH_MAX_SIZE = int(os.getenv('ML_MICRO_BATCH_MAX_SIZE', '64'))
+ML_MICRO_BATCH_MAX_WAIT_MS = int(os.getenv('ML_MICRO_BATCH_MAX_WAIT_MS', '5'))
+# Пакетное предсказание: максимум текстов в запросе и размер порции для predict
+ML_BATCH_MAX_ITEMS = int(os.getenv('ML_BATCH_MAX_ITEMS', '1000'))
+ML_BATCH_CHUNK_SIZE = int(os.getenv('ML_BATCH_CHUNK_SIZE', '256'))
+
 # Security settings
 if not DEBUG:
     SECURE_SSL_REDIRECT = True
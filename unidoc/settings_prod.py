@@ -46,10 +46,21 @@ SECURE_HSTS_PRELOAD = True
 CORS_ALLOWED_ORIGINS = os.environ.get('CORS_ALLOWED_ORIGINS', '').split(',')
 
 # Cache settings
+# Локальный LRU каждого воркера перед Redis, инвалидации - через pub/sub того же Redis
+REDIS_URL = os.environ.get('REDIS_URL', 'redis://localhost:6379/1')
 CACHES = {
     'default': {
+        'BACKEND': 'core.cache_backends.TwoTierCache',
+        'LOCATION': 'unidoc-local',
+        'OPTIONS': {
+            **CACHE_LOCAL_OPTIONS,
+            'BROKER': 'core.cache_backends.RedisBroker',
+            'BROKER_OPTIONS': {'url': REDIS_URL},
+        },
+    },
+    'shared': {
         'BACKEND': 'django_redis.cache.RedisCache',
-        'LOCATION': os.environ.get('REDIS_URL', 'redis://localhost:6379/1'),
+        'LOCATION': REDIS_URL,
         'OPTIONS': {
             'CLIENT_CLASS': 'django_redis.client.DefaultClient',
         }
@@ -8,6 +8,19 @@ DATABASES = {
     }
 }
 
+# TEST_DB=postgres запускает тесты на локальном Postgres (параметры из DB_*)
+if os.getenv('TEST_DB') == 'postgres':
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.postgresql',
+            'NAME': os.getenv('DB_NAME', 'unidoc'),
+            'USER': os.getenv('DB_USER', 'unidoc_user'),
+            'PASSWORD': os.getenv('DB_PASSWORD', '1234'),
+            'HOST': os.getenv('DB_HOST', 'localhost'),
+            'PORT': os.getenv('DB_PORT', '5432'),
+        }
+    }
+
 # Отключаем кэширование
 CACHES = {
     'default': {
@@ -23,6 +23,7 @@ from drf_yasg.views import get_schema_view
 from drf_yasg import openapi
 from rest_framework import permissions
 from rest_framework_simplejwt.views import TokenObtainPairView, TokenRefreshView
+from core.metrics import metrics_view
 
 schema_view = get_schema_view(
     openapi.Info(
@@ -58,4 +59,5 @@ web_urlpatterns = [
 urlpatterns = [
     path('api/', include(api_urlpatterns)),
     path('web/', include(web_urlpatterns)),
+    path('metrics', metrics_view, name='metrics'),
 ] + static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)